@@ -0,0 +1,113 @@
+"""
+Fixtures of the benchmark suite. Data sizes can be changed with environment variables:
+
+- BENCH_EDF_CHANNELS: number of EDF channels (default 6)
+- BENCH_EDF_DURATION_S: recording duration in seconds (default 600)
+- BENCH_N_SUBJECTS: subjects per vendor for convert_dataset (default 1)
+- BENCH_ABOSA_ROWS: rows of the ABOSA workbook (default 500)
+- BENCH_SFTP_FILE_MB: size of the file transferred over SFTP (default 16)
+- BENCH_SFTP_N_FILES: number of 1 MB files downloaded together over SFTP (default 32)
+- BENCH_N_FILENAMES: file names parsed by the filename parsing benchmark (default 1000000)
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from local_sftp_server import LocalSFTPServer  # noqa: E402
+from synthetic_data import (
+    write_abosa_workbook,
+    write_edf,
+    write_psg_folder,
+)  # noqa: E402
+
+VENDORS = ["deltamed", "remlogic", "brainrt"]
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+EDF_CHANNELS: int = _env_int("BENCH_EDF_CHANNELS", 6)
+EDF_DURATION_S: int = _env_int("BENCH_EDF_DURATION_S", 600)
+N_SUBJECTS: int = _env_int("BENCH_N_SUBJECTS", 1)
+ABOSA_ROWS: int = _env_int("BENCH_ABOSA_ROWS", 500)
+SFTP_FILE_MB: int = _env_int("BENCH_SFTP_FILE_MB", 16)
+SFTP_N_FILES: int = _env_int("BENCH_SFTP_N_FILES", 32)
+N_FILENAMES: int = _env_int("BENCH_N_FILENAMES", 1_000_000)
+
+
+@pytest.fixture(scope="session")
+def bench_dir(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("bench")
+
+
+@pytest.fixture(scope="session")
+def edf_file(bench_dir: Path) -> Path:
+    return write_edf(
+        bench_dir / "edf" / "recording.edf",
+        n_channels=EDF_CHANNELS,
+        duration_s=EDF_DURATION_S,
+    )
+
+
+@pytest.fixture(scope="session")
+def psg_series(bench_dir: Path) -> Path:
+    """
+    Input directory of convert_dataset: <root>/2024/PA<id>/ with one patient
+    folder per vendor and subject.
+    """
+    root: Path = bench_dir / "psg"
+    for vendor_idx, vendor in enumerate(VENDORS):
+        for subject in range(N_SUBJECTS):
+            write_psg_folder(
+                root / "2024",
+                patient_id=1000 + 100 * vendor_idx + subject,
+                vendor=vendor,
+                n_channels=EDF_CHANNELS,
+                duration_s=EDF_DURATION_S,
+            )
+    return root
+
+
+@pytest.fixture(scope="session")
+def abosa_workbook(bench_dir: Path) -> Path:
+    return write_abosa_workbook(
+        bench_dir / "abosa" / "ParameterValues.xlsx", ABOSA_ROWS
+    )
+
+
+@pytest.fixture(scope="session")
+def sftp_server(bench_dir: Path):
+    root: Path = bench_dir / "sftp_root"
+    root.mkdir()
+    with LocalSFTPServer(root) as server:
+        yield server
+
+
+@pytest.fixture(scope="session")
+def sftp_payload(sftp_server: LocalSFTPServer) -> str:
+    """
+    Remote path of a random file of BENCH_SFTP_FILE_MB MB on the local SFTP server.
+    """
+    remote_dir: Path = sftp_server.root / "raw"
+    remote_dir.mkdir()
+    (remote_dir / "payload.bin").write_bytes(os.urandom(SFTP_FILE_MB * 1024 * 1024))
+    return "raw/payload.bin"
+
+
+@pytest.fixture(scope="session")
+def sftp_small_files(sftp_server: LocalSFTPServer) -> List[str]:
+    """
+    Remote paths of BENCH_SFTP_N_FILES random files of 1 MB on the local SFTP server.
+    """
+    remote_dir: Path = sftp_server.root / "small"
+    remote_dir.mkdir()
+    for i in range(SFTP_N_FILES):
+        (remote_dir / f"file_{i}.bin").write_bytes(os.urandom(1024 * 1024))
+    return [f"small/file_{i}.bin" for i in range(SFTP_N_FILES)]
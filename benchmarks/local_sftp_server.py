@@ -0,0 +1,170 @@
+"""
+Minimal in-process SFTP server (paramiko) serving a local directory, used to benchmark
+SFTPClient transfers without a remote host. Any username/password is accepted.
+"""
+
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_OK
+
+
+class _AcceptAllServer(paramiko.ServerInterface):
+    def check_auth_password(self, username: str, password: str) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class _LocalHandle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _LocalSFTPInterface(SFTPServerInterface):
+    """
+    Maps SFTP paths onto a local root directory.
+    """
+
+    root: Path = Path(".")
+
+    def _local(self, path: str) -> str:
+        return str(self.root / self.canonicalize(path).lstrip("/"))
+
+    def list_folder(self, path: str):
+        local = self._local(path)
+        try:
+            entries: List[SFTPAttributes] = []
+            for name in os.listdir(local):
+                attr = SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path: str):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path: str, flags: int, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        f = os.fdopen(fd, mode)
+
+        handle = _LocalHandle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path: str):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath: str, newpath: str):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path: str, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path: str):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path: str, attr):
+        return SFTP_OK
+
+
+class LocalSFTPServer:
+    """
+    SFTP server listening on 127.0.0.1 on a free port and serving `root`.
+    Use as a context manager; `port` is available once started.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.port: Optional[int] = None
+        self._socket: Optional[socket.socket] = None
+        self._transports: List[paramiko.Transport] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LocalSFTPServer":
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(16)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def _serve(self) -> None:
+        interface = type(
+            "_RootedSFTPInterface", (_LocalSFTPInterface,), {"root": self.root}
+        )
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, interface)
+            transport.start_server(server=_AcceptAllServer())
+            self._transports.append(transport)
+
+    def stop(self) -> None:
+        for transport in self._transports:
+            transport.close()
+        if self._socket is not None:
+            self._socket.close()
+
+    def __enter__(self) -> "LocalSFTPServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
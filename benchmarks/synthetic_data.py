@@ -0,0 +1,240 @@
+"""
+Generators of synthetic PSG data used by the benchmark suite: EDF recordings,
+Deltamed (.txt + .rtf), RemLogic (.txt) and BrainRT (.csv) annotation exports, and
+ABOSA ParameterValues workbooks. Formats follow what the parsers of
+sleeplab_converter.mars_database.annotation and indicator_pipeline.excel_reader expect.
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pyedflib
+
+from indicator_pipeline.excel_reader import get_required_columns
+
+START: datetime = datetime(2024, 1, 15, 22, 0, 0)
+
+DELTAMED_STAGES: List[str] = ["Veille", "Stade 1", "Stade 2", "Stade 3", "S. Paradoxal"]
+DELTAMED_EVENTS: List[str] = [
+    "Apnée obstructive",
+    "Hypopnée",
+    "Désaturation",
+    "Micro-éveil",
+]
+REMLOGIC_STAGES: List[str] = [
+    "SLEEP-S0",
+    "SLEEP-S1",
+    "SLEEP-S2",
+    "SLEEP-S3",
+    "SLEEP-REM",
+]
+BRAINRT_STAGES: List[str] = ["W", "N1", "N2", "N3", "R"]
+BRAINRT_SUBTYPES: List[str] = [
+    "Apnée obstructive",
+    "hypopnée",
+    "Chute de la saturation",
+    "Micro-éveil",
+]
+
+
+def write_edf(
+    path: Path,
+    n_channels: int = 6,
+    duration_s: int = 600,
+    sample_rate: int = 256,
+    start: datetime = START,
+    n_sleep_stages: int = 0,
+) -> Path:
+    """
+    Writes an EDF+ file with `n_channels` sine/noise channels of `duration_s` seconds.
+    The last channel is an SpO2-like 1 Hz channel. Optional 30 s "Sleep stage" annotations
+    are written in the EDF+ annotation channel (as BrainRT exports do).
+    """
+    rng = np.random.default_rng(0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    headers = []
+    signals = []
+    for i in range(n_channels):
+        is_spo2 = i == n_channels - 1
+        fs = 1 if is_spo2 else sample_rate
+        n = duration_s * fs
+        if is_spo2:
+            signal = 95 + 2 * np.sin(np.arange(n) / 60) + rng.normal(0, 0.3, n)
+            label, dimension, pmin, pmax = "SpO2", "%", 0.0, 100.0
+        else:
+            t = np.arange(n) / fs
+            signal = 50 * np.sin(2 * np.pi * (1 + i) * t) + rng.normal(0, 10, n)
+            label, dimension, pmin, pmax = f"EEG{i}", "uV", -500.0, 500.0
+        headers.append(
+            {
+                "label": label,
+                "dimension": dimension,
+                "sample_frequency": fs,
+                "physical_min": pmin,
+                "physical_max": pmax,
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": "",
+            }
+        )
+        signals.append(signal)
+
+    writer = pyedflib.EdfWriter(
+        str(path), n_channels, file_type=pyedflib.FILETYPE_EDFPLUS
+    )
+    try:
+        writer.setStartdatetime(start)
+        writer.setSignalHeaders(headers)
+        writer.writeSamples(signals)
+        for epoch in range(n_sleep_stages):
+            stage = BRAINRT_STAGES[epoch % len(BRAINRT_STAGES)]
+            writer.writeAnnotation(epoch * 30, 30, f"Sleep stage {stage}")
+    finally:
+        writer.close()
+    return path
+
+
+def write_deltamed_annotations(
+    patient_dir: Path, edf_name: str, n_epochs: int = 120, start: datetime = START
+) -> None:
+    """
+    Writes a Deltamed export: `<edf_name>.txt` with 30 s sleep stages and
+    `<edf_name>.rtf` with scored events.
+    """
+    patient_dir.mkdir(parents=True, exist_ok=True)
+    date_str: str = start.strftime("%d/%m/%Y")
+
+    txt_lines = ["Deltamed Coherence", "Hypnogramme", date_str, "", "Heure\tStade"]
+    for epoch in range(n_epochs):
+        t = start + timedelta(seconds=30 * epoch)
+        txt_lines.append(
+            f"{t:%H:%M:%S}\t{DELTAMED_STAGES[epoch % len(DELTAMED_STAGES)]}"
+        )
+    end = start + timedelta(seconds=30 * n_epochs)
+    txt_lines.append(f"{end:%H:%M:%S}\t//")
+    (patient_dir / f"{edf_name}.txt").write_text(
+        "\n".join(txt_lines) + "\n", encoding="latin1"
+    )
+
+    rtf_lines = [f"Ligne d'en-tete {i}" for i in range(14)]
+    rtf_lines.append("N°  Temps  Heure réelle  Durée  Evénement")
+    for i in range(n_epochs // 2):
+        offset = 60 * i + 15
+        t = start + timedelta(seconds=offset)
+        from_start = timedelta(seconds=offset)
+        hours, rem = divmod(int(from_start.total_seconds()), 3600)
+        minutes, seconds = divmod(rem, 60)
+        rtf_lines.append(
+            f"{i + 1}  {hours:02d}h{minutes:02d}m{seconds:02d}s  {t:%H}h{t:%M}m{t:%S}s"
+            f"  00:00:{10 + i % 20:02d}  {DELTAMED_EVENTS[i % len(DELTAMED_EVENTS)]}"
+        )
+    rtf_lines += ["Fin du rapport", "", ""]
+    body = "".join(f"{line}\\par\n" for line in rtf_lines)
+    rtf = "{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Courier New;}}\\f0\\fs20\n" + body + "}"
+    (patient_dir / f"{edf_name}.rtf").write_text(rtf, encoding="latin1")
+
+
+def write_remlogic_annotations(
+    txt_path: Path, n_epochs: int = 120, start: datetime = START
+) -> None:
+    """
+    Writes a RemLogic .txt export (standard header format) with 30 s sleep stages and events.
+    """
+    txt_path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [
+        "RemLogic Event Export",
+        "Patient: synthetic",
+        "Scoring: manual",
+        f"Date d'enregistrement: {start:%d/%m/%Y}",
+        "",
+        "Stade de sommeil\tPosition\tHeure [hh:mm:ss]\tEvénement\tDurée[s]",
+    ]
+    for epoch in range(n_epochs):
+        t = start + timedelta(seconds=30 * epoch)
+        stage = REMLOGIC_STAGES[epoch % len(REMLOGIC_STAGES)]
+        lines.append(f"{stage}\tSupine\t{t:%H:%M:%S}\t{stage}\t30")
+        if epoch % 4 == 0:
+            lines.append(f"{stage}\tSupine\t{t:%H:%M:%S}\tAPNEA-OBSTRUCTIVE\t12")
+    txt_path.write_text("\n".join(lines) + "\n", encoding="latin1")
+
+
+def write_brainrt_annotations(
+    csv_path: Path, n_events: int = 200, start: datetime = START
+) -> None:
+    """
+    Writes a BrainRT .csv export (UTF-16, tab separated).
+    """
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for i in range(n_events):
+        t = start + timedelta(seconds=20 * i)
+        rows.append(
+            {
+                "Type": "Respiratory",
+                "Subtype": BRAINRT_SUBTYPES[i % len(BRAINRT_SUBTYPES)],
+                "Validated": "Yes" if i % 5 else "No",
+                "Start Date/Time: Date": f"{t:%d/%m/%Y}",
+                "Start Date/Time: Time - HH:MM:SS": f"{t:%H:%M:%S}",
+                "Duration (total µs)": float((10 + i % 20) * 1_000_000),
+            }
+        )
+    pd.DataFrame(rows).to_csv(csv_path, sep="\t", index=False, encoding="UTF-16")
+
+
+def write_psg_folder(
+    series_dir: Path,
+    patient_id: int,
+    vendor: str = "deltamed",
+    visit: int = 1,
+    recording: int = 1,
+    n_channels: int = 6,
+    duration_s: int = 600,
+) -> Path:
+    """
+    Writes a patient folder as downloaded by SLFConversion: the T1 PSG EDF and its
+    annotation export for the given vendor ('deltamed', 'remlogic' or 'brainrt').
+    Returns the EDF path.
+    """
+    patient_dir = series_dir / f"PA{patient_id}"
+    edf_name = f"FE{recording:04d}T1-PA{patient_id}V{visit}C1"
+    n_epochs = duration_s // 30
+    edf_path = write_edf(
+        patient_dir / f"{edf_name}.edf",
+        n_channels=n_channels,
+        duration_s=duration_s,
+        n_sleep_stages=n_epochs if vendor == "brainrt" else 0,
+    )
+    if vendor == "deltamed":
+        write_deltamed_annotations(patient_dir, edf_name, n_epochs=n_epochs)
+    elif vendor == "remlogic":
+        write_remlogic_annotations(patient_dir / f"{edf_name}.txt", n_epochs=n_epochs)
+    elif vendor == "brainrt":
+        write_brainrt_annotations(patient_dir / f"{edf_name}.csv", n_events=n_epochs)
+    else:
+        raise ValueError(f"Unknown vendor: {vendor}")
+    return edf_path
+
+
+def write_abosa_workbook(path: Path, n_rows: int = 500) -> Path:
+    """
+    Writes an ABOSA-style ParameterValues workbook with every mapped indicator column,
+    a few unused columns and European decimal commas in the TST column.
+    """
+    rng = np.random.default_rng(0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = sorted(get_required_columns() - {"Filename", "TST"})
+    data = {
+        "Filename": [f"PA{1000 + i}_V1_FE{i:04d}" for i in range(n_rows)],
+        "TST": [f"{v:.2f}".replace(".", ",") for v in rng.uniform(300, 480, n_rows)],
+    }
+    for column in columns:
+        data[column] = rng.uniform(0, 100, n_rows).round(3)
+    for i in range(10):
+        data[f"Unused_{i}"] = rng.uniform(0, 1, n_rows)
+    pd.DataFrame(data).to_excel(path, index=False)
+    return path
@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import Tuple
+
+import pytest
+
+from conftest import VENDORS
+from sleeplab_converter.mars_database.annotation import (
+    annotation_csv,
+    annotation_deltamed,
+    annotation_remlogic,
+)
+from sleeplab_converter.mars_database.convert import parse_annotations, parse_edf
+
+
+def _first_recording(series_dir: Path, vendor: str) -> Tuple[Path, str, str]:
+    patient: str = f"PA{1000 + 100 * VENDORS.index(vendor)}"
+    edf_path: Path = next((series_dir / patient).glob("*.edf"))
+    return series_dir, patient, edf_path.stem
+
+
+def test_annotation_deltamed(benchmark, psg_series: Path):
+    series_dir, patient, edf_name = _first_recording(psg_series / "2024", "deltamed")
+    df = benchmark(annotation_deltamed, series_dir, patient, edf_name)
+    assert len(df) > 0
+
+
+def test_annotation_remlogic(benchmark, psg_series: Path):
+    series_dir, patient, edf_name = _first_recording(psg_series / "2024", "remlogic")
+    df = benchmark(annotation_remlogic, series_dir / patient / f"{edf_name}.txt")
+    assert len(df) > 0
+
+
+def test_annotation_csv(benchmark, psg_series: Path):
+    series_dir, patient, edf_name = _first_recording(psg_series / "2024", "brainrt")
+    df = benchmark(annotation_csv, series_dir, patient, edf_name)
+    assert len(df) > 0
+
+
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_parse_annotations(benchmark, psg_series: Path, vendor: str):
+    series_dir, patient, edf_name = _first_recording(psg_series / "2024", vendor)
+    _, _, header = parse_edf(series_dir / patient / f"{edf_name}.edf")
+    sleep_stages, *_ = benchmark(
+        parse_annotations, header, series_dir / patient, edf_name
+    )
+    assert len(sleep_stages) > 0
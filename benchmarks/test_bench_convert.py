@@ -0,0 +1,21 @@
+import shutil
+from pathlib import Path
+
+from sleeplab_converter.mars_database.convert import convert_dataset
+
+
+def test_convert_dataset(benchmark, psg_series: Path, bench_dir: Path):
+    output_dir: Path = bench_dir / "slf"
+
+    def setup():
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir()
+
+    benchmark.pedantic(
+        convert_dataset,
+        args=(psg_series, output_dir, "2024"),
+        kwargs={"ds_name": "slf_to_compute"},
+        setup=setup,
+        rounds=3,
+    )
+    assert any((output_dir / "slf_to_compute" / "2024").iterdir())
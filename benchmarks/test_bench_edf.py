@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from sleeplab_converter.edf import (
+    read_edf_export,
+    read_edf_export_mne,
+    read_edf_export_stream,
+)
+
+
+def _load_all(load_funcs) -> int:
+    return sum(load_func().size for load_func in load_funcs)
+
+
+def test_read_edf_export_header(benchmark, edf_file: Path):
+    load_funcs, signal_headers, _ = benchmark(read_edf_export, edf_file)
+    assert len(load_funcs) == len(signal_headers)
+
+
+def test_read_edf_export_signals(benchmark, edf_file: Path):
+    load_funcs, _, _ = read_edf_export(edf_file)
+    assert benchmark(_load_all, load_funcs) > 0
+
+
+def test_read_edf_export_mne_header(benchmark, edf_file: Path):
+    load_funcs, signal_headers, _ = benchmark(read_edf_export_mne, str(edf_file))
+    assert len(load_funcs) == len(signal_headers)
+
+
+def test_read_edf_export_mne_signals(benchmark, edf_file: Path):
+    load_funcs, _, _ = read_edf_export_mne(str(edf_file))
+    total = benchmark.pedantic(_load_all, args=(load_funcs,), rounds=3, iterations=1)
+    assert total > 0
+
+
+def test_read_edf_export_stream_signals(benchmark, edf_file: Path):
+    # Native reader of the files pyedflib rejects
+    load_funcs, _, _ = read_edf_export_stream(edf_file)
+    assert benchmark(_load_all, load_funcs) > 0
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+from indicator_pipeline.excel_reader import read_parameter_values
+from indicator_pipeline.excel_to_json import df_to_json_payloads
+
+from conftest import ABOSA_ROWS
+
+
+def test_read_parameter_values(benchmark, abosa_workbook: Path):
+    df = benchmark(read_parameter_values, abosa_workbook)
+    assert len(df) == ABOSA_ROWS
+
+
+def test_df_to_json_payloads(benchmark, abosa_workbook: Path):
+    df = read_parameter_values(abosa_workbook)
+    payloads = benchmark(df_to_json_payloads, df, "1.0")
+    assert len(payloads) == ABOSA_ROWS
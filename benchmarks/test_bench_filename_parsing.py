@@ -0,0 +1,71 @@
+import re
+from typing import List, Tuple
+
+import pandas as pd
+import pytest
+
+from indicator_pipeline.filename_parsing import parse_filename, parse_filenames
+
+from conftest import N_FILENAMES
+
+
+def parse_uncompiled(filename: str) -> Tuple[str, str, str]:
+    """
+    Parsing as done before the cached parser: the patterns are looked up on every call.
+    """
+    match = re.search(r"PA(\d+)(?:_?V(\d+))?", filename)
+    if match is None:
+        return "", "", ""
+    recording = re.search(r"FE(\d+)", filename)
+    return match.group(1), match.group(2) or "", recording.group(1) if recording else ""
+
+
+@pytest.fixture(scope="module")
+def filenames() -> List[str]:
+    # Listings and Excel rows repeat the same names: 1 in 20 is distinct
+    n_distinct: int = max(N_FILENAMES // 20, 1)
+    distinct: List[str] = [
+        (
+            f"FE{i % 9999:04d}T1-PA{i}V{i % 3 + 1}C1.edf"
+            if i % 2
+            else f"PA{i}_V1_FE{i:04d}"
+        )
+        for i in range(n_distinct)
+    ]
+    return [distinct[i % n_distinct] for i in range(N_FILENAMES)]
+
+
+def test_parse_uncompiled(benchmark, filenames: List[str]):
+    parsed = benchmark.pedantic(
+        lambda: [parse_uncompiled(name) for name in filenames], rounds=3
+    )
+    assert len(parsed) == N_FILENAMES
+
+
+def test_parse_filename(benchmark, filenames: List[str]):
+    def run() -> List[Tuple[str, str, str]]:
+        parse_filename.cache_clear()
+        return [parse_filename(name) for name in filenames]
+
+    parsed = benchmark.pedantic(run, rounds=3)
+    assert parsed[:100] == [parse_uncompiled(name) for name in filenames[:100]]
+
+
+def test_parse_filenames_list(benchmark, filenames: List[str]):
+    def run() -> List[Tuple[str, str, str]]:
+        parse_filename.cache_clear()
+        return parse_filenames(filenames)
+
+    parsed = benchmark.pedantic(run, rounds=3)
+    assert len(parsed) == N_FILENAMES
+
+
+def test_parse_filenames_series(benchmark, filenames: List[str]):
+    series: pd.Series = pd.Series(filenames)
+
+    def run() -> pd.DataFrame:
+        parse_filename.cache_clear()
+        return parse_filenames(series)
+
+    parsed = benchmark.pedantic(run, rounds=3)
+    assert len(parsed) == N_FILENAMES
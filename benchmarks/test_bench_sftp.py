@@ -0,0 +1,97 @@
+import shutil
+from pathlib import Path, PurePosixPath
+from typing import Dict, List
+
+import pytest
+
+from indicator_pipeline.sftp_client import (
+    SFTP_BACKENDS,
+    SFTPClient,
+    SFTPPath,
+    get_sftp_client_class,
+)
+from sleeplab_converter.mars_database.convert import convert_dataset
+
+from conftest import SFTP_FILE_MB, SFTP_N_FILES
+
+
+@pytest.fixture(params=SFTP_BACKENDS)
+def sftp_client(request, sftp_server):
+    if request.param == "asyncssh":
+        pytest.importorskip("asyncssh")
+    client = get_sftp_client_class(request.param)(
+        host="127.0.0.1", user="bench", password="bench", port=sftp_server.port
+    )
+    client.connect()
+    yield client
+    client.close()
+
+
+def test_sftp_download_file(
+    benchmark, sftp_client: SFTPClient, sftp_payload: str, tmp_path: Path
+):
+    local_path: Path = tmp_path / "payload.bin"
+    benchmark.pedantic(
+        sftp_client.download_file,
+        args=(sftp_payload, local_path),
+        rounds=3,
+        warmup_rounds=1,
+    )
+    assert local_path.stat().st_size == SFTP_FILE_MB * 1024 * 1024
+
+
+def test_sftp_download_files(
+    benchmark, sftp_client: SFTPClient, sftp_small_files: List[str], tmp_path: Path
+):
+    # Files of a few recordings: the asyncssh client transfers them concurrently
+    files: Dict[str, Path] = {
+        remote_path: tmp_path / PurePosixPath(remote_path).name
+        for remote_path in sftp_small_files
+    }
+    benchmark.pedantic(sftp_client.download_files, args=(files,), rounds=3)
+    assert len(list(tmp_path.iterdir())) == SFTP_N_FILES
+
+
+def test_sftp_upload_folder(
+    benchmark, sftp_client: SFTPClient, sftp_server, psg_series: Path
+):
+    remote_root: Path = sftp_server.root / "upload"
+
+    def setup():
+        shutil.rmtree(remote_root, ignore_errors=True)
+
+    benchmark.pedantic(
+        sftp_client.upload_folder_recursive,
+        args=(psg_series, "upload"),
+        setup=setup,
+        rounds=3,
+    )
+    assert any(remote_root.rglob("*.edf"))
+
+
+def test_sftp_streamed_conversion(
+    benchmark, sftp_client: SFTPClient, sftp_server, psg_series: Path, tmp_path: Path
+):
+    remote_root: Path = sftp_server.root / "stream"
+    if not remote_root.exists():
+        shutil.copytree(psg_series, remote_root)
+    files = {
+        PurePosixPath(path.relative_to(psg_series).as_posix()): (
+            f"stream/{path.relative_to(psg_series).as_posix()}"
+        )
+        for path in psg_series.rglob("*")
+        if path.is_file()
+    }
+    output_dir: Path = tmp_path / "slf"
+
+    def setup():
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir()
+
+    benchmark.pedantic(
+        convert_dataset,
+        args=(SFTPPath(sftp_client, files), output_dir, "2024"),
+        setup=setup,
+        rounds=2,
+    )
+    assert any(output_dir.rglob("data.npy"))
@@ -1,9 +0,0 @@
-@echo off
-REM Script to create the abosa_complete.flag file
-
-REM Move to the script's folder
-cd /d "%~dp0"
-
-echo. > abosa_complete.flag
-echo [OK] File 'abosa_complete.flag' created successfully!
-pause
\ No newline at end of file
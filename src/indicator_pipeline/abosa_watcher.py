@@ -0,0 +1,181 @@
+import logging
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from indicator_pipeline.utils import get_state
+
+# excel_to_json (and requests) is imported by the functions using it, so that
+# run_pipeline can read the defaults below without loading the import step
+
+logger = logging.getLogger(__name__)
+
+# Polling rather than inotify: the ABOSA output folder is a Docker volume mounted from
+# the Windows host, where inotify events of the host are not forwarded to the container
+DEFAULT_POLL_S: float = 30.0
+# A workbook is imported once its size and mtime have not changed for this long
+DEFAULT_SETTLE_S: float = 60.0
+# The watch stops after this long without any workbook imported (0 to never stop)
+DEFAULT_IDLE_TIMEOUT_S: float = 6 * 3600.0
+
+Signature = Tuple[str, int, int]
+
+
+def workbook_is_complete(workbook: Path) -> bool:
+    """
+    Checks that a workbook is a readable .xlsx archive (its central directory is
+    written last) and is not open in Excel (no '~$' lock file next to it).
+    """
+    if any(workbook.parent.glob("~$*")):
+        return False
+    return zipfile.is_zipfile(workbook)
+
+
+def pending_slf_ids() -> List[str]:
+    """
+    Returns the converted SLF datasets whose indicators are not all imported yet.
+    """
+    return [
+        slf_id
+        for slf_id, indicators in get_state().get_slf_usage().items()
+        if not all(indicators.values())
+    ]
+
+
+class WorkbookWatcher:
+    """
+    Polls the ABOSA output folder and reports the ParameterValues folders whose workbook
+    is fully written: its name, size and mtime unchanged for `settle_s` (debounce of the
+    successive writes of ABOSA) and the file a complete .xlsx archive.
+
+    A workbook is reported again only when it changes after being imported.
+
+    Args:
+    abosa_output (Path): ABOSA output folder (<year>/ParameterValues_*/*.xlsx).
+    settle_s (float): Seconds a workbook must stay unchanged before it is reported.
+    """
+
+    def __init__(self, abosa_output: Path, settle_s: float = DEFAULT_SETTLE_S):
+        self.abosa_output = abosa_output
+        self.settle_s = settle_s
+        # rel_path -> (signature, time of the last change)
+        self.seen: Dict[str, Tuple[Signature, float]] = {}
+        self.imported: Dict[str, Signature] = {}
+
+    def poll(self, now: Optional[float] = None) -> List[Path]:
+        """
+        Scans the output folder once. Returns the folders ready to be imported.
+        """
+        from indicator_pipeline.excel_to_json import (
+            find_parameter_folders,
+            find_workbook,
+        )
+
+        now = time.time() if now is None else now
+        ready: List[Path] = []
+        for folder in find_parameter_folders(self.abosa_output):
+            rel_path: str = str(folder.relative_to(self.abosa_output))
+            try:
+                workbook: Optional[Path] = find_workbook(folder)
+                if workbook is None:
+                    continue
+                st = workbook.stat()
+            except OSError:
+                continue
+
+            signature: Signature = (workbook.name, st.st_size, st.st_mtime_ns)
+            previous = self.seen.get(rel_path)
+            if previous is None:
+                # First sight: the file has been unchanged since its mtime
+                self.seen[rel_path] = (signature, st.st_mtime)
+            elif previous[0] != signature:
+                self.seen[rel_path] = (signature, max(now, st.st_mtime))
+                logger.info(f"[WATCH] Workbook being written: {rel_path}")
+
+            if self.imported.get(rel_path) == signature:
+                continue
+            if now - self.seen[rel_path][1] < self.settle_s:
+                continue
+            if not workbook_is_complete(workbook):
+                continue
+            ready.append(folder)
+        return ready
+
+    def mark_imported(self, folders: List[Path]) -> None:
+        """
+        Records the current signature of the given folders as imported.
+        """
+        for folder in folders:
+            rel_path: str = str(folder.relative_to(self.abosa_output))
+            self.imported[rel_path] = self.seen[rel_path][0]
+
+    def waiting(self) -> List[str]:
+        """
+        Returns the folders seen but not imported in their current version.
+        """
+        return [
+            rel_path
+            for rel_path, (signature, _) in self.seen.items()
+            if self.imported.get(rel_path) != signature
+        ]
+
+
+def watch_abosa_output(
+    abosa_version: str,
+    workers: int = 1,
+    upsert: bool = False,
+    poll_s: float = DEFAULT_POLL_S,
+    settle_s: float = DEFAULT_SETTLE_S,
+    idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+) -> int:
+    """
+    Imports each ParameterValues folder as soon as its workbook is fully written, until
+    every converted SLF dataset has its indicators imported, or after `idle_timeout_s`
+    without any import. Returns the number of folders imported.
+    """
+    from indicator_pipeline.excel_to_json import (
+        get_abosa_output,
+        import_parameter_folders,
+    )
+
+    abosa_output: Path = get_abosa_output()
+    watcher = WorkbookWatcher(abosa_output, settle_s)
+    logger.info(
+        f"[WATCH] Watching {abosa_output} every {poll_s:g}s "
+        f"(workbooks unchanged for {settle_s:g}s are imported)"
+    )
+
+    imported_count: int = 0
+    last_activity: float = time.monotonic()
+    last_pending: Optional[int] = None
+    while True:
+        ready: List[Path] = watcher.poll()
+        if ready:
+            logger.info(f"[WATCH] {len(ready)} workbook(s) ready")
+            sent: List[str] = import_parameter_folders(
+                ready, abosa_output, abosa_version, workers, upsert
+            )
+            watcher.mark_imported(ready)
+            imported_count += len(sent)
+            if sent:
+                last_activity = time.monotonic()
+
+        pending: List[str] = pending_slf_ids()
+        if not pending and not watcher.waiting():
+            logger.info(
+                f"[WATCH] All converted SLF datasets are imported ({imported_count} folder(s) this run)"
+            )
+            return imported_count
+        if idle_timeout_s and time.monotonic() - last_activity > idle_timeout_s:
+            logger.warning(
+                f"[WATCH] No workbook imported for {idle_timeout_s / 3600:.1f} h, "
+                f"stopping with {len(pending)} SLF dataset(s) still waiting for ABOSA"
+            )
+            return imported_count
+        if len(pending) != last_pending:
+            logger.info(
+                f"[WATCH] Waiting for the ABOSA results of {len(pending)} SLF dataset(s)"
+            )
+            last_pending = len(pending)
+        time.sleep(poll_s)
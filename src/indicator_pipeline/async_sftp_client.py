@@ -0,0 +1,449 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+from pathlib import Path, PurePosixPath
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import asyncssh
+
+from indicator_pipeline import metrics
+from indicator_pipeline.bandwidth import BandwidthLimiter, ThrottledFile
+from indicator_pipeline.checksums import (
+    FileChecksum,
+    check_transferred_size,
+    file_checksum,
+)
+from indicator_pipeline.metrics import METRICS
+from indicator_pipeline.raw_cache import RawFileCache
+
+logger = logging.getLogger(__name__)
+
+# SFTP read or write requests in flight per file: paramiko waits for most of its requests
+MAX_REQUESTS: int = 128
+# Files transferred at the same time by download_files and upload_folder_recursive
+MAX_CONCURRENT_FILES: int = 8
+# Bytes copied between two waits for the bandwidth limiter
+THROTTLED_CHUNK_SIZE: int = 1024 * 1024
+
+
+async def gather(coroutines: Iterable[Awaitable]) -> List[Any]:
+    """
+    Runs coroutines concurrently on the running loop and returns their results in order.
+    """
+    return list(await asyncio.gather(*coroutines))
+
+
+class AsyncRemoteFile(io.RawIOBase):
+    """
+    Seekable binary file object reading a remote file of an AsyncSFTPClient, like the
+    paramiko SFTPFile returned by SFTPClient.open_file. `readv` requests all its ranges
+    at once.
+
+    Args:
+    client (AsyncSFTPClient): Client running the event loop of the file.
+    remote_file (asyncssh.SFTPClientFile): Remote file opened in binary mode.
+    """
+
+    def __init__(self, client: "AsyncSFTPClient", remote_file: Any):
+        super().__init__()
+        self.client = client
+        self.remote_file = remote_file
+        self.position: int = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.client.run(self.remote_file.stat()).size
+        self.position = max(offset, 0)
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        data: bytes = self.client.run(self.remote_file.read(size, self.position))
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data: bytes = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readv(self, ranges: List[Tuple[int, int]]) -> List[bytes]:
+        """
+        Reads the (offset, size) byte ranges of the file, all requested at once.
+        """
+        return self.client.run(
+            gather(self.remote_file.read(size, offset) for offset, size in ranges)
+        )
+
+    def close(self) -> None:
+        if not self.closed:
+            self.client.run(self.remote_file.close())
+        super().close()
+
+
+class AsyncSFTPClient:
+    """
+    SFTP client with the interface of SFTPClient, built on asyncssh. Its event loop runs
+    in a background thread: every method submits a coroutine and waits for its result,
+    so the client is shared by the converter threads, whose requests are multiplexed on
+    one SFTP channel. Each file transfer keeps `max_requests` requests in flight, and
+    download_files and upload_folder_recursive transfer `max_concurrent_files` files at
+    the same time. With a `limiter`, files are copied by THROTTLED_CHUNK_SIZE blocks
+    instead, each transfer awaiting the buckets between two blocks so that the event
+    loop, shared by every transfer, never blocks. As asyncssh reads and writes the local
+    files itself, transferred files are checksummed from the local file right after the
+    transfer, while it is still in the page cache.
+    Selected with SFTP_BACKEND=asyncssh (see get_sftp_client_class).
+
+    Args:
+    host (str): Server address.
+    user (str): User name.
+    key_path (str): Private key file; password authentication when empty.
+    password (str): Password, or passphrase of the private key.
+    port (int): Server port.
+    cache (Optional[RawFileCache]): Local cache of the downloaded files.
+    max_requests (int): SFTP requests in flight per file.
+    max_concurrent_files (int): Files transferred at the same time.
+    limiter (Optional[BandwidthLimiter]): Bandwidth limiter of the process.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        user: str = "",
+        key_path: str = "",
+        password: str = "",
+        port: int = 22,
+        cache: Optional[RawFileCache] = None,
+        max_requests: int = MAX_REQUESTS,
+        max_concurrent_files: int = MAX_CONCURRENT_FILES,
+        limiter: Optional[BandwidthLimiter] = None,
+    ):
+        self.host = host
+        self.user = user
+        self.key_path = key_path
+        self.password = password
+        self.port = port
+        self.cache = cache
+        self.max_requests = max_requests
+        self.max_concurrent_files = max(max_concurrent_files, 1)
+        self.throttle = limiter.connection() if limiter is not None else None
+        self.connection = None
+        self.sftp = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    def run(self, coroutine: Awaitable) -> Any:
+        """
+        Runs a coroutine on the event loop of the client and returns its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def connect(self):
+        """
+        Starts the event loop thread and connects to the SFTP server, with the SSH key if
+        `key_path` is given, otherwise with the password.
+        """
+        logger.info(f"Connecting to SFTP server {self.host}:{self.port} (asyncssh)")
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="sftp-asyncio", daemon=True
+        )
+        self._loop_thread.start()
+        self.run(self._connect())
+        logger.info("Connection successful")
+
+    async def _connect(self):
+        # Like the paramiko client, the host key is not checked
+        options: Dict[str, Any] = {"username": self.user, "known_hosts": None}
+        if self.key_path:
+            options["client_keys"] = [self.key_path]
+            options["passphrase"] = self.password or None
+        else:
+            options["client_keys"] = None
+            options["password"] = self.password
+        self.connection = await asyncssh.connect(
+            self.host, port=self.port, login_timeout=45, **options
+        )
+        self.sftp = await self.connection.start_sftp_client()
+
+    def list_files(self, path=".") -> List[str]:
+        """
+        Lists files names and directories at the specified remote path.
+        """
+        return list(self.list_file_sizes(path))
+
+    def list_file_sizes(self, path: str = ".") -> Dict[str, int]:
+        """
+        Lists files names and directories at the specified remote path with their size in
+        bytes, from a single directory listing.
+        """
+        with metrics.span("sftp.list"):
+            names = self.run(self.sftp.readdir(path))
+        return {
+            name.filename: name.attrs.size
+            for name in names
+            if name.filename not in (".", "..")
+        }
+
+    def is_dir(self, path: str) -> bool:
+        """
+        Checks if the given remote path is a directory.
+        """
+        with metrics.span("sftp.stat"):
+            return self.run(self.sftp.isdir(path))
+
+    def download_file(self, remote_path: str, local_path: Path) -> FileChecksum:
+        """
+        Download a single file from remote SFTP server to local path.
+        With a cache, an unchanged file (same size and mtime) is served from the cache.
+        Returns the size and SHA-256 of the file.
+        """
+        return self.download_files({remote_path: local_path})[remote_path]
+
+    def download_files(self, files: Dict[str, Path]) -> Dict[str, FileChecksum]:
+        """
+        Downloads remote files to their local path, `max_concurrent_files` at a time.
+        With a cache, unchanged files (same size and mtime) are served from the cache.
+        Returns the size and SHA-256 of each remote file.
+        """
+        for local_path in files.values():
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.cache is None:
+            pairs: List[Tuple[str, Path]] = list(files.items())
+            return dict(zip(files, self._transfer(self.sftp.get, pairs, "sftp.get")))
+
+        remote_paths: List[str] = list(files)
+        started: float = time.perf_counter()
+        attrs = self.run(gather(self.sftp.stat(path) for path in remote_paths))
+        METRICS.observe("sftp.stat", time.perf_counter() - started)
+        attrs_by_path = dict(zip(remote_paths, attrs))
+        keys: Dict[str, str] = {
+            path: self.cache.key(self.host, path, attr.size, attr.mtime)
+            for path, attr in zip(remote_paths, attrs)
+        }
+        checksums: Dict[str, FileChecksum] = {}
+        missing: List[Tuple[str, Path]] = []
+        for path in remote_paths:
+            if self.cache.fetch(keys[path], files[path]):
+                logger.debug(f"[CACHE] {path} served from the raw file cache")
+                checksums[path] = self.cache.checksum(keys[path])
+            else:
+                missing.append((path, files[path]))
+        downloaded = self._transfer(
+            self.sftp.get,
+            missing,
+            "sftp.get",
+            [attrs_by_path[path].size for path, _ in missing],
+        )
+        for (path, local_path), checksum in zip(missing, downloaded):
+            self.cache.store(keys[path], local_path, checksum)
+            checksums[path] = checksum
+        return {path: checksums[path] for path in remote_paths}
+
+    def download_folder_recursive(self, remote_path: str, local_path: Path):
+        """
+        Recursively downloads a remote folder and its contents to a local directory.
+        """
+        local_path.mkdir(parents=True, exist_ok=True)
+        files: Dict[str, Path] = {}
+        for name in self.list_files(remote_path):
+            remote_item: str = remote_path + "/" + name
+            if self.is_dir(remote_item):
+                self.download_folder_recursive(remote_item, local_path / name)
+            else:
+                files[remote_item] = local_path / name
+        self.download_files(files)
+
+    def upload_folder_recursive(
+        self, local_path: Path, remote_path: str
+    ) -> Dict[str, FileChecksum]:
+        """
+        Recursively uploads a local directory and its content to the SFTP server,
+        `max_concurrent_files` files at a time.
+        Returns the size and SHA-256 of each file, by path relative to the directory.
+        """
+        folders: List[str] = [remote_path]
+        files: List[Tuple[Path, str]] = []
+        for item in sorted(local_path.rglob("*")):
+            remote_item: str = str(
+                PurePosixPath(remote_path, item.relative_to(local_path).as_posix())
+            )
+            if item.is_dir():
+                folders.append(remote_item)
+            else:
+                files.append((item, remote_item))
+        self.run(self._make_folders(folders))
+        checksums: List[FileChecksum] = self._transfer(self.sftp.put, files, "sftp.put")
+        return {
+            item.relative_to(local_path).as_posix(): checksum
+            for (item, _), checksum in zip(files, checksums)
+        }
+
+    def upload_file(self, local_path: Path, remote_path: str) -> FileChecksum:
+        """
+        Uploads a single local file to the SFTP server.
+        Returns the size and SHA-256 of the file.
+        """
+        return self._transfer(self.sftp.put, [(local_path, remote_path)], "sftp.put")[0]
+
+    async def _make_folders(self, folders: List[str]):
+        for folder in folders:
+            await self.sftp.makedirs(folder, exist_ok=True)
+
+    def _transfer(
+        self,
+        transfer_func: Callable[..., Awaitable],
+        pairs: List[Tuple[Any, Any]],
+        span_name: str,
+        remote_sizes: Optional[List[int]] = None,
+    ) -> List[FileChecksum]:
+        """
+        Runs `transfer_func(source, destination)` (sftp.get or sftp.put) for every pair,
+        `max_concurrent_files` at a time, and records the duration and size of every file
+        in the run metrics of the calling thread.
+        Returns the size and SHA-256 of every file, from its local copy. Raises IOError
+        if a local copy does not have the size of the remote file (`remote_sizes` of the
+        downloads, read from the server if not given).
+        """
+        if not pairs:
+            return []
+        download: bool = span_name == "sftp.get"
+        results: List[Tuple[float, int]] = self.run(
+            self._transfer_all(transfer_func, pairs, download, remote_sizes)
+        )
+        direction: str = "downloaded" if download else "uploaded"
+        checksums: List[FileChecksum] = []
+        for (source, destination), (seconds, remote_size) in zip(pairs, results):
+            local_path: Path = Path(destination if download else source)
+            checksums.append(file_checksum(local_path))
+            check_transferred_size(
+                str(source if download else destination), checksums[-1], remote_size
+            )
+            METRICS.observe(span_name, seconds)
+            metrics.count(f"sftp.bytes_{direction}", checksums[-1].size)
+            metrics.count(f"sftp.files_{direction}")
+        return checksums
+
+    async def _transfer_all(
+        self,
+        transfer_func: Callable[..., Awaitable],
+        pairs: List[Tuple[Any, Any]],
+        download: bool,
+        remote_sizes: Optional[List[int]] = None,
+    ) -> List[Tuple[float, int]]:
+        """
+        Transfers every pair and returns the duration of each transfer and the size of
+        its remote file: the source of a download (if not in `remote_sizes`), the
+        destination of an upload once written.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_files)
+
+        async def transfer(
+            source: Any, destination: Any, remote_size: Optional[int]
+        ) -> Tuple[float, int]:
+            async with semaphore:
+                if download and remote_size is None:
+                    remote_size = (await self.sftp.stat(str(source))).size
+                started: float = time.perf_counter()
+                if self.throttle is not None:
+                    await self._throttled_copy(str(source), str(destination), download)
+                else:
+                    await transfer_func(
+                        str(source), str(destination), max_requests=self.max_requests
+                    )
+                seconds: float = time.perf_counter() - started
+                if not download:
+                    remote_size = (await self.sftp.stat(str(destination))).size
+                return seconds, remote_size
+
+        sizes: List[Optional[int]] = remote_sizes or [None] * len(pairs)
+        return await gather(
+            transfer(source, destination, size)
+            for (source, destination), size in zip(pairs, sizes)
+        )
+
+    async def _throttled_copy(
+        self, source: str, destination: str, download: bool
+    ) -> None:
+        """
+        Copies a file between the server and the local disk block by block, awaiting the
+        bandwidth limiter after each block (progress handlers of asyncssh cannot wait).
+        """
+        offset: int = 0
+        if download:
+            async with self.sftp.open(source, "rb") as remote_file:
+                with open(destination, "wb") as local_file:
+                    while True:
+                        data: bytes = await remote_file.read(
+                            THROTTLED_CHUNK_SIZE, offset
+                        )
+                        if not data:
+                            return
+                        local_file.write(data)
+                        offset += len(data)
+                        await self.throttle.consume_async(len(data))
+        else:
+            async with self.sftp.open(destination, "wb") as remote_file:
+                with open(source, "rb") as local_file:
+                    while True:
+                        data = local_file.read(THROTTLED_CHUNK_SIZE)
+                        if not data:
+                            return
+                        await remote_file.write(data, offset)
+                        offset += len(data)
+                        await self.throttle.consume_async(len(data))
+
+    async def _open(self, remote_path: str):
+        # sftp.open returns an awaitable context manager, not a coroutine
+        return await self.sftp.open(remote_path, "rb")
+
+    def open_file(self, remote_path: str, prefetch: bool = False) -> io.IOBase:
+        """
+        Opens a remote file for reading as a seekable binary file object, without copying
+        it to disk. With `prefetch`, the whole file is read at once and served from memory
+        (files read from start to end); otherwise data is requested on demand.
+        With a limiter, the reads wait for its buckets in the calling thread.
+        """
+        with metrics.span("sftp.open"):
+            remote_file = self.run(self._open(remote_path))
+            file: io.IOBase = AsyncRemoteFile(self, remote_file)
+            if self.throttle is not None:
+                file = ThrottledFile(file, self.throttle)
+            if prefetch:
+                with file:
+                    file = io.BytesIO(file.read())
+        metrics.count("sftp.files_streamed")
+        return file
+
+    def close(self):
+        """
+        Closes the SFTP connection and stops the event loop.
+        """
+        if self._loop is None:
+            return
+        self.run(self._close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        logger.info("SFTP connection closed")
+
+    async def _close(self):
+        if self.sftp is not None:
+            self.sftp.exit()
+        if self.connection is not None:
+            self.connection.close()
+            await self.connection.wait_closed()
@@ -0,0 +1,342 @@
+import asyncio
+import io
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import (
+    Any,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from indicator_pipeline import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds of transfer at full rate that a bucket can save up while idle
+BURST_S: float = 1.0
+# Seconds between two checks of the bandwidth schedule
+SCHEDULE_CHECK_S: float = 60.0
+
+RATE_PATTERN = re.compile(r"(\d+(?:\.\d*)?)\s*([KMG]?)(?:i?B)?(?:/s)?", re.IGNORECASE)
+RATE_UNITS: Dict[str, int] = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+WINDOW_PATTERN = re.compile(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(.+)")
+
+# (global, per connection) rates in bytes/s, None meaning unlimited
+Rates = Tuple[Optional[float], Optional[float]]
+
+
+def parse_rate(text: str) -> Optional[float]:
+    """
+    Parses a rate in bytes per second, with an optional K, M or G (binary) unit, e.g.
+    '20M', '512K' or '10MB/s'. Returns None for '0', 'none' or 'unlimited'.
+    """
+    text = text.strip()
+    if text.lower() in ("", "none", "unlimited"):
+        return None
+    match = RATE_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid rate {text!r}, expected e.g. 20M, 512K or 0")
+    rate: float = float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+    return rate or None
+
+
+def format_rate(rate: Optional[float]) -> str:
+    return "unlimited" if rate is None else f"{rate / 1024 ** 2:.1f} MiB/s"
+
+
+class RateWindow(NamedTuple):
+    """
+    Time of day window, in minutes since midnight, with its global and per connection
+    rates. A window whose end is before its start goes past midnight.
+    """
+
+    start: int
+    end: int
+    rates: Rates
+
+    def contains(self, minute: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+
+def parse_schedule(spec: str) -> List[RateWindow]:
+    """
+    Parses a bandwidth schedule: comma-separated 'HH:MM-HH:MM=<global>[/<per connection>]'
+    windows, e.g. '08:00-20:00=20M/5M,20:00-08:00=0' to transfer at 20 MiB/s in total and
+    5 MiB/s per connection during the day, without limit at night.
+    """
+    windows: List[RateWindow] = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        match = WINDOW_PATTERN.fullmatch(part)
+        if match is None:
+            raise ValueError(
+                f"Invalid schedule window {part!r}, expected e.g. 08:00-20:00=20M/5M"
+            )
+        start_h, start_m, end_h, end_m, rates = match.groups()
+        global_rate, _, connection_rate = rates.partition("/")
+        windows.append(
+            RateWindow(
+                int(start_h) * 60 + int(start_m),
+                int(end_h) * 60 + int(end_m),
+                (parse_rate(global_rate), parse_rate(connection_rate)),
+            )
+        )
+    return windows
+
+
+class TokenBucket:
+    """
+    Token bucket of a transfer rate given at each call, holding up to BURST_S seconds of
+    transfer. Transfers are admitted right away and leave the bucket in debt: the caller
+    waits the time needed to pay it back, so that large chunks are throttled as well.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.tokens: float = 0.0
+        self.updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def reserve(self, n_bytes: int, rate: Optional[float]) -> float:
+        """
+        Takes `n_bytes` from the bucket. Returns the seconds to wait before the next
+        transfer at `rate` bytes/s (0 without limit).
+        """
+        if rate is None:
+            return 0.0
+        with self._lock:
+            now: float = self.clock()
+            capacity: float = rate * BURST_S
+            if self.updated_at is None:
+                self.tokens = capacity
+            else:
+                self.tokens = min(
+                    capacity, self.tokens + (now - self.updated_at) * rate
+                )
+            self.tokens -= n_bytes
+            self.updated_at = now
+            return max(-self.tokens / rate, 0.0)
+
+
+class BandwidthLimiter:
+    """
+    Limits the SFTP transfers of the process: a global token bucket shared by every
+    connection and one bucket per connection (see connection()). The rates follow the
+    windows of the schedule, `rates` applying outside of them.
+
+    Args:
+    rates (Rates): Global and per connection rates in bytes/s, None for no limit.
+    schedule (Optional[List[RateWindow]]): Rates by time of day (see parse_schedule).
+    now (Callable[[], datetime]): Current local time, to pick the schedule window.
+    clock (Callable[[], float]): Monotonic clock of the token buckets.
+    sleep (Callable[[float], None]): Waits the given number of seconds.
+    async_sleep (Callable[[float], Awaitable[None]]): Waits the given number of seconds
+    on an event loop, without blocking it.
+    """
+
+    def __init__(
+        self,
+        rates: Rates = (None, None),
+        schedule: Optional[List[RateWindow]] = None,
+        now: Callable[[], datetime] = datetime.now,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        async_sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.default_rates = rates
+        self.schedule: List[RateWindow] = schedule or []
+        self.now = now
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.global_bucket = TokenBucket(clock)
+        self.rates: Optional[Rates] = None
+        self.checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def rates_at(self, moment: datetime) -> Rates:
+        """
+        Returns the (global, per connection) rates at a time of day.
+        """
+        minute: int = moment.hour * 60 + moment.minute
+        for window in self.schedule:
+            if window.contains(minute):
+                return window.rates
+        return self.default_rates
+
+    def current_rates(self) -> Rates:
+        """
+        Returns the rates in force, checking the schedule every SCHEDULE_CHECK_S seconds.
+        """
+        with self._lock:
+            now: float = self.clock()
+            if self.checked_at is None or now - self.checked_at >= SCHEDULE_CHECK_S:
+                self.checked_at = now
+                rates: Rates = self.rates_at(self.now())
+                if rates != self.rates:
+                    logger.info(
+                        f"[BANDWIDTH] Transfer limits: {format_rate(rates[0])} in total, "
+                        f"{format_rate(rates[1])} per connection"
+                    )
+                    self.rates = rates
+            return self.rates
+
+    def reserve(self, n_bytes: int, connection_bucket: TokenBucket) -> float:
+        """
+        Accounts for `n_bytes` transferred on a connection. Returns the seconds to wait
+        for the global and the connection limits.
+        """
+        if n_bytes <= 0:
+            return 0.0
+        global_rate, connection_rate = self.current_rates()
+        wait: float = max(
+            self.global_bucket.reserve(n_bytes, global_rate),
+            connection_bucket.reserve(n_bytes, connection_rate),
+        )
+        if wait > 0:
+            metrics.count("bandwidth.throttled_s", wait)
+        return wait
+
+    def consume(self, n_bytes: int, connection_bucket: TokenBucket) -> None:
+        """
+        Accounts for `n_bytes` transferred on a connection and waits as long as the
+        global or the connection limit requires.
+        """
+        wait: float = self.reserve(n_bytes, connection_bucket)
+        if wait > 0:
+            self.sleep(wait)
+
+    async def consume_async(self, n_bytes: int, connection_bucket: TokenBucket) -> None:
+        """
+        Like consume, from a coroutine: waits without blocking the event loop.
+        """
+        wait: float = self.reserve(n_bytes, connection_bucket)
+        if wait > 0:
+            await self.async_sleep(wait)
+
+    def connection(self) -> "ConnectionThrottle":
+        """
+        Returns the throttle of a new connection, with its own bucket.
+        """
+        return ConnectionThrottle(self)
+
+
+class ConnectionThrottle:
+    """
+    Throttle of one SFTP connection, sharing the global bucket of its limiter.
+
+    Args:
+    limiter (BandwidthLimiter): Limiter of the process.
+    """
+
+    def __init__(self, limiter: BandwidthLimiter):
+        self.limiter = limiter
+        self.bucket = TokenBucket(limiter.clock)
+
+    def consume(self, n_bytes: int) -> None:
+        self.limiter.consume(n_bytes, self.bucket)
+
+    async def consume_async(self, n_bytes: int) -> None:
+        await self.limiter.consume_async(n_bytes, self.bucket)
+
+    def progress_callback(self) -> Callable[..., None]:
+        """
+        Returns a paramiko progress callback for one transfer, called with the number of
+        bytes transferred so far and the total. It waits in the calling thread.
+        """
+        transferred: List[int] = [0]
+
+        def on_progress(done: int, total: int) -> None:
+            self.consume(done - transferred[0])
+            transferred[0] = done
+
+        return on_progress
+
+
+class ThrottledFile(io.RawIOBase):
+    """
+    Remote file streamed without a local copy (open_file), whose reads wait for the
+    throttle of its connection. Other attributes, such as `prefetch`, are those of the
+    remote file.
+
+    Args:
+    file (BinaryIO): Remote file opened for reading, with `readv`.
+    throttle (ConnectionThrottle): Throttle of the connection of the file.
+    """
+
+    def __init__(self, file: BinaryIO, throttle: ConnectionThrottle):
+        self.file = file
+        self.throttle = throttle
+        super().__init__()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file, name)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self.file.seek(offset, whence)
+        return self.file.tell()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        data: bytes = self.file.read(size)
+        self.throttle.consume(len(data))
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data: bytes = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readv(self, ranges: List[Tuple[int, int]]) -> List[bytes]:
+        chunks: List[bytes] = list(self.file.readv(ranges))
+        self.throttle.consume(sum(len(chunk) for chunk in chunks))
+        return chunks
+
+    def close(self) -> None:
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+
+def log_throughput(run_metrics: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Logs the throughput achieved by the SFTP downloads and uploads of a run, from its
+    metrics snapshot (Metrics.to_dict), and the time spent waiting for the limiter.
+    Returns the throughput of each direction in bytes/s.
+    """
+    throughput: Dict[str, float] = {}
+    counters: Dict[str, float] = run_metrics["counters"]
+    for direction, span_name in (("downloaded", "sftp.get"), ("uploaded", "sftp.put")):
+        n_bytes: float = counters.get(f"sftp.bytes_{direction}", 0)
+        seconds: float = run_metrics["spans"].get(span_name, {}).get("total_s", 0.0)
+        if n_bytes <= 0 or seconds <= 0:
+            continue
+        throughput[direction] = n_bytes / seconds
+        metrics.gauge(f"sftp.{direction}_bytes_per_s", throughput[direction])
+        logger.info(
+            f"[BANDWIDTH] {direction.capitalize()} {n_bytes / 1024 ** 2:.1f} MiB at "
+            f"{format_rate(throughput[direction])} per file "
+            f"({n_bytes / run_metrics['duration_s'] / 1024 ** 2:.2f} MiB/s over the run)"
+        )
+    throttled_s: float = counters.get("bandwidth.throttled_s", 0.0)
+    if throttled_s > 0:
+        logger.info(f"[BANDWIDTH] Transfers throttled for {throttled_s:.1f}s in total")
+    return throughput
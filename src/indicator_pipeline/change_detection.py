@@ -0,0 +1,67 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+HASH_CHUNK_SIZE: int = 1024 * 1024
+
+# Payload fields that change on every run without the indicators changing
+VOLATILE_FIELDS = ("computing_date_abosa",)
+
+
+def compute_file_sha256(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Computes the SHA-256 of a file by reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_fingerprint(path: Path) -> Dict[str, Any]:
+    """
+    Returns the cheap part of a file fingerprint: file name, size and modification time.
+    """
+    st = path.stat()
+    return {"file": path.name, "size": st.st_size, "mtime": st.st_mtime}
+
+
+def same_stat(entry: Dict[str, Any], fingerprint: Dict[str, Any]) -> bool:
+    """
+    Checks whether a stored fingerprint has the same file name, size and mtime.
+    """
+    return all(entry.get(key) == fingerprint[key] for key in ("file", "size", "mtime"))
+
+
+def payload_row_hash(payload: Dict[str, Any]) -> str:
+    """
+    Hashes the content of a recording payload, ignoring volatile fields such as the
+    computing date, so that two imports of the same row give the same hash.
+    """
+    rec: Dict[str, Any] = dict(payload["sleep_exploration_recording"])
+    attributes: Dict[str, Any] = dict(rec.get("oximetry_record_attributes") or {})
+    for field in VOLATILE_FIELDS:
+        attributes.pop(field, None)
+    rec["oximetry_record_attributes"] = attributes
+    encoded: bytes = json.dumps(rec, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def check_file_change(
+    path: Path, entry: Optional[Dict[str, Any]]
+) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Compares a workbook with its stored fingerprint.
+    Returns whether the content changed (or the file is new) and the current fingerprint.
+    The content hash is only computed when file name, size or mtime differ from the stored values.
+    """
+    fingerprint: Dict[str, Any] = stat_fingerprint(path)
+    if entry and entry.get("sha256") and same_stat(entry, fingerprint):
+        fingerprint["sha256"] = entry["sha256"]
+        return False, fingerprint
+
+    fingerprint["sha256"] = compute_file_sha256(path)
+    changed: bool = not entry or entry.get("sha256") != fingerprint["sha256"]
+    return changed, fingerprint
@@ -0,0 +1,102 @@
+import hashlib
+import io
+from pathlib import Path
+from typing import Any, BinaryIO, NamedTuple
+
+# Algorithm of the transfer checksums, stored in the SLF manifests
+CHECKSUM_ALGORITHM: str = "sha256"
+CHUNK_SIZE: int = 1024 * 1024
+
+
+class FileChecksum(NamedTuple):
+    """
+    Size in bytes and SHA-256 (hex) of a transferred file.
+    """
+
+    size: int
+    sha256: str
+
+
+class HashingWriter(io.RawIOBase):
+    """
+    Writable file object hashing the bytes written through it to another file object,
+    to checksum a download while it is written.
+
+    Args:
+    file (BinaryIO): File object the bytes are written to.
+    """
+
+    def __init__(self, file: BinaryIO):
+        super().__init__()
+        self.file = file
+        self.digest = hashlib.sha256()
+        self.size: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def checksum(self) -> FileChecksum:
+        return FileChecksum(self.size, self.digest.hexdigest())
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Readable file object hashing the bytes read through it from another file object,
+    to checksum an upload while it is read.
+
+    Args:
+    file (BinaryIO): File object the bytes are read from.
+    """
+
+    def __init__(self, file: BinaryIO):
+        super().__init__()
+        self.file = file
+        self.digest = hashlib.sha256()
+        self.size: int = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data: bytes = self.file.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data: bytes = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def checksum(self) -> FileChecksum:
+        return FileChecksum(self.size, self.digest.hexdigest())
+
+
+def check_transferred_size(
+    name: str, checksum: FileChecksum, expected_size: int
+) -> None:
+    """
+    Raises IOError when a transferred file does not have the size of its source, e.g.
+    a truncated download.
+    """
+    if checksum.size != expected_size:
+        raise IOError(
+            f"Incomplete transfer of {name}: {checksum.size} bytes transferred, "
+            f"{expected_size} expected"
+        )
+
+
+def file_checksum(path: Path) -> FileChecksum:
+    """
+    Returns the size and SHA-256 of a local file, read in chunks.
+    """
+    with open(path, "rb") as f:
+        reader = HashingReader(f)
+        while reader.read(CHUNK_SIZE):
+            pass
+    return reader.checksum()
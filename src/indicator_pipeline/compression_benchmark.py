@@ -0,0 +1,164 @@
+import json
+import logging
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import zarr
+from sleeplab_format import models
+
+from indicator_pipeline.utils import folder_size
+from sleeplab_converter.array_options import DEFAULT_LINK_MBPS
+from sleeplab_converter.array_writer import write_sample_array
+from sleeplab_converter.mars_database.convert import parse_edf
+
+logger = logging.getLogger(__name__)
+
+# Candidate zarr settings: (codec, compression level, shuffle)
+ZARR_CANDIDATES: List[Tuple[str, int, str]] = [
+    ("zstd", 3, "none"),
+    ("zstd", 7, "none"),
+    ("zstd", 7, "byte"),
+    ("zstd", 15, "byte"),
+    ("lz4", 1, "byte"),
+    ("blosc-zstd", 5, "byte"),
+    ("blosc-zstd", 5, "bit"),
+    ("blosc-lz4", 5, "byte"),
+    ("blosc-lz4", 5, "bit"),
+]
+# numpy (uncompressed) is the conversion default
+DEFAULT_SETTINGS: List[Dict[str, Any]] = [{"array_format": "numpy"}] + [
+    {
+        "array_format": "zarr",
+        "zarr_codec": codec,
+        "clevel": clevel,
+        "zarr_shuffle": shuffle,
+    }
+    for codec, clevel, shuffle in ZARR_CANDIDATES
+]
+
+
+def setting_name(setting: Dict[str, Any]) -> str:
+    """
+    Returns a short label of an array setting, e.g. 'zarr-blosc-zstd-5-bit'.
+    """
+    if setting["array_format"] != "zarr":
+        return setting["array_format"]
+    return f"zarr-{setting['zarr_codec']}-{setting['clevel']}-{setting['zarr_shuffle']}"
+
+
+def load_sample_arrays(edf_path: Path) -> Dict[str, models.SampleArray]:
+    """
+    Decodes every channel of a sample recording once, so that the benchmark measures
+    the array writing and not the EDF decoding.
+    """
+    _, sample_arrays, _ = parse_edf(edf_path)
+    loaded: Dict[str, models.SampleArray] = {}
+    for name, sarr in sample_arrays.items():
+        values: np.array = sarr.values_func()
+        loaded[name] = sarr.model_copy(update={"values_func": lambda v=values: v})
+    return loaded
+
+
+def read_back(path: Path, array_format: str) -> None:
+    """
+    Reads every array written under `path`, as ABOSA does when opening the SLF folder.
+    """
+    for channel_dir in path.iterdir():
+        if array_format == "zarr":
+            zarr.open_array(str(channel_dir / "data.zarr"), mode="r")[:]
+        else:
+            np.load(channel_dir / "data.npy")
+
+
+def benchmark_setting(
+    sample_arrays: Dict[str, models.SampleArray],
+    setting: Dict[str, Any],
+    work_dir: Path,
+    link_mbps: float = DEFAULT_LINK_MBPS,
+) -> Dict[str, Any]:
+    """
+    Writes the sample arrays with one setting and measures write time, size on disk,
+    compression ratio, read time and the estimated upload time over a `link_mbps` link.
+    """
+    out_dir: Path = work_dir / setting_name(setting)
+    out_dir.mkdir(parents=True)
+    raw_bytes: int = sum(sarr.values_func().nbytes for sarr in sample_arrays.values())
+
+    start: float = time.perf_counter()
+    for sarr in sample_arrays.values():
+        write_sample_array(
+            sarr,
+            out_dir / sarr.attributes.name,
+            array_format=setting["array_format"],
+            compression_level=setting.get("clevel", 7),
+            zarr_codec=setting.get("zarr_codec", "zstd"),
+            zarr_shuffle=setting.get("zarr_shuffle", "none"),
+        )
+    write_s: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_back(out_dir, setting["array_format"])
+    read_s: float = time.perf_counter() - start
+
+    size_bytes: int = folder_size(out_dir)
+    upload_s: float = size_bytes * 8 / (link_mbps * 1e6)
+    return {
+        "setting": setting_name(setting),
+        **setting,
+        "raw_bytes": raw_bytes,
+        "size_bytes": size_bytes,
+        "ratio": raw_bytes / size_bytes if size_bytes else 0.0,
+        "write_s": write_s,
+        "write_mb_s": raw_bytes / 1e6 / write_s if write_s else 0.0,
+        "read_s": read_s,
+        "upload_s": upload_s,
+        "total_s": write_s + upload_s + read_s,
+    }
+
+
+def run_compression_benchmark(
+    edf_path: Path,
+    link_mbps: float = DEFAULT_LINK_MBPS,
+    settings: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Benchmarks the array settings on a sample recording.
+    Returns one result per setting, sorted by estimated write + upload + read time:
+    the first one is the recommended setting for this link.
+    """
+    sample_arrays = load_sample_arrays(edf_path)
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="slf_compression_") as tmp:
+        for setting in settings or DEFAULT_SETTINGS:
+            result = benchmark_setting(sample_arrays, setting, Path(tmp), link_mbps)
+            logger.info(
+                f"[BENCHMARK] {result['setting']:<24} ratio {result['ratio']:5.2f} | "
+                f"size {result['size_bytes'] / 1e6:8.2f} MB | "
+                f"write {result['write_mb_s']:7.1f} MB/s | read {result['read_s']:6.2f}s | "
+                f"upload {result['upload_s']:7.2f}s"
+            )
+            results.append(result)
+
+    results.sort(key=lambda result: result["total_s"])
+    return results
+
+
+def write_benchmark_report(
+    results: List[Dict[str, Any]], edf_path: Path, link_mbps: float, path: Path
+) -> None:
+    """
+    Writes the benchmark results and the recommended setting as JSON.
+    """
+    report: Dict[str, Any] = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "sample_edf": str(edf_path),
+        "link_mbps": link_mbps,
+        "recommended": results[0] if results else None,
+        "results": results,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,88 @@
+import importlib.util
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Set
+
+from indicator_pipeline.excel_mapping import (
+    DESATURATION_MAP,
+    RECOVERY_MAP,
+    RATIOS_MAP,
+    SEVERITY_MAP,
+    SPO2_MAP,
+    TIME_BELOW_THRESHOLDS_MAP,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BASE_COLUMNS: List[str] = ["Filename", "TST", "n_desat", "n_reco", "ODI"]
+INDICATOR_MAPS: List[Dict[str, str]] = [
+    SPO2_MAP,
+    DESATURATION_MAP,
+    RECOVERY_MAP,
+    RATIOS_MAP,
+    SEVERITY_MAP,
+    TIME_BELOW_THRESHOLDS_MAP,
+]
+
+
+def get_required_columns() -> Set[str]:
+    """
+    Returns the set of ParameterValues columns used to build the JSON payloads.
+    """
+    columns: Set[str] = set(BASE_COLUMNS)
+    for mapping in INDICATOR_MAPS:
+        columns.update(mapping.keys())
+    return columns
+
+
+def get_excel_engine() -> str:
+    """
+    Returns the fastest available pandas Excel engine: 'calamine' if python-calamine
+    is installed, otherwise 'openpyxl'.
+    """
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "openpyxl"
+
+
+def to_numeric_column(column: "pd.Series") -> "pd.Series":
+    """
+    Converts a column to float, accepting European decimal commas.
+    Values that cannot be parsed become NaN.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return column.astype("float64")
+    as_text: pd.Series = column.astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(as_text, errors="coerce")
+
+
+def read_parameter_values(file: Path) -> "pd.DataFrame":
+    """
+    Reads an ABOSA ParameterValues workbook, keeping only the columns referenced by the
+    excel mapping tables. 'Filename' is returned as text and every other column as float64.
+    """
+    # pandas is imported by the parsers only: an import without changed workbook skips it
+    import pandas as pd
+
+    required: Set[str] = get_required_columns()
+    engine: str = get_excel_engine()
+
+    df: pd.DataFrame = pd.read_excel(
+        file,
+        engine=engine,
+        usecols=lambda column: column in required,
+        dtype={"Filename": str},
+    )
+    logger.info(
+        f"Read {len(df)} rows and {len(df.columns)} columns from {file.name} (engine={engine})"
+    )
+
+    for column in df.columns:
+        if column != "Filename":
+            df[column] = to_numeric_column(df[column])
+    return df
@@ -1,11 +1,11 @@
-import json
 import logging
 import os
 import datetime
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Set, Dict, Any
-
-import pandas as pd
+from typing import TYPE_CHECKING, List, Set, Dict, Any, Optional, Union, Tuple, Iterator
 
 from indicator_pipeline.excel_mapping import (
     DESATURATION_MAP,
@@ -15,36 +15,42 @@ from indicator_pipeline.excel_mapping import (
     SPO2_MAP,
     TIME_BELOW_THRESHOLDS_MAP,
 )
-from indicator_pipeline.send_json_to_api import send_batch
+from indicator_pipeline.change_detection import (
+    check_file_change,
+    payload_row_hash,
+    same_stat,
+)
+from indicator_pipeline.excel_reader import read_parameter_values
+from indicator_pipeline.filename_parsing import parse_filenames
+from indicator_pipeline.send_json_to_api import get_sent_index_key, send_batch
 from indicator_pipeline.utils import (
     get_repo_root,
-    parse_patient_visit_recording,
     try_parse_number,
-    get_log_dir,
-    load_slf_usage,
+    get_state,
     save_slf_usage,
 )
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
-PROCESSED_PATH: Path = get_log_dir() / "processed.json"
 
 
-def load_processed() -> Set[str]:
+def load_processed() -> Dict[str, Dict[str, Any]]:
     """
-    Loads json file with all ParameterValues files already processed.
+    Loads all ParameterValues folders already processed from the state store
+    (formerly processed.json). Each folder relative path maps to the fingerprint of its
+    workbook (file, size, mtime, sha256) and to the hash of each imported row. Folders
+    recorded by the legacy list format map to an empty fingerprint.
     """
-    if PROCESSED_PATH.exists():
-        with open(PROCESSED_PATH, "r") as f:
-            return set(json.load(f))
-    return set()
+    return get_state().get_processed()
 
 
-def save_processed(processed_set) -> None:
+def save_processed(processed: Dict[str, Dict[str, Any]]) -> None:
     """
-    Saves json file with all ParameterValues files already processed.
+    Saves the given ParameterValues folders and their fingerprints, one row per folder.
     """
-    with open(PROCESSED_PATH, "w") as f:
-        json.dump(sorted(processed_set), f, indent=2)
+    get_state().update_processed(processed)
 
 
 def find_parameter_folders(abosa_output_path: Path) -> List[Path]:
@@ -63,51 +69,127 @@ def find_parameter_folders(abosa_output_path: Path) -> List[Path]:
     return parameter_dirs
 
 
-def get_excel_from_rel_path(folder_path: Path, rel_path: str) -> pd.DataFrame:
+def find_workbook(folder_path: Path) -> Optional[Path]:
+    """
+    Returns the Excel file of a ParameterValues folder, or None if there is none.
+    """
+    xlsx_files: List[Path] = sorted(folder_path.glob("*.xlsx"))
+    return xlsx_files[0] if xlsx_files else None
+
+
+def get_excel_from_rel_path(folder_path: Path, rel_path: str) -> "pd.DataFrame":
     """
     Loads the Excel file from folder path in a dataframe.
     """
-    xlsx_files: List[Path] = list(folder_path.glob("*.xlsx"))
+    file: Optional[Path] = find_workbook(folder_path)
 
-    if not xlsx_files:
+    if file is None:
         logger.error(f"⛔️ No .xlsx file found in folder: {rel_path}")
         raise FileNotFoundError(f"No .xlsx file found in {rel_path}")
 
-    file: Path = xlsx_files[0]
-    df: pd.DataFrame = pd.read_excel(file)
-    df = df.astype(object)
-    df = df.where(df.notnull(), None)
-    return df
+    return read_parameter_values(file)
 
 
-def df_to_json_payloads(df: pd.DataFrame, abosa_version: str) -> List[Dict[str, Any]]:
+def get_payload_slf_id(payload: Dict[str, Any]) -> str:
     """
-    Convert each row of an Excel DataFrame into a compliant JSON payload.
+    Returns the slf identifier (PAxxx_Vx_FExxx) of the recording described by a payload.
+    """
+    rec = payload["sleep_exploration_recording"]
+    return f"PA{rec['patient_id']}_V{rec['visite_number']}_FE{rec['recording_number']}"
+
+
+def select_changed_rows(
+    payloads: List[Dict[str, Any]], previous_rows: Dict[str, str]
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Compares the payloads of a workbook with the row hashes stored at the previous import.
+    Returns the payloads that are new or whose content changed, and the hashes of the
+    unchanged rows. The hashes of the changed rows are only kept once they are sent.
+    """
+    unchanged_rows: Dict[str, str] = {}
+    changed: List[Dict[str, Any]] = []
+    for payload in payloads:
+        slf_id: str = get_payload_slf_id(payload)
+        row_hash: str = payload_row_hash(payload)
+        if previous_rows.get(slf_id) == row_hash:
+            unchanged_rows[slf_id] = row_hash
+        else:
+            changed.append(payload)
+    return changed, unchanged_rows
+
+
+def parse_column(
+    df: "pd.DataFrame", column: str, as_int: bool = False
+) -> List[Optional[Union[int, float]]]:
     """
+    Parses a whole DataFrame column with try_parse_number.
+    Returns a list of None if the column is missing.
+    """
+    if column not in df.columns:
+        return [None] * len(df)
+    return [try_parse_number(value, as_int) for value in df[column].tolist()]
+
 
-    def extract(patient_row, mapping: Dict[str, str]) -> Dict[str, Any]:
-        return {
-            new_key: try_parse_number(patient_row.get(old_key))
-            for old_key, new_key in mapping.items()
+def df_to_json_payloads(df: "pd.DataFrame", abosa_version: str) -> List[Dict[str, Any]]:
+    """
+    Convert each row of an Excel DataFrame into a compliant JSON payload.
+    Columns are parsed once as a whole instead of row by row.
+    """
+    mappings: Dict[str, Dict[str, str]] = {
+        "spo2_stat_attributes": SPO2_MAP,
+        "desaturation_event_attributes": DESATURATION_MAP,
+        "recovery_event_attributes": RECOVERY_MAP,
+        "ratio_attributes": RATIOS_MAP,
+        "severity_index_attributes": SEVERITY_MAP,
+        "time_below_threshold_attributes": TIME_BELOW_THRESHOLDS_MAP,
+    }
+    indicator_columns: Dict[str, Dict[str, List]] = {
+        table: {
+            new_key: parse_column(df, old_key) for old_key, new_key in mapping.items()
         }
+        for table, mapping in mappings.items()
+    }
+
+    filenames: List[str] = [
+        str(raw_filename).strip()
+        for raw_filename in (
+            df["Filename"].tolist() if "Filename" in df.columns else [""] * len(df)
+        )
+    ]
+    parsed_filenames: List[Tuple[str, str, str]] = parse_filenames(filenames)
+    tst_values: List = parse_column(df, "TST")
+    n_desat_values: List = parse_column(df, "n_desat", as_int=True)
+    n_reco_values: List = parse_column(df, "n_reco", as_int=True)
+    odi_values: List = parse_column(df, "ODI")
+    computing_date: str = datetime.date.today().isoformat()
 
     payloads: List[Dict[str, Any]] = []
 
-    for _, row in df.iterrows():
-        filename = str(row.get("Filename", "")).strip()
-        patient_id, visit_number, recording_number = parse_patient_visit_recording(
-            filename
-        )
+    for i, filename in enumerate(filenames):
+        patient_id, visit_number, recording_number = parsed_filenames[i]
 
         if not patient_id and not visit_number:
             logger.warning(f"⛔️ Skipped invalid filename: {filename}")
             continue
 
-        tst_value: float = try_parse_number(row.get("TST"))
+        tst_value: float = tst_values[i]
         if not tst_value:
             logger.warning(f"⛔️ Skipped {filename} (TST={tst_value})")
             continue
 
+        oximetry_attributes: Dict[str, Any] = {
+            "computing_date_abosa": computing_date,
+            "abosa_version": abosa_version,
+            "tst_abosa": tst_value,
+            "n_desat_abosa": n_desat_values[i],
+            "n_reco_abosa": n_reco_values[i],
+            "odi_abosa": odi_values[i],
+        }
+        for table, columns in indicator_columns.items():
+            oximetry_attributes[table] = {
+                new_key: values[i] for new_key, values in columns.items()
+            }
+
         payload: Dict[str, Any] = {
             "sleep_exploration_recording": {
                 "evaluation_generale_id": None,
@@ -117,22 +199,7 @@ def df_to_json_payloads(df: pd.DataFrame, abosa_version: str) -> List[Dict[str,
                 "recording_date": None,
                 "recording_number": try_parse_number(recording_number, as_int=True),
                 "recording_equipment_id": None,
-                "oximetry_record_attributes": {
-                    "computing_date_abosa": datetime.date.today().isoformat(),
-                    "abosa_version": abosa_version,
-                    "tst_abosa": tst_value,
-                    "n_desat_abosa": try_parse_number(row.get("n_desat"), as_int=True),
-                    "n_reco_abosa": try_parse_number(row.get("n_reco"), as_int=True),
-                    "odi_abosa": try_parse_number(row.get("ODI")),
-                    "spo2_stat_attributes": extract(row, SPO2_MAP),
-                    "desaturation_event_attributes": extract(row, DESATURATION_MAP),
-                    "recovery_event_attributes": extract(row, RECOVERY_MAP),
-                    "ratio_attributes": extract(row, RATIOS_MAP),
-                    "severity_index_attributes": extract(row, SEVERITY_MAP),
-                    "time_below_threshold_attributes": extract(
-                        row, TIME_BELOW_THRESHOLDS_MAP
-                    ),
-                },
+                "oximetry_record_attributes": oximetry_attributes,
             }
         }
         payloads.append(payload)
@@ -140,13 +207,132 @@ def df_to_json_payloads(df: pd.DataFrame, abosa_version: str) -> List[Dict[str,
     return payloads
 
 
-def excel_to_json(abosa_version: str) -> None:
+def parse_parameter_folder(
+    folder: Path, rel_path: str, abosa_version: str
+) -> List[Dict[str, Any]]:
     """
-    Processes abosa output Excel files and stores the data in JSON payloads.
+    Reads the Excel file of a ParameterValues folder and builds its JSON payloads.
+    Top-level function so that it can run in a worker process.
+    """
+    indicator_df: pd.DataFrame = get_excel_from_rel_path(folder, rel_path)
+    return df_to_json_payloads(indicator_df, abosa_version)
+
+
+def iter_parsed_folders(
+    folders: List[Tuple[Path, str]], abosa_version: str, workers: int
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Parses the given (folder, rel_path) pairs and yields (rel_path, payloads) as soon as
+    each workbook is ready. Uses a process pool when workers > 1.
+    Folders that fail to parse are logged and skipped.
+    """
+    if workers <= 1:
+        for folder, rel_path in folders:
+            logger.info(f"🚀 Processing : {rel_path}")
+            try:
+                yield rel_path, parse_parameter_folder(folder, rel_path, abosa_version)
+            except Exception as e:
+                logger.error(f"⛔️ Failed to process {rel_path}: {e}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: Dict[Future, str] = {}
+        for folder, rel_path in folders:
+            logger.info(f"🚀 Processing : {rel_path}")
+            future = executor.submit(
+                parse_parameter_folder, folder, rel_path, abosa_version
+            )
+            futures[future] = rel_path
+
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            try:
+                yield rel_path, future.result()
+            except Exception as e:
+                logger.error(f"⛔️ Failed to process {rel_path}: {e}")
+
+
+def send_parsed_folders(
+    send_queue: "queue.Queue[Optional[Tuple[str, List[Dict[str, Any]]]]]",
+    sent_folders: List[Tuple[str, List[Dict[str, Any]], bool]],
+    upsert: bool = False,
+) -> None:
     """
+    Sender stage: drains (rel_path, payloads) items from the queue and sends each batch
+    to the API until a None sentinel is received. For each folder sent, appends
+    (rel_path, payloads acknowledged by the API, whether all of them were) to sent_folders.
+    """
+    while True:
+        item = send_queue.get()
+        if item is None:
+            return
+        rel_path, payloads = item
+        logger.info(f"📨 Sending {len(payloads)} payload(s) from {rel_path}")
+        try:
+            acknowledged: Set[str] = send_batch(payloads, upsert=upsert)
+        except Exception as e:
+            logger.error(f"⛔️ Failed to send payloads from {rel_path}: {e}")
+            continue
+        sent_payloads: List[Dict[str, Any]] = [
+            payload
+            for payload in payloads
+            if get_sent_index_key(payload) in acknowledged
+        ]
+        if len(sent_payloads) < len(payloads):
+            logger.warning(
+                f"⚠️ {len(payloads) - len(sent_payloads)} payload(s) from {rel_path} "
+                "failed or skipped, the folder will be imported again"
+            )
+        sent_folders.append(
+            (rel_path, sent_payloads, len(sent_payloads) == len(payloads))
+        )
 
-    slf_usage: Dict[str, Dict[str, bool]] = load_slf_usage()
 
+def merge_import_state(
+    sent_folders: List[Tuple[str, List[Dict[str, Any]], bool]],
+    entries: Dict[str, Dict[str, Any]],
+) -> None:
+    """
+    Records the state of this run: folder fingerprints (processed) and recordings sent,
+    marked as computed by ABOSA (slf_usage). `entries` maps folder relative paths to their
+    new fingerprint and unchanged row hashes; folders with payloads are only recorded once
+    all of these have been acknowledged by the API, with the hashes of the rows sent.
+    Only the rows concerned are written, so concurrent updates by other steps are kept.
+    """
+    complete_paths: Set[str] = set()
+    for rel_path, payloads, complete in sent_folders:
+        if complete and rel_path in entries:
+            complete_paths.add(rel_path)
+            entries[rel_path]["rows"].update(
+                {
+                    get_payload_slf_id(payload): payload_row_hash(payload)
+                    for payload in payloads
+                }
+            )
+    to_record: Dict[str, Dict[str, Any]] = {
+        rel_path: entry
+        for rel_path, entry in entries.items()
+        if rel_path in complete_paths or not entry.get("pending")
+    }
+    if to_record:
+        for entry in to_record.values():
+            entry.pop("pending", None)
+        save_processed(to_record)
+
+    slf_usage: Dict[str, Dict[str, bool]] = {
+        get_payload_slf_id(payload): {"abosa": True}
+        for _, payloads, _ in sent_folders
+        for payload in payloads
+    }
+    if slf_usage:
+        save_slf_usage(slf_usage)
+
+
+def get_abosa_output() -> Path:
+    """
+    Returns the ABOSA output folder: ABOSA_OUTPUT_PATH, or 'abosa-output' next to the
+    repository. Raises FileNotFoundError if it does not exist.
+    """
     custom_path: str = os.environ.get("ABOSA_OUTPUT_PATH")
     if custom_path:
         abosa_output: Path = Path(custom_path)
@@ -158,39 +344,100 @@ def excel_to_json(abosa_version: str) -> None:
     if not abosa_output.exists():
         logger.error(f"The expected folder does not exist : {abosa_output}")
         raise FileNotFoundError(f"The abosa-output folder is missing : {abosa_output}")
+    return abosa_output
 
-    processed: Set[str] = load_processed()
-    new_processed: Set[str] = set(processed)
 
+def excel_to_json(abosa_version: str, workers: int = 1, upsert: bool = False) -> None:
+    """
+    Processes abosa output Excel files and stores the data in JSON payloads.
+    Workbooks whose size, mtime and content hash match processed.json are skipped; for
+    changed workbooks only new or modified rows are sent.
+    Workbooks are parsed by `workers` processes while a sender thread posts the
+    payloads already built. The slf_usage and processed state is updated once at the end.
+    With `upsert`, recordings already sent whose indicators changed are updated in MARS.
+    """
+    abosa_output: Path = get_abosa_output()
     param_dirs: List[Path] = find_parameter_folders(abosa_output)
 
     if not param_dirs:
         logger.error("No folders to process in abosa-output")
         raise RuntimeError("No folders to process in abosa-output")
 
+    import_parameter_folders(param_dirs, abosa_output, abosa_version, workers, upsert)
+
+
+def import_parameter_folders(
+    param_dirs: List[Path],
+    abosa_output: Path,
+    abosa_version: str,
+    workers: int = 1,
+    upsert: bool = False,
+) -> List[str]:
+    """
+    Imports the given ParameterValues folders, skipping the workbooks unchanged since
+    their last import. Returns the relative paths of the folders whose payloads were all
+    acknowledged by the API.
+    """
+    processed: Dict[str, Dict[str, Any]] = load_processed()
+
+    to_process: List[Tuple[Path, str]] = []
+    entries: Dict[str, Dict[str, Any]] = {}
     for folder in param_dirs:
         rel_path: str = str(folder.relative_to(abosa_output))
+        workbook: Optional[Path] = find_workbook(folder)
 
-        if rel_path in processed:
-            logger.info(f"✅ Already processed : {rel_path}")
+        if workbook is None:
+            logger.error(f"⛔️ No .xlsx file found in folder: {rel_path}")
             continue
 
-        logger.info(f"🚀 Processing : {rel_path}")
-        indicator_df: pd.DataFrame = get_excel_from_rel_path(folder, rel_path)
-        payloads: List[Dict[str, Any]] = df_to_json_payloads(
-            indicator_df, abosa_version
-        )
-
-        for payload in payloads:
-            rec = payload["sleep_exploration_recording"]
-            slf_id = f"PA{rec['patient_id']}_V{rec['visite_number']}_FE{rec['recording_number']}"
-            if slf_id not in slf_usage:
-                slf_usage[slf_id] = {}
-            slf_usage[slf_id]["abosa"] = True
-
-        send_batch(payloads)
+        entry: Optional[Dict[str, Any]] = processed.get(rel_path)
+        if entry is not None and not entry.get("sha256"):
+            # Folder recorded before fingerprints existed: adopt its current content
+            _, fingerprint = check_file_change(workbook, None)
+            entries[rel_path] = {**fingerprint, "rows": {}}
+            logger.info(f"✅ Already processed (fingerprint recorded) : {rel_path}")
+            continue
 
-        new_processed.add(rel_path)
+        changed, fingerprint = check_file_change(workbook, entry)
+        if not changed:
+            if not same_stat(entry, fingerprint):
+                entries[rel_path] = {**entry, **fingerprint}
+            logger.info(f"✅ Already processed : {rel_path}")
+            continue
 
-    save_processed(new_processed)
-    save_slf_usage(slf_usage)
+        if entry is not None:
+            logger.info(f"🔁 Workbook changed since last import : {rel_path}")
+        entries[rel_path] = {**fingerprint, "rows": {}, "pending": True}
+        to_process.append((folder, rel_path))
+
+    send_queue: queue.Queue = queue.Queue(maxsize=max(2, 2 * workers))
+    sent_folders: List[Tuple[str, List[Dict[str, Any]], bool]] = []
+    sender = threading.Thread(
+        target=send_parsed_folders,
+        args=(send_queue, sent_folders, upsert),
+        name="payload-sender",
+        daemon=True,
+    )
+    sender.start()
+
+    try:
+        for rel_path, payloads in iter_parsed_folders(
+            to_process, abosa_version, workers
+        ):
+            previous_rows: Dict[str, str] = (processed.get(rel_path) or {}).get(
+                "rows", {}
+            )
+            changed_payloads, unchanged_rows = select_changed_rows(
+                payloads, previous_rows
+            )
+            entries[rel_path]["rows"] = unchanged_rows
+            if len(changed_payloads) < len(payloads):
+                logger.info(
+                    f"🔁 {len(changed_payloads)}/{len(payloads)} row(s) changed in {rel_path}"
+                )
+            send_queue.put((rel_path, changed_payloads))
+    finally:
+        send_queue.put(None)
+        sender.join()
+        merge_import_state(sent_folders, entries)
+    return [rel_path for rel_path, _, complete in sent_folders if complete]
@@ -0,0 +1,70 @@
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# PAxxx followed by an optional visit (PA123V1, PA123_V1) and FExxxx anywhere in the name
+PATIENT_VISIT_PATTERN = re.compile(r"PA(\d+)(?:_?V(\d+))?")
+RECORDING_PATTERN = re.compile(r"FE(\d+)")
+
+# Names of a few years of remote listings, subjects and Excel rows
+PARSE_CACHE_SIZE: int = 1 << 16
+
+PARSED_COLUMNS: List[str] = ["patient_id", "visit", "recording"]
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_recording(filename: str) -> str:
+    """
+    Returns the recording number of FExxxx in a file or folder name, "" if absent.
+    """
+    match = RECORDING_PATTERN.search(filename)
+    return match.group(1) if match else ""
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_filename(filename: str) -> Tuple[str, str, str]:
+    """
+    Returns the (patient id, visit number, recording number) of a file or folder name,
+    e.g. ('123', '1', '0001') for 'PA123_V1_FE0001'. Each part is "" when absent, and
+    all of them without patient id.
+    """
+    match = PATIENT_VISIT_PATTERN.search(filename)
+    if match is None:
+        return "", "", ""
+    return match.group(1), match.group(2) or "", parse_recording(filename)
+
+
+def parse_filenames(
+    filenames: Union[Iterable[str], "pd.Series"],
+) -> Union[List[Tuple[str, str, str]], "pd.DataFrame"]:
+    """
+    Parses many names at once, each distinct name only once.
+    Returns a list of (patient id, visit number, recording number) for a list of names,
+    or a DataFrame with the columns patient_id, visit and recording (same index) for a
+    pandas Series.
+    """
+    if hasattr(filenames, "str"):
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(filenames)
+        parsed = np.array(
+            [parse_filename(str(name)) for name in uniques] + [("", "", "")],
+            dtype=object,
+        )
+        # Missing values have code -1, i.e. the trailing empty row
+        return pd.DataFrame(
+            parsed[codes], columns=PARSED_COLUMNS, index=filenames.index
+        )
+
+    distinct: Dict[str, Tuple[str, str, str]] = {}
+    result: List[Tuple[str, str, str]] = []
+    for name in filenames:
+        found = distinct.get(name)
+        if found is None:
+            found = distinct[name] = parse_filename(name)
+        result.append(found)
+    return result
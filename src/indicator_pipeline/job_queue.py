@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A worker renews its lease every third of this duration while converting, so a lease
+# only expires when the worker stopped (crash, kill, lost machine)
+DEFAULT_LEASE_S: float = 300.0
+# Claims of a recording before it is marked failed, so that a recording crashing every
+# worker does not go round forever
+MAX_ATTEMPTS: int = 3
+POLL_S: float = 10.0
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    year TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    visit TEXT NOT NULL,
+    recording TEXT NOT NULL,
+    files TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, size_bytes);
+"""
+
+COLUMNS: str = (
+    "job_id, year, patient_id, visit, recording, files, size_bytes, status, owner, "
+    "lease_expires, attempts, error"
+)
+
+
+def worker_name() -> str:
+    """
+    Returns the owner name of the leases taken by this process (<host>:<pid>).
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _job(row: tuple) -> Dict[str, Any]:
+    job: Dict[str, Any] = dict(zip([c.strip() for c in COLUMNS.split(",")], row))
+    job["files"] = json.loads(job["files"])
+    return job
+
+
+class JobQueue:
+    """
+    SQLite job queue distributing the conversion of the patient recordings over any
+    number of worker processes, on one machine or several machines sharing a volume.
+
+    The coordinator enqueues one job per recording without SLF folder. A worker claims
+    the largest pending job with a lease, converts and uploads the recording, then marks
+    it done. A job whose lease expired (worker crashed or killed) is claimed again by the
+    next worker, and a job failing or expiring MAX_ATTEMPTS times is marked failed.
+
+    The database keeps the default rollback journal: WAL needs shared memory and does not
+    work on a network file system, whereas the rollback journal only relies on the file
+    locks of the volume. Leases are compared to the clock of each machine, which must be
+    kept in sync (NTP).
+
+    Args:
+    db_path (Path): Path to the SQLite database file, on the volume shared by the workers.
+    lease_s (float): Duration of a lease in seconds.
+    max_attempts (int): Claims of a job before it is marked failed.
+    timeout (float): Seconds to wait for a lock held by another process.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        lease_s: float = DEFAULT_LEASE_S,
+        max_attempts: int = MAX_ATTEMPTS,
+        timeout: float = 60.0,
+    ):
+        self.db_path = db_path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=self.timeout)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Opens a connection in a write transaction taken up front (BEGIN IMMEDIATE), so that
+        two workers cannot claim the same job. Commits on success, rolls back on error.
+        """
+        conn = sqlite3.connect(
+            str(self.db_path), timeout=self.timeout, isolation_level=None
+        )
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(
+        self, year: str, recordings: Dict[Tuple[str, str, str], Dict[str, int]]
+    ) -> int:
+        """
+        Adds one job per recording {(patient, visit, recording): {file: size}}.
+        Jobs already queued are kept, except failed ones which are queued again.
+        Returns the number of jobs added or queued again.
+        """
+        now: float = time.time()
+        rows = [
+            (
+                f"{year}/{patient_id}_{visit}_{recording}",
+                year,
+                patient_id,
+                visit,
+                recording,
+                json.dumps(files),
+                sum(files.values()),
+                now,
+            )
+            for (patient_id, visit, recording), files in recordings.items()
+        ]
+        with self.connect() as conn:
+            before: int = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (job_id, year, patient_id, visit, recording, files, "
+                "size_bytes, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET files = excluded.files, "
+                "size_bytes = excluded.size_bytes, status = 'pending', owner = NULL, "
+                "lease_expires = NULL, attempts = 0, error = NULL, "
+                "updated_at = excluded.updated_at WHERE jobs.status = 'failed'",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def claim(
+        self, owner: str, years: Optional[List[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Leases the largest pending job (or job whose lease expired) to `owner`,
+        optionally among the given years. Returns None when no job is available.
+        """
+        now: float = time.time()
+        year_filter: str = ""
+        params: List[Any] = [now]
+        if years:
+            year_filter = f" AND year IN ({', '.join('?' * len(years))})"
+            params.extend(years)
+
+        with self.connect() as conn:
+            expired = conn.execute(
+                "UPDATE jobs SET status = 'failed', owner = NULL, lease_expires = NULL, "
+                "error = COALESCE(error, 'lease expired'), updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            if expired.rowcount:
+                logger.warning(
+                    f"[QUEUE] {expired.rowcount} job(s) failed after {self.max_attempts} attempts"
+                )
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE (status = 'pending' OR "
+                f"(status = 'leased' AND lease_expires < ?)){year_filter} "
+                "ORDER BY size_bytes DESC, job_id LIMIT 1",
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            job: Dict[str, Any] = _job(row)
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                (owner, now + self.lease_s, now, job["job_id"]),
+            )
+
+        if job["status"] == "leased":
+            logger.warning(
+                f"[QUEUE] Reclaimed {job['job_id']}, lease of {job['owner']} expired"
+            )
+        job.update(status="leased", owner=owner, attempts=job["attempts"] + 1)
+        return job
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """
+        Extends the lease of `owner` on a job.
+        Returns False if the lease was lost (expired and claimed by another worker).
+        """
+        now: float = time.time()
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ? AND owner = ? AND status = 'leased'",
+                (now + self.lease_s, now, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str) -> None:
+        """
+        Marks a job done. The recording is converted and uploaded, so the job is done
+        even if its lease expired in the meantime.
+        """
+        with self.connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', owner = NULL, lease_expires = NULL, "
+                "error = NULL, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, owner: str, error: str) -> None:
+        """
+        Releases the lease of `owner` after a failure: the job is pending again, or
+        failed once it reached max_attempts.
+        """
+        with self.connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'pending' END, owner = NULL, lease_expires = NULL, error = ?, "
+                "updated_at = ? WHERE job_id = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), job_id, owner),
+            )
+
+    def counts(self, years: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Returns the number of jobs by status.
+        """
+        query: str = "SELECT status, COUNT(*) FROM jobs"
+        if years:
+            query += f" WHERE year IN ({', '.join('?' * len(years))})"
+        with self.connect() as conn:
+            rows = conn.execute(query + " GROUP BY status", years or []).fetchall()
+        return {status: count for status, count in rows}
+
+    @contextmanager
+    def lease(self, job: Dict[str, Any]) -> Iterator[threading.Event]:
+        """
+        Renews the lease of a job in the background while the block runs.
+        Yields an event set if the lease was lost.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def heartbeat() -> None:
+            while not stop.wait(self.lease_s / 3):
+                try:
+                    renewed: bool = self.renew(job["job_id"], job["owner"])
+                except sqlite3.Error as e:
+                    logger.warning(
+                        f"[QUEUE] Unable to renew lease of {job['job_id']}: {e}"
+                    )
+                    continue
+                if not renewed:
+                    logger.warning(f"[QUEUE] Lost lease of {job['job_id']}")
+                    lost.set()
+                    return
+
+        thread = threading.Thread(
+            target=heartbeat, name=f"lease-{job['job_id']}", daemon=True
+        )
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+
+def run_worker(
+    queue: JobQueue,
+    handler: Callable[[Dict[str, Any], threading.Event], None],
+    owner: Optional[str] = None,
+    years: Optional[List[str]] = None,
+    poll_s: float = POLL_S,
+) -> Dict[str, int]:
+    """
+    Claims and processes jobs until none is pending or leased by another worker: while
+    other workers hold leases it keeps polling, to take over their jobs if they stop.
+    `handler` gets the job and the event set if its lease is lost, to check before
+    uploading. A job is marked done when `handler` returns and released for a retry
+    when it raises; a job whose lease was lost is left to the worker that took it over.
+    Returns the number of jobs done, failed and lost by this worker.
+    """
+    owner = owner or worker_name()
+    processed: Dict[str, int] = {"done": 0, "failed": 0, "lost": 0}
+    while True:
+        job: Optional[Dict[str, Any]] = queue.claim(owner, years)
+        if job is None:
+            counts: Dict[str, int] = queue.counts(years)
+            if not counts.get("pending") and not counts.get("leased"):
+                return processed
+            logger.info(
+                f"[QUEUE] No job available, {counts.get('leased', 0)} leased by other workers"
+            )
+            time.sleep(poll_s)
+            continue
+
+        logger.info(
+            f"[QUEUE] {owner} claimed {job['job_id']} "
+            f"({job['size_bytes'] / 1e6:.1f} MB, attempt {job['attempts']})"
+        )
+        lost = threading.Event()
+        try:
+            with queue.lease(job) as lost:
+                handler(job, lost)
+        except Exception as e:
+            if not lost.is_set():
+                logger.error(f"[QUEUE] {job['job_id']} failed: {e}")
+                queue.fail(job["job_id"], owner, str(e))
+                processed["failed"] += 1
+                continue
+            logger.error(f"[QUEUE] {job['job_id']} aborted: {e}")
+        if lost.is_set():
+            logger.warning(f"[QUEUE] {job['job_id']} not completed, its lease was lost")
+            processed["lost"] += 1
+            continue
+        queue.complete(job["job_id"])
+        processed["done"] += 1
+        logger.info(f"[QUEUE] {job['job_id']} done")
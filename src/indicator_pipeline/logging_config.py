@@ -1,18 +1,24 @@
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import Iterator
 
+LOGS_DIR = Path("logs")
 
-def setup_logging(step: str) -> None:
+
+def setup_logging(step: str) -> str:
     """
     Sets up logging for the pipeline with one main and one warning/error log file.
     The logs are stored in the "logs" directory and include the specified years and a timestamp.
+    Returns the timestamp identifying this run, used to name the other run outputs (metrics...).
     """
-    Path("logs").mkdir(exist_ok=True)
+    LOGS_DIR.mkdir(exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    full_log = f"logs/pipeline_{step}_{timestamp}.log"
-    warn_log = f"logs/warnings_and_errors_{step}_{timestamp}.log"
+    full_log = f"{LOGS_DIR}/pipeline_{step}_{timestamp}.log"
+    warn_log = f"{LOGS_DIR}/warnings_and_errors_{step}_{timestamp}.log"
 
     formatter = logging.Formatter(
         "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
@@ -39,3 +45,45 @@ def setup_logging(step: str) -> None:
 
     logging.info(f"Logging initialized. Full log: {full_log}")
     logging.info(f"Warnings & errors logged to: {warn_log}")
+    return timestamp
+
+
+class ThreadNameFilter(logging.Filter):
+    """
+    Keeps the records logged from the threads whose name contains `tag`.
+    """
+
+    def __init__(self, tag: str):
+        super().__init__()
+        self.tag = tag
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.tag in record.threadName
+
+
+@contextmanager
+def year_logging(step: str, run_id: str, year: str) -> Iterator[Path]:
+    """
+    Names the current thread after `year` and copies, while the block runs, the records
+    of the threads tagged with the year (the thread itself and its slf-writer-<year>
+    workers) to logs/pipeline_<step>_<run_id>_<year>.log, so that years converted at the
+    same time each keep a readable log.
+    """
+    thread = threading.current_thread()
+    thread_name: str = thread.name
+    thread.name = f"year-{year}"
+    year_log: Path = LOGS_DIR / f"pipeline_{step}_{run_id}_{year}.log"
+    handler = logging.FileHandler(year_log, encoding="utf-8")
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    )
+    handler.addFilter(ThreadNameFilter(year))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        yield year_log
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+        thread.name = thread_name
@@ -0,0 +1,153 @@
+import importlib.util
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RSS_SAMPLING_INTERVAL_S: float = 0.05
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Returns the resident set size of the current process in bytes.
+    Uses psutil when installed (any platform), otherwise /proc on Linux.
+    Returns None when the RSS cannot be measured.
+    """
+    if importlib.util.find_spec("psutil") is not None:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    return None
+
+
+class MemoryBudget:
+    """
+    Admission control on the estimated memory of the work in flight.
+
+    `reserve(nbytes)` blocks until `nbytes` fit in the budget next to the reservations
+    already held. A reservation larger than the whole budget is admitted alone, so that
+    an oversized recording is still converted instead of blocking forever.
+
+    Args:
+    budget_bytes (Optional[int]): Memory budget in bytes, None for no limit.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        self.budget_bytes = budget_bytes
+        self.in_use: int = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes: int) -> bool:
+        return (
+            self.budget_bytes is None
+            or self.in_use == 0
+            or self.in_use + nbytes <= self.budget_bytes
+        )
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        """
+        Holds `nbytes` of the budget while the enclosed block runs.
+        """
+        if self.budget_bytes is not None and nbytes > self.budget_bytes:
+            logger.warning(
+                f"[MEMORY] Estimated {nbytes / 1024 ** 2:.0f} MiB exceeds the budget of "
+                f"{self.budget_bytes / 1024 ** 2:.0f} MiB, running it alone"
+            )
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(nbytes))
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= nbytes
+                self._condition.notify_all()
+
+
+class PeakWindow:
+    """
+    Peak RSS observed by an RSSSampler between the opening and closing of a window.
+    """
+
+    def __init__(self, start_rss: Optional[int]):
+        self.peak_bytes: Optional[int] = start_rss
+
+    def update(self, rss: int) -> None:
+        if self.peak_bytes is None or rss > self.peak_bytes:
+            self.peak_bytes = rss
+
+
+class RSSSampler:
+    """
+    Background thread sampling the process RSS at a fixed interval and tracking the peak
+    of every open window. The RSS is process-wide: when several recordings are converted
+    at the same time, the peak of each window includes the memory of the others.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLING_INTERVAL_S):
+        self.interval = interval
+        self._windows: List[PeakWindow] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        rss: Optional[int] = current_rss_bytes()
+        if rss is None:
+            return
+        with self._lock:
+            for window in self._windows:
+                window.update(rss)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "RSSSampler":
+        if current_rss_bytes() is None:
+            logger.warning(
+                "[MEMORY] RSS cannot be measured on this platform (install psutil)"
+            )
+            return self
+        self._thread = threading.Thread(
+            target=self._run, name="rss-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @contextmanager
+    def window(self) -> Iterator[PeakWindow]:
+        """
+        Tracks the peak RSS while the enclosed block runs.
+        """
+        window = PeakWindow(current_rss_bytes())
+        with self._lock:
+            self._windows.append(window)
+        try:
+            yield window
+        finally:
+            self._sample()
+            with self._lock:
+                self._windows.remove(window)
+
+    def __enter__(self) -> "RSSSampler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
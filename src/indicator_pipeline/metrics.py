@@ -0,0 +1,201 @@
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+_current_recording: ContextVar[Optional[str]] = ContextVar(
+    "current_recording", default=None
+)
+
+
+class Metrics:
+    """
+    Thread-safe registry of timing spans, counters and gauges for one pipeline run.
+
+    Spans measure the wall time of an operation (SFTP transfer, EDF decoding, API call...)
+    and counters accumulate quantities (bytes transferred, samples decoded...).
+    Both are aggregated globally and, when recorded inside `recording(...)`, per recording.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at: float = time.time()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.recordings: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def reset(self) -> None:
+        """
+        Clears everything recorded so far.
+        """
+        with self._lock:
+            self.started_at = time.time()
+            self.spans.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.recordings.clear()
+
+    def _recording_entry(self, recording_id: str) -> Dict[str, Dict[str, float]]:
+        return self.recordings.setdefault(
+            recording_id, {"spans": {}, "counters": {}, "gauges": {}}
+        )
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Records one occurrence of span `name` that lasted `seconds`.
+        """
+        recording_id: Optional[str] = _current_recording.get()
+        with self._lock:
+            stats = self.spans.setdefault(
+                name,
+                {"count": 0, "total_s": 0.0, "min_s": float("inf"), "max_s": 0.0},
+            )
+            stats["count"] += 1
+            stats["total_s"] += seconds
+            stats["min_s"] = min(stats["min_s"], seconds)
+            stats["max_s"] = max(stats["max_s"], seconds)
+            if recording_id is not None:
+                rec_spans = self._recording_entry(recording_id)["spans"]
+                rec_spans[name] = rec_spans.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: float = 1) -> None:
+        """
+        Adds `value` to counter `name`.
+        """
+        recording_id: Optional[str] = _current_recording.get()
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if recording_id is not None:
+                rec_counters = self._recording_entry(recording_id)["counters"]
+                rec_counters[name] = rec_counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        """
+        Records the maximum value seen for gauge `name` (e.g. peak memory).
+        """
+        recording_id: Optional[str] = _current_recording.get()
+        with self._lock:
+            self.gauges[name] = max(self.gauges.get(name, value), value)
+            if recording_id is not None:
+                rec_gauges = self._recording_entry(recording_id)["gauges"]
+                rec_gauges[name] = max(rec_gauges.get(name, value), value)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block as one occurrence of span `name`.
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns a JSON-serializable snapshot of the metrics.
+        """
+        with self._lock:
+            spans = {
+                name: {**stats, "avg_s": stats["total_s"] / stats["count"]}
+                for name, stats in sorted(self.spans.items())
+            }
+            return {
+                "started_at": self.started_at,
+                "duration_s": time.time() - self.started_at,
+                "spans": spans,
+                "counters": dict(sorted(self.counters.items())),
+                "gauges": dict(sorted(self.gauges.items())),
+                "recordings": json.loads(json.dumps(self.recordings)),
+            }
+
+    def write_json(self, path: Path) -> None:
+        """
+        Writes the metrics snapshot as JSON.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    def write_prometheus(self, path: Path, prefix: str = "indicator_pipeline") -> None:
+        """
+        Writes the global metrics in the Prometheus text exposition format, for the
+        node_exporter textfile collector. The file is written atomically.
+        """
+        snapshot: Dict[str, Any] = self.to_dict()
+        lines = [
+            f"# TYPE {prefix}_span_seconds_total counter",
+            *(
+                f'{prefix}_span_seconds_total{{span="{name}"}} {stats["total_s"]:.6f}'
+                for name, stats in snapshot["spans"].items()
+            ),
+            f"# TYPE {prefix}_span_count counter",
+            *(
+                f'{prefix}_span_count{{span="{name}"}} {stats["count"]}'
+                for name, stats in snapshot["spans"].items()
+            ),
+            f"# TYPE {prefix}_span_max_seconds gauge",
+            *(
+                f'{prefix}_span_max_seconds{{span="{name}"}} {stats["max_s"]:.6f}'
+                for name, stats in snapshot["spans"].items()
+            ),
+        ]
+        for name, value in snapshot["counters"].items():
+            metric = f"{prefix}_{_prometheus_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in snapshot["gauges"].items():
+            metric = f"{prefix}_{_prometheus_name(name)}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        lines += [
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds {snapshot['duration_s']:.3f}",
+        ]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
+
+
+def _prometheus_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+METRICS = Metrics()
+
+
+def span(name: str):
+    """
+    Times the enclosed block in the run metrics (see Metrics.span).
+    """
+    return METRICS.span(name)
+
+
+def count(name: str, value: float = 1) -> None:
+    """
+    Adds `value` to a counter of the run metrics.
+    """
+    METRICS.count(name, value)
+
+
+def gauge(name: str, value: float) -> None:
+    """
+    Records a gauge value (maximum kept) in the run metrics.
+    """
+    METRICS.gauge(name, value)
+
+
+@contextmanager
+def recording(recording_id: str) -> Iterator[None]:
+    """
+    Attributes the spans and counters recorded in the enclosed block to a recording.
+    """
+    token = _current_recording.set(recording_id)
+    try:
+        yield
+    finally:
+        _current_recording.reset(token)
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import logging
+import pstats
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_N: int = 30
+
+
+class RecordingProfiler:
+    """
+    Optional per-recording profiler: CPU time with cProfile and memory with tracemalloc.
+
+    Disabled by default, in which case `profile(...)` costs a single attribute check.
+    Once enabled, every block run inside `profile(recording_id)` is added to the cProfile
+    statistics of that recording, and the memory it allocated and still holds at the end
+    of the block, as well as its peak traced memory, are attributed to the recording.
+    Only one block is profiled at a time: nested blocks are part of the enclosing one,
+    and blocks run by other threads meanwhile are not profiled. The latter are counted
+    per recording in `skipped`, logged and listed in the report.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self._lock = threading.Lock()
+        self._active_thread: Optional[int] = None
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.peak_bytes: Dict[str, int] = {}
+        self.allocations: Dict[Tuple[str, int], List[int]] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def enable(self) -> None:
+        """
+        Turns profiling on and starts tracing memory allocations.
+        """
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        """
+        Turns profiling off and stops tracing memory allocations.
+        """
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _acquire(self, recording_id: str) -> bool:
+        thread_id: int = threading.get_ident()
+        with self._lock:
+            if self._active_thread is None:
+                self._active_thread = thread_id
+                return True
+            if self._active_thread == thread_id:
+                return False
+            self.skipped[recording_id] = self.skipped.get(recording_id, 0) + 1
+            first_skip: bool = self.skipped[recording_id] == 1
+        if first_skip:
+            logger.warning(
+                f"[PROFILE] {recording_id} not profiled: another recording is being "
+                "profiled at the same time (use --workers 1 to profile every recording)"
+            )
+        return False
+
+    @contextmanager
+    def profile(self, recording_id: str) -> Iterator[None]:
+        """
+        Profiles the enclosed block and attributes it to `recording_id`.
+        """
+        if not self.enabled or not self._acquire(recording_id):
+            yield
+            return
+
+        profiler: cProfile.Profile = self.profiles.setdefault(
+            recording_id, cProfile.Profile()
+        )
+        tracemalloc.reset_peak()
+        before: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            peak: int = tracemalloc.get_traced_memory()[1]
+            after: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            self._record_memory(recording_id, peak, before, after)
+            with self._lock:
+                self._active_thread = None
+
+    def _record_memory(
+        self,
+        recording_id: str,
+        peak: int,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+    ) -> None:
+        self.peak_bytes[recording_id] = max(self.peak_bytes.get(recording_id, 0), peak)
+        trace_filter = tracemalloc.Filter(False, tracemalloc.__file__)
+        for stat in after.filter_traces([trace_filter]).compare_to(
+            before.filter_traces([trace_filter]), "lineno"
+        ):
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            entry = self.allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+            entry[0] += stat.size_diff
+            entry[1] += stat.count_diff
+
+    def write_report(
+        self, output_dir: Path, top_n: int = DEFAULT_TOP_N
+    ) -> Optional[Path]:
+        """
+        Writes one cProfile file per recording (<recording>.prof, readable with pstats
+        or snakeviz) and a report.txt merging the top-N hot functions of all recordings,
+        the top-N allocation sites, the peak traced memory of each recording and the
+        recordings whose blocks were skipped.
+        Returns the report path, or None if nothing was profiled.
+        """
+        if not self.profiles:
+            return None
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        merged: Optional[pstats.Stats] = None
+        for recording_id, profiler in sorted(self.profiles.items()):
+            profiler.dump_stats(str(output_dir / f"{_safe_name(recording_id)}.prof"))
+            if merged is None:
+                merged = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                merged.add(profiler)
+
+        cpu_stream = io.StringIO()
+        merged.stream = cpu_stream
+        merged.sort_stats("cumulative").print_stats(top_n)
+        tottime_stream = io.StringIO()
+        merged.stream = tottime_stream
+        merged.sort_stats("tottime").print_stats(top_n)
+
+        lines: List[str] = [
+            f"Profiled recordings: {len(self.profiles)}",
+            f"Recordings with blocks not profiled (concurrent): {len(self.skipped)}",
+            "",
+            f"=== Top {top_n} functions by cumulative time (all recordings) ===",
+            cpu_stream.getvalue(),
+            f"=== Top {top_n} functions by own time (all recordings) ===",
+            tottime_stream.getvalue(),
+            f"=== Top {top_n} allocation sites (memory still held at the end of a block) ===",
+        ]
+        top_allocations = sorted(
+            self.allocations.items(), key=lambda item: item[1][0], reverse=True
+        )[:top_n]
+        for (filename, lineno), (size, count) in top_allocations:
+            lines.append(
+                f"{size / 1024 ** 2:10.2f} MiB {count:9d} blocks  {filename}:{lineno}"
+            )
+        lines += ["", "=== Peak traced memory per recording ==="]
+        for recording_id, peak in sorted(
+            self.peak_bytes.items(), key=lambda item: item[1], reverse=True
+        ):
+            lines.append(f"{peak / 1024 ** 2:10.2f} MiB  {recording_id}")
+        if self.skipped:
+            lines += [
+                "",
+                "=== Blocks not profiled, run while another recording was profiled ===",
+            ]
+            for recording_id, count in sorted(self.skipped.items()):
+                lines.append(f"{count:10d} block(s)  {recording_id}")
+
+        report_path: Path = output_dir / "report.txt"
+        report_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return report_path
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+PROFILER = RecordingProfiler()
+
+
+def profile(recording_id: str):
+    """
+    Profiles the enclosed block for a recording when profiling is enabled
+    (see RecordingProfiler.profile).
+    """
+    return PROFILER.profile(recording_id)
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from indicator_pipeline import metrics
+from indicator_pipeline.checksums import FileChecksum, file_checksum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUOTA_GB: float = 50.0
+# Suffix of the file keeping the SHA-256 of a cache entry, next to it
+CHECKSUM_SUFFIX: str = ".sha256"
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """
+    Hard-links `source` to `target` (instant, no extra disk space) or copies it when
+    both paths are not on the same file system.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class RawFileCache:
+    """
+    Persistent cache of the raw PSG files downloaded from the SFTP server, so that a
+    conversion re-run after a failure or with other settings does not download the same
+    recordings again.
+
+    An entry is keyed by the host, remote path, size and modification time of the
+    remote file: a file modified on the server gets a new entry. Entries are stored as
+    <root>/<key[:2]>/<key>, with their SHA-256 in <key>.sha256, and their modification
+    time is refreshed on every hit, so that the least recently used entries are evicted
+    first once the cache exceeds its disk quota.
+
+    Args:
+    root (Path): Folder of the cache.
+    quota_bytes (Optional[int]): Maximum size of the cache in bytes, None for no limit.
+    """
+
+    def __init__(self, root: Path, quota_bytes: Optional[int] = None):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(host: str, remote_path: str, size: int, mtime: float) -> str:
+        """
+        Returns the key of a remote file version.
+        """
+        return hashlib.sha256(
+            f"{host}|{remote_path}|{size}|{int(mtime)}".encode("utf-8")
+        ).hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @staticmethod
+    def checksum_path(entry: Path) -> Path:
+        return entry.with_name(entry.name + CHECKSUM_SUFFIX)
+
+    def fetch(self, key: str, local_path: Path) -> bool:
+        """
+        Places the cached file of `key` at `local_path`.
+        Returns False if the file is not in the cache.
+        """
+        entry: Path = self.entry_path(key)
+        if not entry.is_file():
+            metrics.count("cache.misses")
+            return False
+        os.utime(entry)
+        link_or_copy(entry, local_path)
+        metrics.count("cache.hits")
+        metrics.count("cache.bytes_served", entry.stat().st_size)
+        return True
+
+    def checksum(self, key: str) -> FileChecksum:
+        """
+        Returns the size and SHA-256 of a cached file, computed from the file once for
+        the entries stored without checksum.
+        """
+        entry: Path = self.entry_path(key)
+        checksum_path: Path = self.checksum_path(entry)
+        if checksum_path.is_file():
+            return FileChecksum(entry.stat().st_size, checksum_path.read_text().strip())
+        checksum: FileChecksum = file_checksum(entry)
+        checksum_path.write_text(checksum.sha256)
+        return checksum
+
+    def store(
+        self, key: str, local_path: Path, checksum: Optional[FileChecksum] = None
+    ) -> None:
+        """
+        Adds a downloaded file and its checksum to the cache, then evicts the least
+        recently used entries beyond the quota.
+        """
+        entry: Path = self.entry_path(key)
+        tmp_entry: Path = entry.with_name(f"{entry.name}.tmp")
+        link_or_copy(local_path, tmp_entry)
+        os.replace(tmp_entry, entry)
+        os.utime(entry)
+        if checksum is not None:
+            self.checksum_path(entry).write_text(checksum.sha256)
+        self.evict()
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        """
+        Lists the cached files as (last use, size, path), least recently used first.
+        """
+        found: List[Tuple[float, int, Path]] = []
+        for path in self.root.glob("??/*"):
+            if path.suffix in (".tmp", CHECKSUM_SUFFIX) or not path.is_file():
+                continue
+            st = path.stat()
+            found.append((st.st_mtime, st.st_size, path))
+        return sorted(found)
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits in its quota.
+        Returns the number of bytes freed.
+        """
+        if self.quota_bytes is None:
+            return 0
+        entries = self.entries()
+        total: int = sum(size for _, size, _ in entries)
+        freed: int = 0
+        for _, size, path in entries:
+            if total - freed <= self.quota_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.checksum_path(path).unlink(missing_ok=True)
+            freed += size
+            metrics.count("cache.evicted_files")
+        if freed:
+            logger.info(
+                f"[CACHE] Evicted {freed / 1024 ** 2:.0f} MiB of raw files to stay under "
+                f"{self.quota_bytes / 1024 ** 3:.1f} GiB"
+            )
+        return freed
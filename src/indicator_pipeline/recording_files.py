@@ -0,0 +1,113 @@
+import re
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from indicator_pipeline.utils import parse_patient_visit_recording
+
+# Raw recording files: FE<recording>T<session>-PA<patient>V<visit>C<n>[...].<ext>, where
+# session T1 is the PSG and T12/T13 the MSLT/MWT trials
+RAW_NAME_PATTERN = re.compile(r"FE(\d+)(T\d+)-PA(\w+)V(\d+)C\d+")
+# SLF folders uploaded next to them: slf_PA<patient>_V<visit>_FE<recording>
+SLF_NAME_PATTERN = re.compile(r"^slf_PA(\d+)_V(\d+)_FE(\d+)")
+
+PSG_SESSION: str = "T1"
+CONVERTED_EXTENSIONS: Tuple[str, ...] = (".edf", ".txt", ".rtf", ".csv")
+
+# (visit, recording), e.g. ("V1", "FE0001")
+RecordingKey = Tuple[str, str]
+
+
+class RawFileName(NamedTuple):
+    name: str
+    patient: str
+    visit: str
+    recording: str
+    session: str
+    extension: str
+
+    @property
+    def key(self) -> RecordingKey:
+        return self.visit, self.recording
+
+
+def parse_raw_name(name: str) -> Optional[RawFileName]:
+    """
+    Parses a raw recording file name, e.g. 'FE0001T1-PA1234V1C1.edf' into
+    ('1234', 'V1', 'FE0001', 'T1', '.edf'). Returns None for other names.
+    """
+    match = RAW_NAME_PATTERN.search(name)
+    if match is None:
+        return None
+    recording, session, patient, visit = match.groups()
+    return RawFileName(
+        name,
+        patient,
+        f"V{visit}",
+        f"FE{recording}",
+        session,
+        PurePosixPath(name).suffix.lower(),
+    )
+
+
+def parse_slf_name(name: str) -> Optional[RecordingKey]:
+    """
+    Returns the (visit, recording) of an SLF folder name, e.g. 'slf_PA1234_V1_FE0001'
+    gives ('V1', 'FE0001'). Returns None for other names.
+    """
+    match = SLF_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return f"V{match.group(2)}", f"FE{match.group(3)}"
+
+
+class PatientListing:
+    """
+    Index of the listing of a remote patient folder. Every name is parsed once, so that
+    the recordings to convert, their files and the SLF folders already uploaded are
+    found by key instead of scanning the listing for each recording.
+
+    Args:
+    names (Iterable[str]): Names of the files and folders of the patient folder.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = list(names)
+        # PSG recordings (T1 EDF files) and their EDF and annotation files
+        self.files: Dict[RecordingKey, List[str]] = {}
+        self.recordings: Set[RecordingKey] = set()
+        self.converted: Set[RecordingKey] = set()
+        # Patient id of every EDF file, to detect files filed under the wrong patient
+        self.edf_patients: Dict[str, str] = {}
+
+        for name in self.names:
+            slf_key: Optional[RecordingKey] = parse_slf_name(name)
+            if slf_key is not None:
+                self.converted.add(slf_key)
+                continue
+
+            parsed: Optional[RawFileName] = parse_raw_name(name)
+            is_edf: bool = name.lower().endswith(".edf")
+            if is_edf:
+                self.edf_patients[name] = (
+                    parsed.patient
+                    if parsed is not None and parsed.patient.isdigit()
+                    else parse_patient_visit_recording(name)[0]
+                )
+            if parsed is None or parsed.session != PSG_SESSION:
+                continue
+            if parsed.extension in CONVERTED_EXTENSIONS:
+                self.files.setdefault(parsed.key, []).append(name)
+            if is_edf:
+                self.recordings.add(parsed.key)
+
+    def missing(self) -> List[RecordingKey]:
+        """
+        Returns the PSG recordings without SLF folder, sorted.
+        """
+        return sorted(self.recordings - self.converted)
+
+    def files_of(self, key: RecordingKey) -> List[str]:
+        """
+        Returns the EDF and annotation files of a PSG recording.
+        """
+        return self.files.get(key, [])
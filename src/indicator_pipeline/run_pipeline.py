@@ -2,17 +2,38 @@ import argparse
 import logging
 import os
 import re
+import threading
 import time
 from pathlib import PurePosixPath, Path
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 
-from indicator_pipeline.excel_to_json import excel_to_json
-from indicator_pipeline.logging_config import setup_logging
-from indicator_pipeline.sftp_client import SFTPClient
-from indicator_pipeline.slf_conversion import SLFConversion
-from indicator_pipeline.utils import get_local_slf_output
+from indicator_pipeline.abosa_watcher import (
+    DEFAULT_IDLE_TIMEOUT_S,
+    DEFAULT_POLL_S,
+    DEFAULT_SETTLE_S,
+)
+from indicator_pipeline.bandwidth import (
+    BandwidthLimiter,
+    log_throughput,
+    parse_rate,
+    parse_schedule,
+)
+from indicator_pipeline.job_queue import DEFAULT_LEASE_S
+from indicator_pipeline.logging_config import LOGS_DIR, setup_logging, year_logging
+from indicator_pipeline.metrics import METRICS
+from indicator_pipeline.profiling import DEFAULT_TOP_N, PROFILER, profile
+from indicator_pipeline.raw_cache import DEFAULT_QUOTA_GB, RawFileCache
+from indicator_pipeline.slf_cleanup import DEFAULT_DELETE_WORKERS
+from sleeplab_converter.array_options import (
+    DEFAULT_LINK_MBPS,
+    ZARR_CODECS,
+    ZARR_SHUFFLES,
+)
+
+# The modules of each step are imported in run_step: the conversion stack (MNE,
+# pyedflib, sleeplab_format), pandas and paramiko are only loaded by the steps using them
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +54,14 @@ def parse_args():
         "--step",
         required=True,
         type=str,
-        choices=["slf_conversion", "import_to_mars"],
-        help="Choice of the pipeline's step to execute : 'slf_conversion' to convert psg data to slf folder or 'import_to_mars' to dump the data computed by ABOSA to MARS",
+        choices=[
+            "slf_conversion",
+            "import_to_mars",
+            "cleanup_slf",
+            "compression_benchmark",
+            "verify_slf",
+        ],
+        help="Choice of the pipeline's step to execute : 'slf_conversion' to convert psg data to slf folder, 'import_to_mars' to dump the data computed by ABOSA to MARS, 'cleanup_slf' to delete the local slf folders whose indicators are computed, 'compression_benchmark' to compare the SLF array formats on a sample recording or 'verify_slf' to check the uploaded slf folders against their manifest",
     )
     parser.add_argument(
         "--abosa-version",
@@ -43,86 +70,602 @@ def parse_args():
         default=None,
         help="Version of the software ABOSA to compute indicators (e.g. 1.2.2)",
     )
+    parser.add_argument(
+        "--workers",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of subjects written in parallel during 'slf_conversion', of processes parsing ABOSA Excel files in parallel during 'import_to_mars' (default: 1), or of folders deleted in parallel during 'cleanup_slf' (default: 4)",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        required=False,
+        type=int,
+        default=None,
+        help="During 'slf_conversion', limit the subjects written at the same time so that their memory, estimated from the EDF headers, stays below this budget (default: no limit)",
+    )
+    parser.add_argument(
+        "--stream-from-sftp",
+        action="store_true",
+        help="During 'slf_conversion', read the EDF and annotation files directly from the SFTP server instead of downloading them to a temporary folder first",
+    )
+    parser.add_argument(
+        "--parallel-years",
+        required=False,
+        type=int,
+        default=1,
+        help="During 'slf_conversion', number of years converted at the same time, each with its own SFTP connection; --workers and --memory-budget-mb then cap the subjects written over all of them (default: 1, one year after another)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="During 'slf_conversion', only log the recordings to convert, largest first, their distribution over the workers and the estimated download and conversion time (uses --link-mbps)",
+    )
+    parser.add_argument(
+        "--queue-db",
+        required=False,
+        type=Path,
+        default=None,
+        help="During 'slf_conversion', SQLite job queue shared by the coordinator and the workers of a distributed conversion, on a volume they all reach (required by --queue-role)",
+    )
+    parser.add_argument(
+        "--queue-role",
+        required=False,
+        type=str,
+        choices=["coordinator", "worker"],
+        default=None,
+        help="During 'slf_conversion', 'coordinator' queues one job per recording of --years without SLF folder in --queue-db, 'worker' claims the queued recordings (of --years if given), converts and uploads them until the queue is empty. Start as many workers as wanted, on one or several machines",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        required=False,
+        type=float,
+        default=DEFAULT_LEASE_S,
+        help=f"Lease of a worker on a queued recording, renewed while it converts; the recording of a worker stopped for longer is taken over by another worker (default: {DEFAULT_LEASE_S:g})",
+    )
+    parser.add_argument(
+        "--raw-cache-dir",
+        required=False,
+        type=Path,
+        default=None,
+        help="During 'slf_conversion', keep the downloaded EDF and annotation files in this folder and reuse them on the next runs while they are unchanged on the server (default: no cache)",
+    )
+    parser.add_argument(
+        "--raw-cache-quota-gb",
+        required=False,
+        type=float,
+        default=DEFAULT_QUOTA_GB,
+        help=f"Disk quota of the raw file cache in GB, the least recently used files being evicted beyond it (default: {DEFAULT_QUOTA_GB:g})",
+    )
+    parser.add_argument(
+        "--bandwidth-limit",
+        required=False,
+        type=parse_rate,
+        default=None,
+        help="Maximum rate of all the SFTP downloads and uploads of the process in bytes/s, with an optional K, M or G unit, e.g. 20M (default: no limit)",
+    )
+    parser.add_argument(
+        "--bandwidth-per-connection",
+        required=False,
+        type=parse_rate,
+        default=None,
+        help="Maximum rate of the SFTP downloads and uploads of each connection, e.g. 5M (default: no limit)",
+    )
+    parser.add_argument(
+        "--bandwidth-schedule",
+        required=False,
+        type=parse_schedule,
+        default=None,
+        help="Limits by time of day, replacing --bandwidth-limit and --bandwidth-per-connection inside their windows: comma-separated HH:MM-HH:MM=<limit>[/<per connection limit>] windows, e.g. '08:00-20:00=20M/5M,20:00-08:00=0' (0: no limit)",
+    )
+    parser.add_argument(
+        "--deep-verify",
+        action="store_true",
+        help="During 'verify_slf', also read every uploaded file to compare its checksum with the manifest (default: only the manifests and the file sizes are compared, without reading the files)",
+    )
+    parser.add_argument(
+        "--array-format",
+        required=False,
+        type=str,
+        choices=["numpy", "zarr"],
+        default="numpy",
+        help="Format of the SLF sample arrays written by 'slf_conversion' (default: numpy, uncompressed)",
+    )
+    parser.add_argument(
+        "--zarr-codec",
+        required=False,
+        type=str,
+        choices=ZARR_CODECS,
+        default="zstd",
+        help="Compression codec of the zarr arrays (default: zstd)",
+    )
+    parser.add_argument(
+        "--zarr-clevel",
+        required=False,
+        type=int,
+        default=7,
+        help="Compression level of the zarr arrays (default: 7)",
+    )
+    parser.add_argument(
+        "--zarr-shuffle",
+        required=False,
+        type=str,
+        choices=ZARR_SHUFFLES,
+        default="none",
+        help="Shuffle filter applied before compressing the zarr arrays, 'bit' requires a Blosc codec (default: none)",
+    )
+    parser.add_argument(
+        "--sample-edf",
+        required=False,
+        type=Path,
+        default=None,
+        help="Local EDF recording used by 'compression_benchmark'",
+    )
+    parser.add_argument(
+        "--link-mbps",
+        required=False,
+        type=float,
+        default=DEFAULT_LINK_MBPS,
+        help=f"Bandwidth in Mbit/s used by 'compression_benchmark' to estimate upload times and by --dry-run to estimate download times (default: {DEFAULT_LINK_MBPS:g})",
+    )
+    parser.add_argument(
+        "--upsert",
+        action="store_true",
+        help="During 'import_to_mars', update the recordings already sent to MARS whose indicators changed",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="During 'import_to_mars', keep polling ABOSA_OUTPUT_PATH and import each ParameterValues folder as soon as its workbook is fully written, until every converted SLF folder has its indicators imported",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        required=False,
+        type=float,
+        default=DEFAULT_POLL_S,
+        help=f"Seconds between two scans of the ABOSA output folder with --watch (default: {DEFAULT_POLL_S:g})",
+    )
+    parser.add_argument(
+        "--watch-settle",
+        required=False,
+        type=float,
+        default=DEFAULT_SETTLE_S,
+        help=f"Seconds a workbook must keep the same size and modification time before it is imported with --watch (default: {DEFAULT_SETTLE_S:g})",
+    )
+    parser.add_argument(
+        "--watch-timeout",
+        required=False,
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT_S,
+        help=f"Stop --watch after this many seconds without any workbook imported, 0 to never stop (default: {DEFAULT_IDLE_TIMEOUT_S:g})",
+    )
+
+    parser.add_argument(
+        "--prometheus-textfile",
+        required=False,
+        type=Path,
+        default=None,
+        help="Also write the run metrics to this file in the Prometheus text format (node_exporter textfile collector)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each recording (cProfile + tracemalloc) and write the profiles and a top-N report to logs/profile_<step>_<timestamp>/",
+    )
+    parser.add_argument(
+        "--profile-top",
+        required=False,
+        type=int,
+        default=DEFAULT_TOP_N,
+        help=f"Number of functions and allocation sites listed in the profiling report (default: {DEFAULT_TOP_N})",
+    )
 
     args = parser.parse_args()
-    if args.step == "slf_conversion" and not args.years:
+    if args.queue_role is not None and args.queue_db is None:
+        parser.error("--queue-role requires --queue-db")
+    if args.step == "slf_conversion" and not args.years and args.queue_role != "worker":
         parser.error("--years is required when --step is 'slf_conversion'")
+    if args.step == "verify_slf" and not args.years:
+        parser.error("--years is required when --step is 'verify_slf'")
+    if args.step == "compression_benchmark" and args.sample_edf is None:
+        parser.error("--sample-edf is required when --step is 'compression_benchmark'")
+    if args.zarr_shuffle == "bit" and not args.zarr_codec.startswith("blosc-"):
+        parser.error("--zarr-shuffle bit requires a Blosc codec")
+    if args.workers is None:
+        args.workers = DEFAULT_DELETE_WORKERS if args.step == "cleanup_slf" else 1
+
+    return args
 
-    return parser.parse_args()
+
+def write_run_metrics(
+    step: str, run_id: str, prometheus_path: Optional[Path] = None
+) -> None:
+    """
+    Writes the metrics collected during the run next to the log files
+    (logs/metrics_<step>_<timestamp>.json) and optionally as a Prometheus textfile.
+    """
+    metrics_path: Path = LOGS_DIR / f"metrics_{step}_{run_id}.json"
+    METRICS.write_json(metrics_path)
+    logger.info(f"Run metrics written to: {metrics_path}")
+    if prometheus_path is not None:
+        METRICS.write_prometheus(prometheus_path)
+        logger.info(f"Prometheus metrics written to: {prometheus_path}")
+
+
+def write_profiling_report(step: str, run_id: str, top_n: int) -> None:
+    """
+    Writes the per-recording profiles and the merged report (logs/profile_<step>_<timestamp>/).
+    """
+    report_path: Optional[Path] = PROFILER.write_report(
+        LOGS_DIR / f"profile_{step}_{run_id}", top_n=top_n
+    )
+    if report_path is not None:
+        logger.info(f"Profiling report written to: {report_path}")
 
 
 def main():
 
     args = parse_args()
-    setup_logging(args.step)
+    run_id: str = setup_logging(args.step)
 
-    if args.step == "slf_conversion":
-        logger.info(f"[START] Converting psg data for year(s) {'_'.join(args.years)}")
-
-        host: str = os.getenv("SFTP_HOST")
-        username: str = os.getenv("SFTP_USER")
-        key_path: str = os.getenv("SFTP_KEY_PATH")
-        password = os.getenv("SFTP_PASSWORD")
-        port: int = int(os.getenv("SFTP_PORT"))
-        sftp = SFTPClient(
-            host=host, user=username, key_path=key_path, password=password, port=port
+    if args.profile:
+        logger.info("[PROFILE] Profiling enabled (cProfile + tracemalloc)")
+        PROFILER.enable()
+
+    try:
+        run_step(args, run_id)
+    finally:
+        write_run_metrics(args.step, run_id, args.prometheus_textfile)
+        if args.profile:
+            PROFILER.disable()
+            write_profiling_report(args.step, run_id, args.profile_top)
+
+
+def connect_sftp(
+    cache: Optional[RawFileCache] = None, limiter: Optional[BandwidthLimiter] = None
+):
+    """
+    Opens a connection to the SFTP server configured in the environment (.env), with
+    the client of SFTP_BACKEND (paramiko by default, or asyncssh).
+    """
+    from indicator_pipeline.sftp_client import get_sftp_client_class
+
+    sftp = get_sftp_client_class()(
+        host=os.getenv("SFTP_HOST"),
+        user=os.getenv("SFTP_USER"),
+        key_path=os.getenv("SFTP_KEY_PATH"),
+        password=os.getenv("SFTP_PASSWORD"),
+        port=int(os.getenv("SFTP_PORT")),
+        cache=cache,
+        limiter=limiter,
+    )
+    sftp.connect()
+    return sftp
+
+
+def get_server_year_dir(year: str) -> PurePosixPath:
+    return PurePosixPath().joinpath(
+        "home", "hp2", "Raw_data", "PSG_data_MARS", "C1", year
+    )
+
+
+def build_converter(
+    year: str,
+    sftp,
+    args: argparse.Namespace,
+    budget=None,
+    worker_slots: Optional[threading.Semaphore] = None,
+):
+    """
+    Returns the SLFConversion of one year configured from the command line.
+    """
+    from indicator_pipeline.slf_conversion import SLFConversion
+    from indicator_pipeline.utils import get_local_slf_output
+
+    return SLFConversion(
+        get_local_slf_output(),
+        get_server_year_dir(year),
+        sftp,
+        workers=args.workers,
+        array_format=args.array_format,
+        clevel=args.zarr_clevel,
+        zarr_codec=args.zarr_codec,
+        zarr_shuffle=args.zarr_shuffle,
+        stream=args.stream_from_sftp,
+        budget=budget,
+        worker_slots=worker_slots,
+    )
+
+
+def convert_year(
+    year: str,
+    sftp,
+    args: argparse.Namespace,
+    budget=None,
+    worker_slots: Optional[threading.Semaphore] = None,
+    queue=None,
+) -> Dict[str, Any]:
+    """
+    Converts the missing SLF folders of one year and uploads them to the server, or
+    with a job queue only queues one job per recording to convert.
+    Returns a summary of the year (status, patient folders, converted, duration).
+    """
+    start_year = time.time()
+    summary: Dict[str, Any] = {
+        "year": year,
+        "status": "done",
+        "patients": 0,
+        "converted": 0,
+        "elapsed_s": 0.0,
+    }
+    server_year_dir: PurePosixPath = get_server_year_dir(year)
+
+    try:
+        patient_pattern = re.compile(r"^PA\d+$")
+        all_entries: List[str] = sftp.list_files(str(server_year_dir))
+        patients: List[str] = [
+            name
+            for name in all_entries
+            if patient_pattern.match(name) and sftp.is_dir(str(server_year_dir / name))
+        ]
+        logger.info(f"Found {len(patients)} patient folders: {patients}")
+    except FileNotFoundError:
+        logger.warning(
+            f"[SKIP] Year {year} not found on SFTP ({server_year_dir}). Moving on to the next year."
         )
-        sftp.connect()
+        summary["status"] = "not found"
+        return summary
+
+    summary["patients"] = len(patients)
+    if not patients:
+        logger.info(f"[INFO] No data found for the year {year}.")
+        return summary
+
+    slf_converter = build_converter(year, sftp, args, budget, worker_slots)
+    if args.dry_run:
+        slf_converter.log_conversion_plan(patients, args.link_mbps)
+        summary["status"] = "planned"
+        return summary
+    if queue is not None:
+        recordings = slf_converter.select_recordings_to_convert(patients)
+        queued: int = queue.enqueue(year, recordings)
+        logger.info(
+            f"[QUEUE] Queued {queued} new recording(s) of {year} "
+            f"({len(recordings) - queued} already queued)"
+        )
+        summary["status"] = "queued"
+        return summary
+    summary["converted"] = slf_converter.convert_folder_to_slf(patients)
+    slf_converter.upload_slf_folders_to_server()
+
+    elapsed_year = time.time() - start_year
+    summary["elapsed_s"] = elapsed_year
+    logger.info(
+        f"[TIME] [YEAR] Completed {year} in {elapsed_year:.2f}s ({elapsed_year/60:.2f} min)"
+    )
+    return summary
+
+
+def convert_job(
+    job: Dict[str, Any],
+    sftp,
+    args: argparse.Namespace,
+    budget=None,
+    worker_slots: Optional[threading.Semaphore] = None,
+    lost: Optional[threading.Event] = None,
+) -> None:
+    """
+    Converts and uploads the recording of a queued job.
+    Raises RuntimeError if the lease of the job was lost (`lost` set) before the upload,
+    or if its SLF folder is still missing on the server afterwards.
+    """
+    slf_converter = build_converter(job["year"], sftp, args, budget, worker_slots)
+    slf_name: str = f"{job['patient_id']}_{job['visit']}_{job['recording']}"
+    slf_converter.convert_files({job["patient_id"]: job["files"]})
+    if lost is not None and lost.is_set():
+        raise RuntimeError(f"Lease of {job['job_id']} lost, {slf_name} not uploaded")
+    slf_converter.upload_slf_folders_to_server({slf_name})
+
+    _, missing_recordings, _ = slf_converter.check_patient_recordings(
+        get_server_year_dir(job["year"]) / job["patient_id"]
+    )
+    if (job["visit"], job["recording"]) in missing_recordings:
+        raise RuntimeError(f"SLF folder {slf_name} was not uploaded")
 
-        start_global = time.time()
 
-        for year in args.years:
-            start_year = time.time()
-            server_year_dir: PurePosixPath = PurePosixPath().joinpath(
-                "home", "hp2", "Raw_data", "PSG_data_MARS", "C1", year
+def run_queue_worker(
+    args: argparse.Namespace,
+    cache: Optional[RawFileCache] = None,
+    budget=None,
+    worker_slots: Optional[threading.Semaphore] = None,
+    limiter: Optional[BandwidthLimiter] = None,
+) -> Dict[str, int]:
+    """
+    Converts the recordings queued in --queue-db until the queue is empty.
+    Returns the number of jobs done, failed and lost by this worker.
+    """
+    from indicator_pipeline.job_queue import JobQueue, run_worker, worker_name
+
+    queue = JobQueue(args.queue_db, lease_s=args.lease_seconds)
+    owner: str = worker_name()
+    logger.info(f"[QUEUE] Worker {owner} started on {args.queue_db}")
+    sftp = connect_sftp(cache, limiter)
+    try:
+        processed = run_worker(
+            queue,
+            lambda job, lost: convert_job(job, sftp, args, budget, worker_slots, lost),
+            owner=owner,
+            years=args.years,
+        )
+    finally:
+        sftp.close()
+    logger.info(
+        f"[QUEUE] Worker {owner} finished: {processed['done']} recording(s) done, "
+        f"{processed['failed']} failed, {processed['lost']} lost. "
+        f"Queue: {queue.counts(args.years)}"
+    )
+    return processed
+
+
+def run_step(args: argparse.Namespace, run_id: str) -> None:
+    """
+    Runs the pipeline step selected on the command line.
+    """
+    if args.step == "slf_conversion":
+        from indicator_pipeline.memory import MemoryBudget
+
+        if args.queue_role == "worker":
+            logger.info(f"[START] Converting the recordings queued in {args.queue_db}")
+        else:
+            logger.info(
+                f"[START] Converting psg data for year(s) {'_'.join(args.years)}"
             )
-            local_slf_output: Path = get_local_slf_output()
-
-            try:
-                patient_pattern = re.compile(r"^PA\d+$")
-                all_entries: List[str] = sftp.list_files(str(server_year_dir))
-                patients: List[str] = [
-                    name
-                    for name in all_entries
-                    if patient_pattern.match(name)
-                    and sftp.is_dir(str(server_year_dir / name))
-                ]
-                logger.info(f"Found {len(patients)} patient folders: {patients}")
-            except FileNotFoundError:
-                logger.warning(
-                    f"[SKIP] Year {year} not found on SFTP ({server_year_dir}). Moving on to the next year."
-                )
-                continue
 
-            if not patients:
-                logger.info(f"[INFO] No data found for the year {year}.")
-                continue
+        cache: Optional[RawFileCache] = None
+        if args.raw_cache_dir is not None:
+            cache = RawFileCache(
+                args.raw_cache_dir, quota_bytes=int(args.raw_cache_quota_gb * 1024**3)
+            )
+            logger.info(
+                f"[CACHE] Raw file cache in {args.raw_cache_dir} ({args.raw_cache_quota_gb:g} GB quota)"
+            )
+        # Shared by the SFTP connections of the process
+        limiter = BandwidthLimiter(
+            (args.bandwidth_limit, args.bandwidth_per_connection),
+            args.bandwidth_schedule,
+        )
+        # Shared by the years converted at the same time
+        budget = MemoryBudget(
+            args.memory_budget_mb * 1024**2
+            if args.memory_budget_mb is not None
+            else None
+        )
+        worker_slots = threading.BoundedSemaphore(max(args.workers, 1))
 
-            slf_converter: SLFConversion = SLFConversion(
-                local_slf_output, server_year_dir, sftp
+        start_global = time.time()
+        if args.queue_role == "worker":
+            run_queue_worker(args, cache, budget, worker_slots, limiter)
+            log_throughput(METRICS.to_dict())
+            total_elapsed = time.time() - start_global
+            logger.info(
+                f"[TIME] [END] Queue worker completed in {total_elapsed:.2f}s ({total_elapsed/60:.2f} min)"
             )
-            slf_converter.convert_folder_to_slf(patients)
-            slf_converter.upload_slf_folders_to_server()
+            return
+
+        queue = None
+        if args.queue_role == "coordinator":
+            from indicator_pipeline.job_queue import JobQueue
+
+            queue = JobQueue(args.queue_db, lease_s=args.lease_seconds)
+
+        summaries: List[Dict[str, Any]] = []
+        if args.parallel_years > 1 and len(args.years) > 1:
+            from concurrent.futures import ThreadPoolExecutor
 
-            elapsed_year = time.time() - start_year
             logger.info(
-                f"[TIME] [YEAR] Completed {year} in {elapsed_year:.2f}s ({elapsed_year/60:.2f} min)"
+                f"[START] Up to {args.parallel_years} year(s) at a time, "
+                f"{args.workers} conversion worker(s) in total"
             )
 
+            def run_year(year: str) -> Dict[str, Any]:
+                with year_logging(args.step, run_id, year):
+                    sftp = connect_sftp(cache, limiter)
+                    try:
+                        return convert_year(
+                            year, sftp, args, budget, worker_slots, queue
+                        )
+                    finally:
+                        sftp.close()
+
+            with ThreadPoolExecutor(max_workers=args.parallel_years) as executor:
+                summaries = list(executor.map(run_year, args.years))
+        else:
+            sftp = connect_sftp(cache, limiter)
+            for year in args.years:
+                summaries.append(
+                    convert_year(year, sftp, args, budget, worker_slots, queue)
+                )
+            sftp.close()
+
+        for summary in summaries:
+            logger.info(
+                f"[YEAR] {summary['year']}: {summary['status']}, "
+                f"{summary['patients']} patient folder(s), "
+                f"{summary['converted']} converted, {summary['elapsed_s']:.2f}s"
+            )
+        if queue is not None:
+            logger.info(f"[QUEUE] Queue: {queue.counts(args.years)}")
+        log_throughput(METRICS.to_dict())
         total_elapsed = time.time() - start_global
         logger.info(
             f"[TIME] [END] SLF conversion for all years completed in {total_elapsed:.2f}s ({total_elapsed/60:.2f} min)"
         )
 
-        sftp.close()
+    elif args.step == "cleanup_slf":
+        from indicator_pipeline.slf_cleanup import cleanup_slf
+        from indicator_pipeline.utils import get_local_slf_output
+
+        cleanup_slf(get_local_slf_output(), workers=args.workers)
+
+    elif args.step == "verify_slf":
+        from indicator_pipeline.slf_manifest import verify_slf
+        from indicator_pipeline.utils import get_local_slf_output
+
+        local_dataset_dir: Path = get_local_slf_output() / "slf_to_compute"
+        sftp = connect_sftp()
+        try:
+            for year in args.years:
+                verify_slf(
+                    sftp,
+                    get_server_year_dir(year),
+                    local_dataset_dir / year,
+                    deep=args.deep_verify,
+                )
+        finally:
+            sftp.close()
+
+    elif args.step == "compression_benchmark":
+        from indicator_pipeline.compression_benchmark import (
+            run_compression_benchmark,
+            write_benchmark_report,
+        )
+
+        logger.info(
+            f"[START] Benchmarking SLF array formats on {args.sample_edf} ({args.link_mbps:g} Mbit/s link)"
+        )
+        results = run_compression_benchmark(args.sample_edf, link_mbps=args.link_mbps)
+        report_path: Path = LOGS_DIR / f"compression_benchmark_{run_id}.json"
+        write_benchmark_report(results, args.sample_edf, args.link_mbps, report_path)
+        best = results[0]
+        logger.info(
+            f"[BENCHMARK] Recommended setting: {best['setting']} (ratio {best['ratio']:.2f}, "
+            f"write + upload + read {best['total_s']:.2f}s). Report: {report_path}"
+        )
 
     else:
+        from indicator_pipeline.excel_to_json import excel_to_json
+
         if args.abosa_version is None:
             args.abosa_version = "1.2.2"
             logger.info("[INFO] No ABOSA version provided, defaulting to v1.2.2")
         else:
             logger.info(f"[INFO] Using ABOSA version: v{args.abosa_version}")
-        excel_to_json(args.abosa_version)
+        if args.watch:
+            from indicator_pipeline.abosa_watcher import watch_abosa_output
+
+            with profile(args.step):
+                watch_abosa_output(
+                    args.abosa_version,
+                    workers=args.workers,
+                    upsert=args.upsert,
+                    poll_s=args.watch_interval,
+                    settle_s=args.watch_settle,
+                    idle_timeout_s=args.watch_timeout,
+                )
+            return
+        with profile(args.step):
+            excel_to_json(args.abosa_version, workers=args.workers, upsert=args.upsert)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import heapq
+import logging
+from typing import Dict, List, Tuple
+
+from sleeplab_converter.array_options import DEFAULT_LINK_MBPS
+
+logger = logging.getLogger(__name__)
+
+# Raw megabytes converted per second by one worker (order of magnitude of the synthetic
+# recordings of the benchmarks, numpy arrays); only used for the dry-run estimate
+CONVERT_MB_S: float = 20.0
+
+
+def largest_first(costs: Dict[str, int]) -> List[str]:
+    """
+    Returns the keys of `costs` by decreasing cost (ties in their original order).
+    """
+    return sorted(costs, key=lambda name: costs[name], reverse=True)
+
+
+def lpt_schedule(costs: Dict[str, int], workers: int) -> List[List[str]]:
+    """
+    Balances work items across `workers` with the longest-processing-time rule: items
+    are taken largest first and given to the least loaded worker. This is what a pool
+    of workers does when fed largest first, so the plan is also the expected order.
+    Returns the items of each worker.
+    """
+    assignments: List[List[str]] = [[] for _ in range(max(workers, 1))]
+    loads: List[Tuple[int, int]] = [(0, worker) for worker in range(len(assignments))]
+    for name in largest_first(costs):
+        load, worker = heapq.heappop(loads)
+        assignments[worker].append(name)
+        heapq.heappush(loads, (load + costs[name], worker))
+    return assignments
+
+
+def estimate_run_seconds(
+    costs: Dict[str, int],
+    workers: int,
+    link_mbps: float = DEFAULT_LINK_MBPS,
+    convert_mb_s: float = CONVERT_MB_S,
+) -> Tuple[float, float]:
+    """
+    Estimates the download time of all the items over a `link_mbps` link and the
+    conversion time of the most loaded worker of the LPT schedule.
+    Returns (download seconds, conversion seconds).
+    """
+    download_s: float = sum(costs.values()) * 8 / (link_mbps * 1e6)
+    convert_s: float = max(
+        (
+            sum(costs[name] for name in items) / (convert_mb_s * 1e6)
+            for items in lpt_schedule(costs, workers)
+        ),
+        default=0.0,
+    )
+    return download_s, convert_s
+
+
+def log_plan(
+    costs: Dict[str, int],
+    workers: int,
+    link_mbps: float = DEFAULT_LINK_MBPS,
+    label: str = "patient",
+) -> None:
+    """
+    Logs the planned order, the items of each worker and the estimated run time.
+    """
+    for rank, name in enumerate(largest_first(costs), start=1):
+        logger.info(f"[PLAN] {rank:>4}. {name:<12} {costs[name] / 1e6:10.1f} MB")
+    for worker, items in enumerate(lpt_schedule(costs, workers), start=1):
+        load: int = sum(costs[name] for name in items)
+        logger.info(
+            f"[PLAN] Worker {worker}: {len(items)} {label}(s), {load / 1e6:.1f} MB"
+        )
+    download_s, convert_s = estimate_run_seconds(costs, workers, link_mbps)
+    logger.info(
+        f"[PLAN] {len(costs)} {label}(s), {sum(costs.values()) / 1e6:.1f} MB: estimated "
+        f"download {download_s / 60:.1f} min ({link_mbps:g} Mbit/s) + conversion "
+        f"{convert_s / 60:.1f} min ({max(workers, 1)} worker(s))"
+    )
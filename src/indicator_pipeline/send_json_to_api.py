@@ -1,15 +1,22 @@
 import logging
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 
 import requests
 from dotenv import load_dotenv
 
+from indicator_pipeline import metrics
+from indicator_pipeline.change_detection import payload_row_hash
+from indicator_pipeline.utils import get_state
+
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 API_URL = "https://staging.mars-database.science/api/internal/v1/recordings"
 API_TOKEN = os.getenv("API_TOKEN")
+# Route updating a recording in upsert mode, {record_id} being its MARS id. Only the
+# creation route (POST API_URL) is documented by MARS: set API_UPDATE_URL if it differs
+API_UPDATE_URL: str = os.getenv("API_UPDATE_URL", API_URL + "/{record_id}")
 
 HEADERS: Dict[str, str] = {
     "Authorization": f"Token token={API_TOKEN}",
@@ -23,24 +30,128 @@ def send_recording(payload: Dict[str, Any]) -> int | None:
     Sends a JSON payload to the MARS API and returns the ID created if successful.
     """
     try:
-        response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=15)
+        with metrics.span("api.post"):
+            response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=15)
         if response.status_code == 201:
             data = response.json()
             new_id = data.get("id")
             logger.info(f"✅ Sleeping record created with id {new_id}")
             return new_id
         else:
-            logger.error(f"⚠️ API error ({response.status_code}): {response.text[:300]}")
+            logger.error(f"⚠️ API error ({response.status_code}): {response.text:.300}")
     except requests.RequestException as e:
         logger.exception(f"⛔️ Network error : {e}")
 
     return None
 
 
-def send_batch(payloads: List[Dict[str, Any]]) -> None:
+def update_recording(record_id: int, payload: Dict[str, Any]) -> bool:
+    """
+    Updates an existing record of the MARS API with a JSON payload (PATCH API_UPDATE_URL).
+    Returns True if the update succeeded. A record the API does not find (404) was
+    deleted in MARS: it is removed from the index of recordings sent, so that the next
+    run creates it again. Raises RuntimeError if the API answers 405, as the update
+    route is then wrong for every record.
+    """
+    url: str = API_UPDATE_URL.format(record_id=record_id)
+    try:
+        with metrics.span("api.patch"):
+            response = requests.patch(url, headers=HEADERS, json=payload, timeout=15)
+        if response.status_code in (200, 204):
+            logger.info(f"✅ Sleeping record {record_id} updated")
+            return True
+        if response.status_code == 405:
+            raise RuntimeError(
+                f"PATCH {url} answered 405: the API has no such update route, "
+                "check API_UPDATE_URL"
+            )
+        if response.status_code == 404:
+            logger.error(
+                f"⚠️ Sleeping record {record_id} not found (404), "
+                "it will be sent again at the next run"
+            )
+            get_state().remove_sent_record(record_id)
+            return False
+        logger.error(f"⚠️ API error ({response.status_code}): {response.text:.300}")
+    except requests.RequestException as e:
+        logger.exception(f"⛔️ Network error : {e}")
+
+    return False
+
+
+def get_sent_index_key(payload: Dict[str, Any]) -> str:
+    """
+    Returns the key of a payload in the index of recordings already sent: "<abosa_version>/PAxxx_Vx_FExxx".
+    """
+    rec = payload["sleep_exploration_recording"]
+    abosa_version: Optional[str] = rec["oximetry_record_attributes"].get(
+        "abosa_version"
+    )
+    return (
+        f"{abosa_version}/PA{rec['patient_id']}_V{rec['visite_number']}"
+        f"_FE{rec['recording_number']}"
+    )
+
+
+def send_batch(payloads: List[Dict[str, Any]], upsert: bool = False) -> Set[str]:
     """
     Send a batch of payloads to the API.
+    Each payload is looked up in the index of recordings already sent (state store,
+    formerly sent_recordings.json), which is updated as soon as the API acknowledges it.
+    Recordings already acknowledged with an id for the same ABOSA version are skipped.
+    In upsert mode, those whose indicator values changed are updated instead.
+    Returns the index keys (see get_sent_index_key) of the payloads MARS now holds:
+    created, updated or already sent unchanged. Failed payloads, and changed ones
+    skipped without upsert, are not returned.
     """
+    acknowledged: Set[str] = set()
+    if not payloads:
+        return acknowledged
+
+    state = get_state()
+    counts: Dict[str, int] = {"created": 0, "updated": 0, "skipped": 0, "failed": 0}
+
     for i, payload in enumerate(payloads, 1):
+        key: str = get_sent_index_key(payload)
+        row_hash: str = payload_row_hash(payload)
+        entry: Optional[Dict[str, Any]] = state.get_sent_recording(key)
+
+        if entry and entry.get("id") is not None:
+            if entry.get("hash") == row_hash:
+                logger.info(f"⏭️ {key} already sent with id {entry['id']}")
+                counts["skipped"] += 1
+                acknowledged.add(key)
+                continue
+            if not upsert:
+                logger.info(
+                    f"⏭️ {key} already sent with id {entry['id']} but its indicators changed "
+                    "(use --upsert to update it)"
+                )
+                counts["skipped"] += 1
+                continue
+
+            logger.info(f"--- Updating the payload {i}/{len(payloads)} ({key}) ---")
+            if update_recording(entry["id"], payload):
+                state.record_sent_recording(key, entry["id"], row_hash)
+                counts["updated"] += 1
+                acknowledged.add(key)
+            else:
+                counts["failed"] += 1
+            continue
+
         logger.info(f"--- Sending the payload {i}/{len(payloads)} ---")
-        send_recording(payload)
+        new_id = send_recording(payload)
+        if new_id is None:
+            counts["failed"] += 1
+            continue
+        state.record_sent_recording(key, new_id, row_hash)
+        counts["created"] += 1
+        acknowledged.add(key)
+
+    for name, value in counts.items():
+        metrics.count(f"api.recordings_{name}", value)
+    logger.info(
+        f"📨 Batch done: {counts['created']} created, {counts['updated']} updated, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed"
+    )
+    return acknowledged
@@ -1,12 +1,30 @@
+import importlib.util
+import io
+import os
 import stat
-from pathlib import Path
-from typing import List
+import threading
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+from typing import Dict, IO, Iterator, List, Optional, Tuple
 
 import paramiko
 import logging
 
+from indicator_pipeline import metrics
+from indicator_pipeline.bandwidth import BandwidthLimiter, ThrottledFile
+from indicator_pipeline.checksums import (
+    FileChecksum,
+    HashingReader,
+    HashingWriter,
+    check_transferred_size,
+)
+from indicator_pipeline.raw_cache import RawFileCache
+
 logger = logging.getLogger(__name__)
 
+# SFTP implementations, selected with the SFTP_BACKEND environment variable
+SFTP_BACKENDS: Tuple[str, ...] = ("paramiko", "asyncssh")
+
 
 class SFTPClient:
     """
@@ -15,23 +33,35 @@ class SFTPClient:
     This class supports both password-based and key-based authentication, and provides methods
     for connecting, listing files, downloading and uploading individual files or entire folders
     recursively, and closing the connection.
+    With a `cache`, downloaded files are kept in a local RawFileCache and served from it
+    as long as the remote file is unchanged.
+    With a `limiter`, downloads, uploads and reads of streamed files are throttled by
+    its global bucket and by a bucket of this connection.
+    Transferred files are checksummed (SHA-256) as they are written or read.
     """
 
     def __init__(
-            self,
-            host: str,
-            user: str = "",
-            key_path: str = "",
-            password: str = "",
-            port: int = 22,
+        self,
+        host: str,
+        user: str = "",
+        key_path: str = "",
+        password: str = "",
+        port: int = 22,
+        cache: Optional[RawFileCache] = None,
+        limiter: Optional[BandwidthLimiter] = None,
     ):
         self.host = host
         self.user = user
         self.key_path = key_path
         self.password = password
         self.port = port
+        self.cache = cache
+        self.throttle = limiter.connection() if limiter is not None else None
         self.transport = None
         self.sftp = None
+        self._thread_sessions = threading.local()
+        self._extra_sessions: List[paramiko.SFTPClient] = []
+        self._sessions_lock = threading.Lock()
 
     def connect(self):
         """
@@ -57,23 +87,58 @@ class SFTPClient:
         """
         Lists files names and directories at the specified remote path.
         """
-        return self.sftp.listdir(path)
+        with metrics.span("sftp.list"):
+            return self.sftp.listdir(path)
+
+    def list_file_sizes(self, path: str = ".") -> Dict[str, int]:
+        """
+        Lists files names and directories at the specified remote path with their size in
+        bytes, from a single directory listing.
+        """
+        with metrics.span("sftp.list"):
+            return {
+                attr.filename: attr.st_size for attr in self.sftp.listdir_attr(path)
+            }
 
     def is_dir(self, path: str) -> bool:
         """
         Checks if the given remote path is a directory.
         """
         try:
-            return stat.S_ISDIR(self.sftp.stat(path).st_mode)
+            with metrics.span("sftp.stat"):
+                return stat.S_ISDIR(self.sftp.stat(path).st_mode)
         except IOError:
             return False
 
-    def download_file(self, remote_path: str, local_path: Path):
+    def download_file(self, remote_path: str, local_path: Path) -> FileChecksum:
         """
         Download a single file from remote SFTP server to local path.
+        With a cache, an unchanged file (same size and mtime) is served from the cache.
+        Returns the size and SHA-256 of the file.
         """
         local_path.parent.mkdir(parents=True, exist_ok=True)
-        self.sftp.get(remote_path, str(local_path))
+        if self.cache is None:
+            return self._get(remote_path, local_path)
+
+        with metrics.span("sftp.stat"):
+            attrs: paramiko.SFTPAttributes = self.sftp.stat(remote_path)
+        key: str = self.cache.key(self.host, remote_path, attrs.st_size, attrs.st_mtime)
+        if self.cache.fetch(key, local_path):
+            logger.debug(f"[CACHE] {remote_path} served from the raw file cache")
+            return self.cache.checksum(key)
+        checksum: FileChecksum = self._get(remote_path, local_path, attrs.st_size)
+        self.cache.store(key, local_path, checksum)
+        return checksum
+
+    def download_files(self, files: Dict[str, Path]) -> Dict[str, FileChecksum]:
+        """
+        Downloads remote files to their local path, one after the other.
+        Returns the size and SHA-256 of each remote file.
+        """
+        return {
+            remote_path: self.download_file(remote_path, local_path)
+            for remote_path, local_path in files.items()
+        }
 
     def download_folder_recursive(self, remote_path: str, local_path: Path):
         """
@@ -86,30 +151,241 @@ class SFTPClient:
             if self.is_dir(remote_item):
                 self.download_folder_recursive(remote_item, local_item)
             else:
-                self.sftp.get(remote_item, str(local_item))
+                self._get(remote_item, local_item)
 
-    def upload_folder_recursive(self, local_path: Path, remote_path: str):
+    def upload_folder_recursive(
+        self, local_path: Path, remote_path: str
+    ) -> Dict[str, FileChecksum]:
         """
         Recursively uploads a local directory and its content to the SFTP server.
+        Returns the size and SHA-256 of each file, by path relative to the directory.
         """
         try:
             self.sftp.stat(remote_path)
         except FileNotFoundError:
             self.sftp.mkdir(remote_path)
 
+        checksums: Dict[str, FileChecksum] = {}
         for item in local_path.iterdir():
             remote_item = remote_path + "/" + item.name
             if item.is_dir():
-                self.upload_folder_recursive(item, remote_item)
+                folder_checksums = self.upload_folder_recursive(item, remote_item)
+                for name, checksum in folder_checksums.items():
+                    checksums[f"{item.name}/{name}"] = checksum
+            else:
+                checksums[item.name] = self._put(item, remote_item)
+        return checksums
+
+    def upload_file(self, local_path: Path, remote_path: str) -> FileChecksum:
+        """
+        Uploads a single local file to the SFTP server.
+        Returns the size and SHA-256 of the file.
+        """
+        return self._put(local_path, remote_path)
+
+    def open_file(self, remote_path: str, prefetch: bool = False) -> IO:
+        """
+        Opens a remote file for reading as a seekable binary file object, without copying
+        it. With `prefetch`, the whole file is requested in the background and reads are
+        served from memory (read-ahead for files read from start to end); otherwise data is
+        requested on demand, e.g. with `readv` for the scattered ranges of an EDF channel.
+        With a limiter, the reads wait for its buckets (see ThrottledFile).
+        """
+        with metrics.span("sftp.open"):
+            remote_file: paramiko.SFTPFile = self._thread_session().open(
+                remote_path, "rb"
+            )
+            if prefetch:
+                remote_file.prefetch()
+        metrics.count("sftp.files_streamed")
+        if self.throttle is not None:
+            return ThrottledFile(remote_file, self.throttle)
+        return remote_file
+
+    def _thread_session(self) -> paramiko.SFTPClient:
+        """
+        Returns the SFTP session of the calling thread. Reading files of the same session
+        from several threads can deadlock paramiko, so every converter thread other than
+        the main one opens its own SFTP channel on the shared SSH transport.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self.sftp
+        session = getattr(self._thread_sessions, "sftp", None)
+        if session is None:
+            session = paramiko.SFTPClient.from_transport(self.transport)
+            self._thread_sessions.sftp = session
+            with self._sessions_lock:
+                self._extra_sessions.append(session)
+        return session
+
+    def _get(
+        self, remote_path: str, local_path: Path, remote_size: Optional[int] = None
+    ) -> FileChecksum:
+        """
+        Downloads one file, hashing it as it is written, and records its duration and
+        size in the run metrics. Raises IOError if the file downloaded does not have
+        the size of the remote file (`remote_size`, read from the server if not given).
+        """
+        if remote_size is None:
+            with metrics.span("sftp.stat"):
+                remote_size = self.sftp.stat(remote_path).st_size
+        with metrics.span("sftp.get"), open(local_path, "wb") as f:
+            writer = HashingWriter(f)
+            if self.throttle is None:
+                self.sftp.getfo(remote_path, writer)
             else:
-                self.sftp.put(str(item), remote_item)
+                # Without prefetch, the file is requested as fast as it is throttled
+                self.sftp.getfo(
+                    remote_path,
+                    writer,
+                    callback=self.throttle.progress_callback(),
+                    prefetch=False,
+                )
+        checksum: FileChecksum = writer.checksum()
+        check_transferred_size(remote_path, checksum, remote_size)
+        metrics.count("sftp.bytes_downloaded", checksum.size)
+        metrics.count("sftp.files_downloaded")
+        return checksum
+
+    def _put(self, local_path: Path, remote_path: str) -> FileChecksum:
+        """
+        Uploads one file, hashing it as it is read, and records its duration and size in
+        the run metrics. paramiko checks the size of the uploaded file (putfo confirm).
+        """
+        with metrics.span("sftp.put"), open(local_path, "rb") as f:
+            reader = HashingReader(f)
+            self.sftp.putfo(
+                reader,
+                remote_path,
+                file_size=os.fstat(f.fileno()).st_size,
+                callback=self.throttle.progress_callback() if self.throttle else None,
+            )
+        metrics.count("sftp.bytes_uploaded", reader.size)
+        metrics.count("sftp.files_uploaded")
+        return reader.checksum()
 
     def close(self):
         """
         Closes the SFTP connection and associated resources.
         """
+        for session in self._extra_sessions:
+            session.close()
+        self._extra_sessions.clear()
         if self.sftp:
             self.sftp.close()
         if self.transport:
             self.transport.close()
         logger.info("SFTP connection closed")
+
+
+def get_sftp_client_class(backend: Optional[str] = None) -> type:
+    """
+    Returns the SFTP client class of `backend`, by default of the SFTP_BACKEND environment
+    variable: SFTPClient (paramiko, the default) or AsyncSFTPClient (asyncssh). Falls back
+    to paramiko when asyncssh is not installed.
+    """
+    backend = (backend or os.getenv("SFTP_BACKEND") or "paramiko").strip().lower()
+    if backend not in SFTP_BACKENDS:
+        raise ValueError(
+            f"Unknown SFTP backend {backend!r}, expected one of {', '.join(SFTP_BACKENDS)}"
+        )
+    if backend == "asyncssh":
+        if importlib.util.find_spec("asyncssh") is None:
+            logger.warning(
+                "[SFTP] SFTP_BACKEND=asyncssh but asyncssh is not installed, using paramiko"
+            )
+            return SFTPClient
+        from indicator_pipeline.async_sftp_client import AsyncSFTPClient
+
+        return AsyncSFTPClient
+    return SFTPClient
+
+
+class SFTPPath:
+    """
+    Read-only path in a set of remote files, implementing the part of pathlib.Path used
+    by the converter (joining, name, stem, parent, is_file, iterdir, glob and open), so
+    that recordings are parsed straight from the SFTP server instead of being downloaded.
+    Folders are virtual: they contain the files given to the root path only.
+
+    Args:
+    client (SFTPClient): Connected client used to open the files.
+    files (Dict[PurePosixPath, str]): Remote path of each file, by its path relative to the root.
+    path (PurePosixPath): Path represented by this object, relative to the root.
+    """
+
+    def __init__(
+        self,
+        client: SFTPClient,
+        files: Dict[PurePosixPath, str],
+        path: PurePosixPath = PurePosixPath(),
+    ):
+        self.client = client
+        self.files = files
+        self.path = path
+
+    def __truediv__(self, name: str) -> "SFTPPath":
+        return SFTPPath(self.client, self.files, self.path / name)
+
+    def joinpath(self, *names: str) -> "SFTPPath":
+        return SFTPPath(self.client, self.files, self.path.joinpath(*names))
+
+    def __str__(self) -> str:
+        return f"sftp://{self.client.host}/{self.files.get(self.path, self.path)}"
+
+    def __repr__(self) -> str:
+        return f"SFTPPath({str(self)!r})"
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def stem(self) -> str:
+        return self.path.stem
+
+    @property
+    def suffix(self) -> str:
+        return self.path.suffix
+
+    @property
+    def parent(self) -> "SFTPPath":
+        return SFTPPath(self.client, self.files, self.path.parent)
+
+    def resolve(self) -> "SFTPPath":
+        return self
+
+    def is_file(self) -> bool:
+        return self.path in self.files
+
+    def is_dir(self) -> bool:
+        return any(self.path in file.parents for file in self.files)
+
+    def iterdir(self) -> Iterator["SFTPPath"]:
+        children = {
+            file.relative_to(self.path).parts[0]
+            for file in self.files
+            if self.path in file.parents
+        }
+        for name in sorted(children):
+            yield self / name
+
+    def glob(self, pattern: str) -> List["SFTPPath"]:
+        """
+        Matches the direct children of the folder (no recursive patterns).
+        """
+        return [child for child in self.iterdir() if fnmatch(child.name, pattern)]
+
+    def open(self, mode: str = "r", encoding: Optional[str] = None) -> IO:
+        """
+        Opens the remote file for reading. Text files are prefetched, as the annotation
+        parsers read them from start to end; binary files are read on demand.
+        """
+        if not self.is_file():
+            raise FileNotFoundError(str(self))
+        if "b" in mode:
+            return self.client.open_file(self.files[self.path])
+        return io.TextIOWrapper(
+            self.client.open_file(self.files[self.path], prefetch=True),
+            encoding=encoding,
+        )
@@ -0,0 +1,107 @@
+import logging
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from indicator_pipeline import metrics
+from indicator_pipeline.state_store import StateStore
+from indicator_pipeline.utils import folder_size, get_state
+
+logger = logging.getLogger(__name__)
+
+# Folders deleted at the same time when --workers is not given: deletion waits on the
+# disk, not the CPU
+DEFAULT_DELETE_WORKERS: int = 4
+
+
+def index_local_slf_folders(local_slf_output: Path) -> Dict[str, str]:
+    """
+    Lists the SLF folders of slf_to_compute/<year>/: {slf_id: path relative to the local
+    slf output}. Only used once, to index the folders converted before the index existed.
+    """
+    dataset_dir: Path = local_slf_output / "slf_to_compute"
+    if not dataset_dir.exists():
+        return {}
+    return {
+        folder.name: folder.relative_to(local_slf_output).as_posix()
+        for year_dir in dataset_dir.iterdir()
+        if year_dir.is_dir()
+        for folder in year_dir.iterdir()
+        if folder.is_dir()
+    }
+
+
+def delete_folder(path: Path) -> int:
+    """
+    Deletes an SLF folder. Returns the number of bytes freed (0 if it was already gone).
+    """
+    if not path.exists():
+        return 0
+    freed: int = folder_size(path)
+    shutil.rmtree(path)
+    return freed
+
+
+def cleanup_slf(
+    local_slf_output: Path,
+    workers: int = DEFAULT_DELETE_WORKERS,
+    store: Optional[StateStore] = None,
+) -> Dict[str, int]:
+    """
+    Deletes the local SLF folders whose indicators are all computed, looking only at the
+    datasets whose state changed since the previous cleanup. Folders are found through
+    the index of the state store and deleted by `workers` threads; a folder that could
+    not be deleted is retried at the next cleanup.
+    Returns the number of folders deleted and failed and the bytes freed.
+    """
+    store = store or get_state()
+    started_at: float = time.time()
+
+    if not store.has_migration("slf_paths"):
+        indexed: Dict[str, str] = index_local_slf_folders(local_slf_output)
+        store.backfill_slf_paths(indexed)
+        logger.info(f"[CLEANUP] Indexed {len(indexed)} existing SLF folder(s)")
+
+    candidates: Dict[str, str] = store.get_cleanup_candidates(store.get_last_cleanup())
+    logger.info(
+        f"[CLEANUP] {len(candidates)} SLF folder(s) with all indicators computed since the last cleanup"
+    )
+
+    def delete(item: Tuple[str, str]) -> Tuple[str, Optional[int], str]:
+        slf_id, rel_path = item
+        try:
+            return slf_id, delete_folder(local_slf_output / rel_path), ""
+        except OSError as e:
+            return slf_id, None, str(e)
+
+    deleted: List[str] = []
+    failed: Dict[str, str] = {}
+    freed_bytes: int = 0
+    with ThreadPoolExecutor(
+        max_workers=max(workers, 1), thread_name_prefix="slf-cleanup"
+    ) as executor:
+        for slf_id, freed, error in executor.map(delete, candidates.items()):
+            if freed is None:
+                logger.error(
+                    f"[CLEANUP] Unable to delete {candidates[slf_id]}: {error}"
+                )
+                failed[slf_id] = candidates[slf_id]
+                continue
+            deleted.append(slf_id)
+            freed_bytes += freed
+
+    store.remove_slf_paths(deleted)
+    # Rewriting the index row puts the folder back in the candidates of the next cleanup
+    store.update_slf_paths(failed)
+    store.record_cleanup(started_at, len(deleted), freed_bytes)
+    metrics.count("cleanup.deleted", len(deleted))
+    metrics.count("cleanup.freed_bytes", freed_bytes)
+
+    elapsed: float = time.time() - started_at
+    logger.info(
+        f"[TIME] [CLEANUP] Deleted {len(deleted)} SLF folder(s), reclaimed "
+        f"{freed_bytes / 1024 ** 2:.1f} MiB in {elapsed:.2f}s ({len(failed)} failed)"
+    )
+    return {"deleted": len(deleted), "failed": len(failed), "freed_bytes": freed_bytes}
@@ -1,17 +1,26 @@
 import logging
-import re
 import tempfile
+import threading
 import time
 from pathlib import Path, PurePosixPath
-from typing import List, Dict, Tuple, Set
-
-from indicator_pipeline.sftp_client import SFTPClient
+from typing import List, Dict, Optional, Tuple, Set, Union
+
+from indicator_pipeline import metrics
+from indicator_pipeline.checksums import FileChecksum
+from indicator_pipeline.memory import MemoryBudget
+from indicator_pipeline.recording_files import PatientListing
+from indicator_pipeline.scheduling import largest_first, log_plan
+from indicator_pipeline.sftp_client import SFTPClient, SFTPPath
+from indicator_pipeline.slf_manifest import (
+    MANIFEST_NAME,
+    build_manifest,
+    write_manifest,
+)
 from indicator_pipeline.utils import (
-    parse_patient_visit_recording,
+    extract_subject_id_from_filename,
     lowercase_extensions,
-    load_slf_usage,
     save_slf_usage,
-    extract_recording_values,
+    save_slf_paths,
 )
 from sleeplab_converter.mars_database.convert import convert_dataset
 
@@ -27,6 +36,15 @@ class SLFConversion:
     local_slf_output (Path): Path to the local slf output folder.
     remote_year_dir (PurePosixPath): Remote path to the year folder on the SFTP server (e.g., /.../C1/2025).
     sftp_client (SFTPClient): An active SFTP client for accessing and downloading remote data.
+    workers (int): Number of subjects written in parallel during the conversion.
+    memory_budget_mb (Optional[int]): Estimated memory allowed for the subjects being written, None for no limit.
+    array_format (str): Format of the SLF sample arrays ('numpy' or 'zarr').
+    clevel (int): Compression level of the zarr arrays.
+    zarr_codec (str): Compression codec of the zarr arrays (see array_writer.get_zarr_codecs).
+    zarr_shuffle (str): Shuffle filter of the zarr arrays ('none', 'byte' or 'bit').
+    stream (bool): Read the recordings directly from the SFTP server instead of downloading them first.
+    budget (Optional[MemoryBudget]): Memory budget shared with the other years converted at the same time (replaces memory_budget_mb).
+    worker_slots (Optional[threading.Semaphore]): Cap on the subjects written at once over all the years converted at the same time.
     """
 
     def __init__(
@@ -34,168 +52,280 @@ class SLFConversion:
         local_slf_output: Path,
         remote_year_dir: PurePosixPath,
         sftp_client: SFTPClient,
+        workers: int = 1,
+        memory_budget_mb: Optional[int] = None,
+        array_format: str = "numpy",
+        clevel: int = 7,
+        zarr_codec: str = "zstd",
+        zarr_shuffle: str = "none",
+        stream: bool = False,
+        budget: Optional[MemoryBudget] = None,
+        worker_slots: Optional[threading.Semaphore] = None,
     ):
         self.local_slf_output = local_slf_output
         self.remote_year_dir = remote_year_dir
         self.sftp_client = sftp_client
+        self.workers = workers
+        self.memory_budget_mb = memory_budget_mb
+        self.array_format = array_format
+        self.clevel = clevel
+        self.zarr_codec = zarr_codec
+        self.zarr_shuffle = zarr_shuffle
+        self.stream = stream
+        self.budget = budget
+        self.worker_slots = worker_slots
+        # Checksums of the raw files downloaded for each subject (PAxxx_Vx_FExxxx), kept
+        # for the manifests of their SLF folders
+        self.source_checksums: Dict[str, Dict[str, FileChecksum]] = {}
 
     def add_slf_usage(self):
         """
-        Update the SLF usage tracking file (slf_usage.json) with any new SLF datasets.
+        Update the SLF usage tracking state (formerly slf_usage.json) with any new SLF datasets.
         This method scans the local `slf_to_compute/<year>` directory to detect
-        newly converted SLF folders.
+        newly converted SLF folders. Existing statuses are kept, and the folders are indexed
+        for the cleanup step.
         """
-        slf_usage: Dict[str, Dict[str, bool]] = load_slf_usage()
-
         new_slf_dir = (
             self.local_slf_output / "slf_to_compute" / self.remote_year_dir.name
         )
-        new_slf_ids = [d.name for d in new_slf_dir.iterdir() if d.is_dir()]
+        new_slf_dirs = [d for d in new_slf_dir.iterdir() if d.is_dir()]
 
-        for slf_id in new_slf_ids:
-            if slf_id not in slf_usage:
-                slf_usage[slf_id] = {"abosa": False}
-            else:
-                slf_usage[slf_id].setdefault("abosa", False)
-
-        save_slf_usage(slf_usage)
+        save_slf_usage(
+            {d.name: {"abosa": False} for d in new_slf_dirs}, overwrite=False
+        )
+        save_slf_paths(
+            {
+                d.name: d.relative_to(self.local_slf_output).as_posix()
+                for d in new_slf_dirs
+            }
+        )
 
     def check_patient_recordings(
-        self, remote_patient_path: PurePosixPath
+        self,
+        remote_patient_path: PurePosixPath,
+        listing: Optional[PatientListing] = None,
     ) -> Tuple[bool, List[Tuple[str, str]], bool]:
         """
         Checks whether all recordings for a patient already have an associated slf folder.
+        The patient folder is listed unless its `listing` is given.
         Returns:
             - all_psg_converted: bool => if all recordings have an associated slf folder
             - missing_recordings: List[Tuple[str, str]] => list of recordings (e.g., ("V1", "FE0001")) without slf
             - has_valid_psg: bool => if the patient folder has at least one valid recording to convert
         """
-        existing_files: List[str] = self.sftp_client.list_files(
-            str(remote_patient_path)
-        )
-        expected_recordings: List[Tuple[str, str]] = extract_recording_values(
-            existing_files
-        )
-        incomplete = [(v, fe) for (v, fe) in expected_recordings if not v or not fe]
-        complete = [(v, fe) for (v, fe) in expected_recordings if v and fe]
+        if listing is None:
+            listing = PatientListing(
+                self.sftp_client.list_files(str(remote_patient_path))
+            )
+        if not listing.recordings:
+            return True, [], False
+
+        missing_recordings: List[Tuple[str, str]] = listing.missing()
+        return len(missing_recordings) == 0, missing_recordings, True
 
-        if incomplete:
-            incomplete_str = ", ".join(
-                [f"({v or '∅'}, {fe or '∅'})" for v, fe in incomplete]
+    def select_recordings_to_convert(
+        self, patients: List[str]
+    ) -> Dict[Tuple[str, str, str], Dict[str, int]]:
+        """
+        Lists the remote EDF and annotation files of each recording without SLF folder,
+        skipping the patients whose recordings are all converted.
+        Returns the size of each file to convert by (patient, visit, recording).
+        """
+        selected: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+        for patient_id in patients:
+            remote_patient_path: PurePosixPath = self.remote_year_dir / patient_id
+            remote_sizes: Dict[str, int] = self.sftp_client.list_file_sizes(
+                str(remote_patient_path)
             )
-            logger.warning(
-                f"[WARNING] Incomplete recording info found for {remote_patient_path.name}: {incomplete_str}"
+            listing = PatientListing(remote_sizes)
+            all_psg_converted, missing_recording, has_valid_psg = (
+                self.check_patient_recordings(remote_patient_path, listing)
             )
 
-        slf_folders: List[str] = [
-            name for name in existing_files if name.startswith("slf_")
-        ]
+            if not has_valid_psg:
+                logger.warning(f"[SKIP] No valid T1 PSG found for {patient_id}")
+                continue
 
-        if not complete:
-            return True, [], False
+            if all_psg_converted:
+                logger.info(f"[SKIP] All SLF already exist for {patient_id}")
+                continue
+            else:
+                logger.info(
+                    f"[PROCESS] Missing visits for {patient_id}: {missing_recording}"
+                )
 
-        missing_recordings = [
-            (visit, fe)
-            for (visit, fe) in complete
-            if not any(f"{visit}_{fe}" in slf for slf in slf_folders)
-        ]
+            found: bool = False
+            for visit, rec_number in missing_recording:
+                matching_files = listing.files_of((visit, rec_number))
+                if matching_files:
+                    selected[(patient_id, visit, rec_number)] = {
+                        f: remote_sizes[f] for f in matching_files
+                    }
+                    found = True
 
-        return len(missing_recordings) == 0, missing_recordings, True
+            if not found:
+                logger.warning(
+                    f"[SKIP] No valid T1 files to download for patient {patient_id}"
+                )
+        return selected
+
+    def select_files_to_convert(self, patients: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Lists the remote EDF and annotation files of the recordings without SLF folder,
+        skipping the patients whose recordings are all converted.
+        Returns the size of each file to convert by patient, the patients with the most
+        bytes to convert first, so that a large recording does not end a parallel run
+        alone.
+        """
+        selected: Dict[str, Dict[str, int]] = {}
+        for (patient_id, _, _), sizes in self.select_recordings_to_convert(
+            patients
+        ).items():
+            selected.setdefault(patient_id, {}).update(sizes)
+
+        patient_bytes: Dict[str, int] = {
+            patient_id: sum(sizes.values()) for patient_id, sizes in selected.items()
+        }
+        return {
+            patient_id: selected[patient_id]
+            for patient_id in largest_first(patient_bytes)
+        }
+
+    def log_conversion_plan(self, patients: List[str], link_mbps: float) -> None:
+        """
+        Logs the patients that would be converted, largest first, their distribution over
+        the workers and the estimated download and conversion time, without converting.
+        """
+        files_by_patient: Dict[str, Dict[str, int]] = self.select_files_to_convert(
+            patients
+        )
+        if not files_by_patient:
+            logger.info(f"[PLAN] Nothing to convert in {self.remote_year_dir}")
+            return
+        log_plan(
+            {
+                patient_id: sum(sizes.values())
+                for patient_id, sizes in files_by_patient.items()
+            },
+            self.workers,
+            link_mbps,
+        )
 
-    def convert_folder_to_slf(self, patients: List[str]):
+    def convert_folder_to_slf(self, patients: List[str]) -> int:
         """
-        Downloads all patient folders for a given year from a remote SFTP server in a temporary folder,
-        skips those that already contain an SLF output folder,
-        and converts the remaining ones to the .slf format using MARS sleeplab-converter.
+        Converts the recordings of the given patients that have no SLF folder yet to the .slf format
+        using MARS sleeplab-converter, skipping the patients whose recordings are all converted.
+        The recordings are downloaded in a temporary folder or, with `stream`, read directly from
+        the SFTP server without local copy.
         The resulting .slf folders are saved outside the Git repository, in a sibling folder named 'slf-output'.
+        Returns the number of patients whose recordings were converted.
+        """
+        files_by_patient: Dict[str, Dict[str, int]] = self.select_files_to_convert(
+            patients
+        )
+        if not files_by_patient:
+            return 0
+        return self.convert_files(files_by_patient)
+
+    def convert_files(self, files_by_patient: Dict[str, Dict[str, int]]) -> int:
+        """
+        Downloads (or, with `stream`, reads from the SFTP server) the given remote files
+        of each patient and converts them to SLF.
+        Returns the number of patients converted.
         """
+        if self.stream:
+            self.run_conversion(
+                self.remote_input_dir(files_by_patient), len(files_by_patient)
+            )
+            return len(files_by_patient)
 
         with tempfile.TemporaryDirectory() as tmp_root_dir:
             tmp_root_path: Path = Path(tmp_root_dir)
-
             local_year_dir: Path = tmp_root_path / self.remote_year_dir.name
             local_year_dir.mkdir(parents=True, exist_ok=True)
 
-            downloaded_count: int = 0
-            for patient_id in patients:
+            for patient_id, files_to_download in files_by_patient.items():
                 remote_patient_path: PurePosixPath = self.remote_year_dir / patient_id
-                all_psg_converted, missing_recording, has_valid_psg = (
-                    self.check_patient_recordings(remote_patient_path)
-                )
-
-                if not has_valid_psg:
-                    logger.warning(f"[SKIP] No valid T1 PSG found for {patient_id}")
-                    continue
-
-                if all_psg_converted:
-                    logger.info(f"[SKIP] All SLF already exist for {patient_id}")
-                    continue
-                else:
-                    logger.info(
-                        f"[PROCESS] Missing visits for {patient_id}: {missing_recording}"
-                    )
-
                 local_patient_dir: Path = local_year_dir / patient_id
-                remote_files: List[str] = self.sftp_client.list_files(
-                    str(remote_patient_path)
-                )
-                valid_exts = (".edf", ".txt", ".rtf", ".csv")
-
-                files_to_download: List[str] = []
-                for visit, rec_number in missing_recording:
-                    matching_files = [
-                        f
-                        for f in remote_files
-                        if f.lower().endswith(valid_exts)
-                        and "T1-" in f
-                        and re.search(rf"{visit}C", f)
-                        and re.search(rf"{rec_number}T", f)
-                    ]
-                    files_to_download.extend(matching_files)
-
-                if not files_to_download:
-                    logger.warning(
-                        f"[SKIP] No valid T1 files to download for patient {patient_id}"
-                    )
-                    continue
-
+                # The files of a recording are downloaded together, concurrently with
+                # the asyncssh client
+                files_by_recording: Dict[str, Dict[str, Path]] = {}
                 for f in files_to_download:
-                    remote_file_path = remote_patient_path / f
-                    local_file_path = local_patient_dir / f
-                    self.sftp_client.download_file(
-                        str(remote_file_path), local_file_path
+                    recording_files = files_by_recording.setdefault(
+                        extract_subject_id_from_filename(Path(f)), {}
+                    )
+                    recording_files[str(remote_patient_path / f)] = (
+                        local_patient_dir / f
                     )
+                for subject_id, recording_files in files_by_recording.items():
+                    with metrics.recording(subject_id):
+                        self.source_checksums[subject_id] = (
+                            self.sftp_client.download_files(recording_files)
+                        )
 
                 logger.info(
-                    f"[COPY] Copied missing recordings {missing_recording} locally to {local_patient_dir}"
+                    f"[COPY] Copied missing recordings of {patient_id} locally to {local_patient_dir}"
                 )
                 lowercase_extensions(local_patient_dir)
-                downloaded_count += 1
 
-            if downloaded_count > 0:
-                logger.info(
-                    f"[CONVERT] Starting conversion for {downloaded_count} patient(s)"
-                )
+            self.run_conversion(tmp_root_path, len(files_by_patient))
+        return len(files_by_patient)
 
-                start_conv = time.time()
-                convert_dataset(
-                    input_dir=tmp_root_path,
-                    output_dir=self.local_slf_output,
-                    series=self.remote_year_dir.name,
-                    ds_name="slf_to_compute",
+    def remote_input_dir(self, files_by_patient: Dict[str, Dict[str, int]]) -> SFTPPath:
+        """
+        Returns the input folder of the conversion as a view of the selected remote files,
+        laid out like the temporary folder (<year>/<patient>/<file>) with lower-case extensions.
+        """
+        year: str = self.remote_year_dir.name
+        files: Dict[PurePosixPath, str] = {}
+        for patient_id, file_names in files_by_patient.items():
+            for f in file_names:
+                name = PurePosixPath(f)
+                local_path = PurePosixPath(
+                    year, patient_id, name.with_suffix(name.suffix.lower())
                 )
-                conv_duration = time.time() - start_conv
+                files[local_path] = str(self.remote_year_dir / patient_id / f)
+        logger.info(
+            f"[STREAM] Reading {len(files)} file(s) of {len(files_by_patient)} patient(s) directly from the server"
+        )
+        return SFTPPath(self.sftp_client, files)
 
-                self.add_slf_usage()
-                logger.info(
-                    f"[TIME] [CONVERT] Finished conversion in {conv_duration:.2f}s for {downloaded_count} patient(s) "
-                    f"({conv_duration/downloaded_count:.2f}s per patient)"
-                )
+    def run_conversion(self, input_dir: Union[Path, SFTPPath], patient_count: int):
+        """
+        Converts the recordings of the input folder (<year>/<patient>/<file>) to SLF and
+        records the new SLF folders in the SLF usage state.
+        """
+        logger.info(f"[CONVERT] Starting conversion for {patient_count} patient(s)")
+
+        start_conv = time.time()
+        convert_dataset(
+            input_dir=input_dir,
+            output_dir=self.local_slf_output,
+            series=self.remote_year_dir.name,
+            ds_name="slf_to_compute",
+            workers=self.workers,
+            memory_budget_mb=self.memory_budget_mb,
+            array_format=self.array_format,
+            clevel=self.clevel,
+            zarr_codec=self.zarr_codec,
+            zarr_shuffle=self.zarr_shuffle,
+            budget=self.budget,
+            worker_slots=self.worker_slots,
+        )
+        conv_duration = time.time() - start_conv
 
-    def upload_slf_folders_to_server(self):
+        self.add_slf_usage()
+        logger.info(
+            f"[TIME] [CONVERT] Finished conversion in {conv_duration:.2f}s for {patient_count} patient(s) "
+            f"({conv_duration/patient_count:.2f}s per patient)"
+        )
+
+    def upload_slf_folders_to_server(self, slf_names: Optional[Set[str]] = None):
         """
-        Uploads all SLF folders from a local output directory to the corresponding year directory on the remote server.
+        Uploads all SLF folders from a local output directory to the corresponding year directory on the remote server,
+        or only the folders named in `slf_names` (e.g. {"PA1_V1_FE0001"}).
         Skips uploads if the patient folder name does not match the .edf filename(s) found on the remote server.
+        The checksums computed during the upload are written to the manifest of each folder, uploaded last.
         """
 
         def is_valid_slf_folder(folder: Path) -> bool:
@@ -228,13 +358,24 @@ class SLFConversion:
         for patient_folder in local_year_dir.iterdir():
             if not patient_folder.is_dir():
                 continue
+            if slf_names is not None and patient_folder.name not in slf_names:
+                continue
             patient_id = patient_folder.name.split("_")[0]
             patients.setdefault(patient_id, []).append(patient_folder)
 
         for patient_id, folders in patients.items():
             remote_raw_dir: PurePosixPath = self.remote_year_dir / patient_id
+            try:
+                listing = PatientListing(
+                    self.sftp_client.list_files(str(remote_raw_dir))
+                )
+            except Exception as e:
+                logger.warning(
+                    f"[WARNING] Unable to list remote files for {remote_raw_dir}: {e}"
+                )
+                continue
             _, missing_recordings, _ = self.check_patient_recordings(
-                remote_raw_dir
+                remote_raw_dir, listing
             )
 
             available_local: Set[str] = {f.name for f in folders}
@@ -248,23 +389,8 @@ class SLFConversion:
                 logger.info(f"[SKIP] No SLF to upload for {patient_id}")
                 continue
 
-            try:
-                remote_files: List[str] = self.sftp_client.list_files(
-                    str(remote_raw_dir)
-                )
-            except Exception as e:
-                logger.warning(
-                    f"[WARNING] Unable to list remote files for {remote_raw_dir}: {e}"
-                )
-                continue
-
-            edf_files: List[str] = [
-                f for f in remote_files if f.lower().endswith(".edf")
-            ]
-
             inconsistent: bool = False
-            for edf in edf_files:
-                expected_patient_id, _, _ = parse_patient_visit_recording(edf)
+            for edf, expected_patient_id in listing.edf_patients.items():
                 if expected_patient_id and expected_patient_id != patient_id.replace(
                     "PA", ""
                 ):
@@ -300,9 +426,22 @@ class SLFConversion:
                 logger.info(
                     f"[UPLOAD] Uploading {local_visit_folder} to {remote_visit_dir}"
                 )
-                self.sftp_client.upload_folder_recursive(
-                    local_visit_folder, str(remote_visit_dir)
-                )
+                # Manifest of an interrupted upload, rewritten below
+                (local_visit_folder / MANIFEST_NAME).unlink(missing_ok=True)
+                with metrics.recording(local_visit_folder.name):
+                    checksums = self.sftp_client.upload_folder_recursive(
+                        local_visit_folder, str(remote_visit_dir)
+                    )
+                    manifest_path: Path = write_manifest(
+                        local_visit_folder,
+                        build_manifest(
+                            checksums,
+                            self.source_checksums.get(local_visit_folder.name),
+                        ),
+                    )
+                    self.sftp_client.upload_file(
+                        manifest_path, str(remote_visit_dir / MANIFEST_NAME)
+                    )
                 uploaded_count += 1
 
         upload_duration = time.time() - start_upload
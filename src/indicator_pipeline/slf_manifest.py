@@ -0,0 +1,226 @@
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from indicator_pipeline import metrics
+from indicator_pipeline.checksums import (
+    CHECKSUM_ALGORITHM,
+    CHUNK_SIZE,
+    FileChecksum,
+    HashingReader,
+)
+from indicator_pipeline.recording_files import parse_slf_name
+
+logger = logging.getLogger(__name__)
+
+# Written in each SLF folder and uploaded after its other files: a remote SLF folder
+# with a manifest was uploaded completely
+MANIFEST_NAME: str = "manifest.json"
+MANIFEST_VERSION: int = 1
+
+PATIENT_PATTERN = re.compile(r"^PA\d+$")
+
+# Outcome of the verification of an SLF folder
+VERIFIED: str = "verified"
+MISMATCHED: str = "mismatched"
+NO_MANIFEST: str = "no_manifest"
+
+
+def build_manifest(
+    files: Dict[str, FileChecksum],
+    sources: Optional[Dict[str, FileChecksum]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the manifest of an SLF folder: the size and checksum of each of its files,
+    by path relative to the folder, and of the remote raw files it was converted from.
+    `sources_verified` is False when the raw files were not checksummed (None), e.g.
+    read with --stream-from-sftp or downloaded by an earlier run.
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "algorithm": CHECKSUM_ALGORITHM,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "files": {name: files[name]._asdict() for name in sorted(files)},
+        "sources": {
+            path: checksum._asdict() for path, checksum in (sources or {}).items()
+        },
+        "sources_verified": sources is not None,
+    }
+
+
+def write_manifest(folder: Path, manifest: Dict[str, Any]) -> Path:
+    """
+    Writes the manifest of an SLF folder inside it. Returns its path.
+    """
+    manifest_path: Path = folder / MANIFEST_NAME
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def read_local_manifest(folder: Path) -> Optional[Dict[str, Any]]:
+    """
+    Returns the manifest of a local SLF folder, None if it has none.
+    """
+    manifest_path: Path = folder / MANIFEST_NAME
+    if not manifest_path.is_file():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_manifests(expected: Dict[str, Any], actual: Dict[str, Any]) -> List[str]:
+    """
+    Returns the differences between the files of two manifests, empty if they match.
+    """
+    problems: List[str] = []
+    for name in sorted(set(expected["files"]) | set(actual["files"])):
+        expected_file = expected["files"].get(name)
+        actual_file = actual["files"].get(name)
+        if actual_file is None:
+            problems.append(f"{name} missing from the remote manifest")
+        elif expected_file is None:
+            problems.append(f"{name} missing from the local manifest")
+        elif expected_file != actual_file:
+            problems.append(f"{name} differs from the local folder")
+    return problems
+
+
+def check_remote_sizes(
+    sftp_client, remote_dir: str, manifest: Dict[str, Any], top_level: Dict[str, int]
+) -> List[str]:
+    """
+    Compares the files of a remote SLF folder with its manifest, from one listing per
+    folder: missing files, sizes that differ and files absent from the manifest.
+    `top_level` is the listing of the SLF folder itself.
+    """
+    problems: List[str] = []
+    listings: Dict[str, Optional[Dict[str, int]]] = {".": top_level}
+    for name, checksum in sorted(manifest["files"].items()):
+        path = PurePosixPath(name)
+        folder: str = str(path.parent)
+        if folder not in listings:
+            try:
+                listings[folder] = sftp_client.list_file_sizes(f"{remote_dir}/{folder}")
+            except Exception as e:
+                problems.append(f"{folder} not listed: {e}")
+                listings[folder] = None
+        sizes: Optional[Dict[str, int]] = listings[folder]
+        if sizes is None:
+            continue
+        if path.name not in sizes:
+            problems.append(f"{name} missing on the server")
+        elif sizes[path.name] != checksum["size"]:
+            problems.append(
+                f"{name} has {sizes[path.name]} bytes on the server, "
+                f"{checksum['size']} in the manifest"
+            )
+
+    # Top-level entries that are neither manifest files nor their folders
+    expected_names: Set[str] = {MANIFEST_NAME} | {
+        PurePosixPath(name).parts[0] for name in manifest["files"]
+    }
+    for name in sorted(set(top_level) - expected_names):
+        problems.append(f"{name} is not in the manifest")
+    return problems
+
+
+def check_remote_checksums(
+    sftp_client, remote_dir: str, manifest: Dict[str, Any]
+) -> List[str]:
+    """
+    Reads every file of a remote SLF folder and compares its checksum with the manifest.
+    """
+    problems: List[str] = []
+    for name, expected in manifest["files"].items():
+        with sftp_client.open_file(f"{remote_dir}/{name}", prefetch=True) as f:
+            reader = HashingReader(f)
+            while reader.read(CHUNK_SIZE):
+                pass
+        if reader.checksum()._asdict() != expected:
+            problems.append(f"{name} checksum differs from the manifest")
+    return problems
+
+
+def verify_slf_folder(
+    sftp_client,
+    remote_dir: str,
+    local_folder: Optional[Path] = None,
+    deep: bool = False,
+) -> Tuple[str, List[str]]:
+    """
+    Verifies an uploaded SLF folder against its manifest without downloading it: the
+    remote files must have the sizes of the manifest and, when the local folder still
+    exists, the local and remote manifests must match. With `deep`, the remote files
+    are also read to compare their checksums.
+    Returns the outcome (VERIFIED, MISMATCHED or NO_MANIFEST) and the differences found.
+    """
+    top_level: Dict[str, int] = sftp_client.list_file_sizes(remote_dir)
+    if MANIFEST_NAME not in top_level:
+        return NO_MANIFEST, []
+    with sftp_client.open_file(f"{remote_dir}/{MANIFEST_NAME}", prefetch=True) as f:
+        manifest: Dict[str, Any] = json.load(f)
+
+    problems: List[str] = check_remote_sizes(
+        sftp_client, remote_dir, manifest, top_level
+    )
+    local_manifest = (
+        read_local_manifest(local_folder) if local_folder is not None else None
+    )
+    if local_manifest is not None:
+        problems += compare_manifests(local_manifest, manifest)
+    if deep and not problems:
+        problems += check_remote_checksums(sftp_client, remote_dir, manifest)
+    return (MISMATCHED if problems else VERIFIED), problems
+
+
+def verify_slf(
+    sftp_client,
+    remote_year_dir: PurePosixPath,
+    local_year_dir: Path,
+    deep: bool = False,
+) -> Dict[str, int]:
+    """
+    Verifies every SLF folder uploaded for a year (see verify_slf_folder), comparing
+    them with the local folders of slf_to_compute/<year> that are not cleaned up yet.
+    Returns the number of folders of each outcome.
+    """
+    start = time.time()
+    summary: Dict[str, int] = {VERIFIED: 0, MISMATCHED: 0, NO_MANIFEST: 0}
+    patients: List[str] = [
+        name
+        for name in sftp_client.list_files(str(remote_year_dir))
+        if PATIENT_PATTERN.match(name)
+    ]
+    for patient_id in sorted(patients):
+        remote_patient_dir: PurePosixPath = remote_year_dir / patient_id
+        try:
+            names: List[str] = sftp_client.list_files(str(remote_patient_dir))
+        except Exception as e:
+            logger.warning(f"[VERIFY] Unable to list {remote_patient_dir}: {e}")
+            continue
+        for slf_name in sorted(name for name in names if parse_slf_name(name)):
+            local_folder: Path = local_year_dir / slf_name[len("slf_") :]
+            outcome, problems = verify_slf_folder(
+                sftp_client,
+                str(remote_patient_dir / slf_name),
+                local_folder if local_folder.is_dir() else None,
+                deep=deep,
+            )
+            summary[outcome] += 1
+            metrics.count(f"verify.{outcome}")
+            if problems:
+                logger.warning(
+                    f"[VERIFY] {remote_patient_dir / slf_name}: {'; '.join(problems)}"
+                )
+
+    logger.info(
+        f"[VERIFY] {remote_year_dir.name}: {summary[VERIFIED]} SLF folder(s) verified, "
+        f"{summary[MISMATCHED]} mismatched, {summary[NO_MANIFEST]} without manifest "
+        f"in {time.time() - start:.2f}s"
+    )
+    return summary
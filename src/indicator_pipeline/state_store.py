@@ -0,0 +1,373 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_NAME: str = "pipeline_state.db"
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS slf_usage (
+    slf_id TEXT NOT NULL,
+    indicator TEXT NOT NULL,
+    done INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (slf_id, indicator)
+);
+CREATE TABLE IF NOT EXISTS processed (
+    rel_path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sent_recordings (
+    key TEXT PRIMARY KEY,
+    record_id INTEGER,
+    hash TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slf_paths (
+    slf_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cleanup_runs (
+    started_at REAL PRIMARY KEY,
+    deleted INTEGER NOT NULL,
+    freed_bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slf_usage_updated_at ON slf_usage (updated_at);
+CREATE INDEX IF NOT EXISTS slf_paths_updated_at ON slf_paths (updated_at);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+"""
+
+
+class StateStore:
+    """
+    Embedded SQLite store holding the pipeline state that used to live in JSON files
+    (slf_usage.json, processed.json and sent_recordings.json), and the index of the local
+    SLF folders used by the cleanup.
+
+    Every update is a row-level upsert in its own transaction: concurrent steps or workers
+    no longer overwrite each other and a crash cannot leave a truncated file. Like the
+    JobQueue, the database keeps the rollback journal: the log directory can be a bind
+    mount or a network volume, where WAL and its shared memory file are not safe.
+    A connection is opened per operation, so a store can be shared between threads.
+
+    Args:
+    db_path (Path): Path to the SQLite database file.
+    timeout (float): Seconds to wait for a lock held by another process.
+    """
+
+    def __init__(self, db_path: Path, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self.connect() as conn:
+            # Databases created in WAL mode by earlier versions go back to the rollback journal
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Opens a connection and commits on success (rolls back on error).
+        """
+        conn = sqlite3.connect(str(self.db_path), timeout=self.timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_slf_usage(self) -> Dict[str, Dict[str, bool]]:
+        """
+        Returns the processing status of every SLF dataset: {slf_id: {indicator: done}}.
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT slf_id, indicator, done FROM slf_usage ORDER BY slf_id"
+            ).fetchall()
+
+        slf_usage: Dict[str, Dict[str, bool]] = {}
+        for slf_id, indicator, done in rows:
+            slf_usage.setdefault(slf_id, {})[indicator] = bool(done)
+        return slf_usage
+
+    def set_slf_usage(
+        self, slf_id: str, indicator: str, done: bool, overwrite: bool = True
+    ) -> None:
+        """
+        Sets the status of one indicator of one SLF dataset.
+        With overwrite=False an existing status is kept.
+        """
+        self.update_slf_usage({slf_id: {indicator: done}}, overwrite=overwrite)
+
+    def update_slf_usage(
+        self, data: Dict[str, Dict[str, bool]], overwrite: bool = True
+    ) -> None:
+        """
+        Upserts the given statuses in a single transaction. Only rows whose value changes
+        are rewritten; datasets absent from `data` are left untouched.
+        """
+        now: float = time.time()
+        rows = [
+            (slf_id, indicator, int(bool(done)), now)
+            for slf_id, indicators in data.items()
+            for indicator, done in indicators.items()
+        ]
+        if overwrite:
+            query = (
+                "INSERT INTO slf_usage (slf_id, indicator, done, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (slf_id, indicator) DO UPDATE SET done = excluded.done, "
+                "updated_at = excluded.updated_at WHERE slf_usage.done != excluded.done"
+            )
+        else:
+            query = (
+                "INSERT INTO slf_usage (slf_id, indicator, done, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (slf_id, indicator) DO NOTHING"
+            )
+        with self.connect() as conn:
+            conn.executemany(query, rows)
+
+    def get_processed(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the processed ParameterValues folders and their fingerprints.
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT rel_path, fingerprint FROM processed"
+            ).fetchall()
+        return {rel_path: json.loads(fingerprint) for rel_path, fingerprint in rows}
+
+    def update_processed(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Upserts the fingerprint of the given ParameterValues folders in a single transaction.
+        """
+        now: float = time.time()
+        rows = [
+            (rel_path, json.dumps(entry, sort_keys=True), now)
+            for rel_path, entry in data.items()
+        ]
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO processed (rel_path, fingerprint, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (rel_path) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+
+    def get_sent_recording(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the API id and payload hash of a recording already sent, or None.
+        """
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT record_id, hash FROM sent_recordings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "hash": row[1]}
+
+    def get_sent_recordings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns every recording already sent: {key: {"id": ..., "hash": ...}}.
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT key, record_id, hash FROM sent_recordings"
+            ).fetchall()
+        return {key: {"id": record_id, "hash": h} for key, record_id, h in rows}
+
+    def record_sent_recording(
+        self, key: str, record_id: Optional[int], row_hash: Optional[str]
+    ) -> None:
+        """
+        Stores the API id and payload hash of a recording acknowledged by the API.
+        """
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO sent_recordings (key, record_id, hash, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET record_id = excluded.record_id, "
+                "hash = excluded.hash, updated_at = excluded.updated_at",
+                (key, record_id, row_hash, time.time()),
+            )
+
+    def remove_sent_record(self, record_id: int) -> None:
+        """
+        Forgets the recordings acknowledged with an API id, e.g. a record deleted in MARS,
+        so that they are sent again.
+        """
+        with self.connect() as conn:
+            conn.execute(
+                "DELETE FROM sent_recordings WHERE record_id = ?", (record_id,)
+            )
+
+    def update_slf_paths(self, paths: Dict[str, str]) -> None:
+        """
+        Upserts the local folder of the given SLF datasets ({slf_id: path relative to the
+        local slf output}). Rewriting a row marks it for the next cleanup.
+        """
+        now: float = time.time()
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO slf_paths (slf_id, path, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (slf_id) DO UPDATE SET path = excluded.path, "
+                "updated_at = excluded.updated_at",
+                [(slf_id, path, now) for slf_id, path in paths.items()],
+            )
+
+    def remove_slf_paths(self, slf_ids: List[str]) -> None:
+        with self.connect() as conn:
+            conn.executemany(
+                "DELETE FROM slf_paths WHERE slf_id = ?",
+                [(slf_id,) for slf_id in slf_ids],
+            )
+
+    def backfill_slf_paths(self, paths: Dict[str, str]) -> None:
+        """
+        One-time indexing of the SLF folders converted before the index existed.
+        Rows already indexed are kept.
+        """
+        now: float = time.time()
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO slf_paths (slf_id, path, updated_at) VALUES (?, ?, ?)",
+                [(slf_id, path, now) for slf_id, path in paths.items()],
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO migrations (name, applied_at) VALUES ('slf_paths', ?)",
+                (now,),
+            )
+
+    def has_migration(self, name: str) -> bool:
+        with self.connect() as conn:
+            return (
+                conn.execute(
+                    "SELECT 1 FROM migrations WHERE name = ?", (name,)
+                ).fetchone()
+                is not None
+            )
+
+    def get_cleanup_candidates(self, since: float) -> Dict[str, str]:
+        """
+        Returns the indexed SLF folders whose indicators are all done, among the datasets
+        whose status or index row changed after `since`: {slf_id: path}.
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT p.slf_id, p.path FROM slf_paths p "
+                "WHERE p.slf_id IN (SELECT slf_id FROM slf_usage WHERE updated_at > ? "
+                "UNION SELECT slf_id FROM slf_paths WHERE updated_at > ?) "
+                "AND EXISTS (SELECT 1 FROM slf_usage u WHERE u.slf_id = p.slf_id) "
+                "AND NOT EXISTS "
+                "(SELECT 1 FROM slf_usage u WHERE u.slf_id = p.slf_id AND u.done = 0)",
+                (since, since),
+            ).fetchall()
+        return {slf_id: path for slf_id, path in rows}
+
+    def get_last_cleanup(self) -> float:
+        """
+        Returns the start time of the last cleanup, 0.0 if none ran yet.
+        """
+        with self.connect() as conn:
+            row = conn.execute("SELECT MAX(started_at) FROM cleanup_runs").fetchone()
+        return row[0] or 0.0
+
+    def record_cleanup(self, started_at: float, deleted: int, freed_bytes: int) -> None:
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cleanup_runs (started_at, deleted, freed_bytes) "
+                "VALUES (?, ?, ?)",
+                (started_at, deleted, freed_bytes),
+            )
+
+    def migrate_json_files(self, log_dir: Path) -> None:
+        """
+        One-time import of the legacy JSON state files found in `log_dir`.
+        Imported files are renamed with a '.migrated' suffix.
+        """
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute(
+                "SELECT 1 FROM migrations WHERE name = 'json_files'"
+            ).fetchone()
+            if done:
+                return
+            conn.execute(
+                "INSERT INTO migrations (name, applied_at) VALUES ('json_files', ?)",
+                (time.time(),),
+            )
+
+            now: float = time.time()
+            migrated = []
+
+            slf_usage_path: Path = log_dir / "slf_usage.json"
+            if slf_usage_path.exists():
+                data = json.loads(slf_usage_path.read_text(encoding="utf-8") or "{}")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO slf_usage (slf_id, indicator, done, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (slf_id, indicator, int(bool(done)), now)
+                        for slf_id, indicators in data.items()
+                        for indicator, done in indicators.items()
+                    ],
+                )
+                migrated.append(slf_usage_path)
+
+            processed_path: Path = log_dir / "processed.json"
+            if processed_path.exists():
+                data = json.loads(processed_path.read_text(encoding="utf-8") or "{}")
+                if isinstance(data, list):
+                    data = {rel_path: {} for rel_path in data}
+                conn.executemany(
+                    "INSERT OR REPLACE INTO processed (rel_path, fingerprint, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (rel_path, json.dumps(entry, sort_keys=True), now)
+                        for rel_path, entry in data.items()
+                    ],
+                )
+                migrated.append(processed_path)
+
+            sent_path: Path = log_dir / "sent_recordings.json"
+            if sent_path.exists():
+                data = json.loads(sent_path.read_text(encoding="utf-8") or "{}")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sent_recordings (key, record_id, hash, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (key, entry.get("id"), entry.get("hash"), now)
+                        for key, entry in data.items()
+                    ],
+                )
+                migrated.append(sent_path)
+
+        for path in migrated:
+            path.replace(path.with_name(path.name + ".migrated"))
+            logger.info(f"[MIGRATION] Imported {path.name} into {self.db_path.name}")
+
+
+_stores: Dict[Path, StateStore] = {}
+
+
+def get_state_store(log_dir: Path) -> StateStore:
+    """
+    Returns the state store of a log directory, creating it (and migrating the legacy
+    JSON files) on first use in this process.
+    """
+    db_path: Path = (log_dir / STATE_DB_NAME).resolve()
+    store: Optional[StateStore] = _stores.get(db_path)
+    if store is None:
+        store = StateStore(db_path)
+        store.migrate_json_files(log_dir)
+        _stores[db_path] = store
+    return store
@@ -1,32 +1,23 @@
-import json
+import math
 import os
-import re
 from pathlib import Path
-from typing import Optional, Union, Set, Dict, List, Tuple
+from typing import Optional, Union, Dict, List, Tuple
+
+from indicator_pipeline.filename_parsing import parse_filename, parse_recording
+from indicator_pipeline.state_store import StateStore, get_state_store
 
 
 def parse_recording_number(filename: str) -> str:
     """Extracts recording number FExxxx from edf or slf filename."""
-
-    match = re.search(r"FE(\d+)", filename)
-    if match:
-        return match.group(1)
-    return ""
+    return parse_recording(filename)
 
 
 def parse_patient_visit_recording(filename: str) -> Tuple[str, str, str]:
     """
     Extracts patient id, visit number and recording number from filename.
-    Returns these numbers as strings.
+    Returns these numbers as strings. Results are cached (see filename_parsing).
     """
-    match = re.search(r"PA(\d+)(?:_?V(\d+))?", filename)
-    recording_number = parse_recording_number(filename)
-
-    if match:
-        patient_id = match.group(1)
-        visit_number = match.group(2) or ""
-        return patient_id, visit_number, recording_number
-    return "", "", ""
+    return parse_filename(filename)
 
 
 def extract_subject_id_from_filename(edf_file: Path) -> str:
@@ -46,37 +37,19 @@ def extract_subject_id_from_filename(edf_file: Path) -> str:
     return "_".join(parts)
 
 
-def extract_recording_values(file_list: List[str]) -> List[Tuple[str, str]]:
-    """
-    Extracts (visit, recording) tuples from EDF filenames.
-    Returns: [('V1', 'FE0001'), ('V1', 'FE0002'), ('V2', 'FE0001')]
-    """
-    recordings: Set = set()
-    pattern = re.compile(r"FE(\d+)T1-PA\w+V(\d+)C\d+")
-
-    for filename in file_list:
-        if not filename.lower().endswith(".edf"):
-            continue
-        match = pattern.search(filename)
-        if match:
-            visit = f"V{match.group(2)}"
-            recording = f"FE{match.group(1)}"
-            recordings.add((visit, recording))
-
-    return sorted(recordings)
-
-
 def try_parse_number(value, as_int: bool = False) -> Optional[Union[int, float]]:
     """
     Converts a string to an int or float. Replaces commas with periods to handle European decimal formats.
-    Returns None if the conversion fails.
+    Returns None if the conversion fails or if the value is NaN.
     """
     try:
         if isinstance(value, str):
             value = value.replace(",", ".")
         number = round(float(value), 2)
+        if math.isnan(number):
+            return None
         return int(number) if as_int else number
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, OverflowError):
         return None
 
 
@@ -125,6 +98,13 @@ def lowercase_extensions(dir_path: Path):
                 file.rename(new_path)
 
 
+def folder_size(path: Path) -> int:
+    """
+    Returns the total size in bytes of the files under `path`.
+    """
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
 def get_log_dir() -> Path:
     """
     Returns the log directory, creating it if it doesn't exist.
@@ -135,27 +115,44 @@ def get_log_dir() -> Path:
     return log_dir
 
 
+def get_state() -> StateStore:
+    """
+    Returns the pipeline state store (SQLite database in the log directory).
+    Legacy JSON state files found there are migrated on first use.
+    """
+    return get_state_store(get_log_dir())
+
+
 def load_slf_usage() -> Dict[str, Dict[str, bool]]:
     """
-    Load the tracking file (slf_usage.json) that records the processing status
+    Load the tracking table (formerly slf_usage.json) that records the processing status
     of SLF datasets.
     """
-    log_dir: Path = get_log_dir()
-    slf_usage_path = log_dir / "slf_usage.json"
+    return get_state().get_slf_usage()
 
-    if slf_usage_path.exists():
-        with slf_usage_path.open("r") as f:
-            return json.load(f)
-    return {}
+
+def save_slf_usage(data: Dict[str, Dict[str, bool]], overwrite: bool = True) -> None:
+    """
+    Saves the given SLF dataset statuses. Each (dataset, indicator) pair is upserted as
+    its own row, so datasets updated concurrently by another step are not overwritten.
+    With overwrite=False existing statuses are kept.
+    """
+    get_state().update_slf_usage(data, overwrite=overwrite)
 
 
-def save_slf_usage(data: Dict[str, Dict[str, bool]]) -> None:
+def set_slf_usage(
+    slf_id: str, indicator: str, done: bool, overwrite: bool = True
+) -> None:
     """
-    Saves the current state of slf_usage.json.
+    Updates the status of a single indicator of a single SLF dataset.
+    With overwrite=False an existing status is kept.
     """
-    log_dir: Path = get_log_dir()
-    slf_usage_path = log_dir / "slf_usage.json"
-    slf_usage_path.parent.mkdir(parents=True, exist_ok=True)
+    get_state().set_slf_usage(slf_id, indicator, done, overwrite=overwrite)
+
 
-    with slf_usage_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def save_slf_paths(paths: Dict[str, str]) -> None:
+    """
+    Indexes the local folder of the given SLF datasets ({slf_id: path relative to the
+    local slf output}) for the cleanup step.
+    """
+    get_state().update_slf_paths(paths)
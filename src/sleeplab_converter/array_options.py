@@ -0,0 +1,9 @@
+# Options of the SLF sample arrays, kept free of heavy imports (numpy, zarr, numcodecs)
+# so that the command line can list them without loading the conversion stack.
+
+STREAMED_FORMATS = ("numpy", "zarr")
+ZARR_CODECS = ("zstd", "lz4", "blosc-zstd", "blosc-lz4")
+ZARR_SHUFFLES = ("none", "byte", "bit")
+
+# Upload bandwidth (Mbit/s) assumed when comparing the array formats
+DEFAULT_LINK_MBPS: float = 100.0
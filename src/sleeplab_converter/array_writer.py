@@ -0,0 +1,397 @@
+import logging
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numcodecs
+import numpy as np
+import zarr
+from sleeplab_format import writer, models
+
+from sleeplab_converter.array_options import (
+    STREAMED_FORMATS,
+    ZARR_CODECS,
+    ZARR_SHUFFLES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Same chunk size as sleeplab_format.writer.write_sample_arrays (bytes)
+ZARR_CHUNK_BYTES: int = 5_000_000
+BLOSC_SHUFFLES = {
+    "none": numcodecs.Blosc.NOSHUFFLE,
+    "byte": numcodecs.Blosc.SHUFFLE,
+    "bit": numcodecs.Blosc.BITSHUFFLE,
+}
+
+
+def get_zarr_codecs(
+    codec: str = "zstd", clevel: int = 7, shuffle: str = "none", itemsize: int = 4
+) -> Tuple[Any, Optional[List[Any]]]:
+    """
+    Returns the zarr compressor and filters for a codec name ('zstd', 'lz4', 'blosc-zstd'
+    or 'blosc-lz4'), a compression level and a shuffle mode ('none', 'byte' or 'bit').
+    Blosc shuffles internally; for zstd and lz4 a byte shuffle is added as a filter.
+    'zstd' without shuffle is the sleeplab_format default.
+    """
+    if codec not in ZARR_CODECS:
+        raise ValueError(f"Unknown zarr codec: {codec} (expected one of {ZARR_CODECS})")
+    if shuffle not in ZARR_SHUFFLES:
+        raise ValueError(
+            f"Unknown shuffle: {shuffle} (expected one of {ZARR_SHUFFLES})"
+        )
+
+    if codec.startswith("blosc-"):
+        compressor = numcodecs.Blosc(
+            cname=codec.split("-", 1)[1],
+            clevel=min(clevel, 9),
+            shuffle=BLOSC_SHUFFLES[shuffle],
+        )
+        return compressor, None
+
+    if shuffle == "bit":
+        raise ValueError(
+            f"Bit shuffle is only available with Blosc codecs, not {codec}"
+        )
+    filters = [numcodecs.Shuffle(elementsize=itemsize)] if shuffle == "byte" else None
+    if codec == "zstd":
+        return numcodecs.Zstd(level=clevel), filters
+    return numcodecs.LZ4(), filters
+
+
+class NpyStreamWriter:
+    """
+    Writes a 1-D .npy file block by block: the header is written from the number of
+    samples known in advance and the blocks are appended to it. The file is identical
+    to the one written by np.save.
+
+    Args:
+    path (Path): Path of the .npy file.
+    n_samples (int): Number of samples of the array.
+    dtype (np.dtype): Type of the samples.
+    """
+
+    def __init__(self, path: Path, n_samples: int, dtype: np.dtype):
+        self.path = path
+        self.n_samples = n_samples
+        self.dtype = np.dtype(dtype)
+        self.written: int = 0
+        self._file = path.open("wb")
+        np.lib.format.write_array_header_1_0(
+            self._file,
+            {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (n_samples,),
+            },
+        )
+
+    def write(self, chunk: np.array) -> None:
+        self._file.write(np.ascontiguousarray(chunk, dtype=self.dtype).tobytes())
+        self.written += chunk.size
+
+    def close(self, complete: bool = True) -> None:
+        """
+        Closes the file and, if the array is `complete`, checks its number of samples.
+        """
+        self._file.close()
+        if complete:
+            _check_sample_count(self.path, self.written, self.n_samples)
+
+    def __enter__(self) -> "NpyStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.close(complete=exc_type is None)
+
+
+class ZarrStreamWriter:
+    """
+    Writes a 1-D zarr array block by block. Blocks are gathered until they fill a zarr
+    chunk, so that every chunk is compressed once and never re-read, whatever the size of
+    the blocks; blocks of exactly one chunk are written without copy.
+
+    Args:
+    path (Path): Path of the zarr array.
+    n_samples (int): Number of samples of the array.
+    dtype (np.dtype): Type of the samples.
+    chunk_samples (int): Number of samples per zarr chunk.
+    compressor (Any): zarr compressor (see get_zarr_codecs).
+    filters (Optional[List[Any]]): zarr filters (see get_zarr_codecs).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        n_samples: int,
+        dtype: np.dtype,
+        chunk_samples: int,
+        compressor: Any,
+        filters: Optional[List[Any]] = None,
+    ):
+        self.path = path
+        self.n_samples = n_samples
+        self.chunk_samples = chunk_samples
+        self.written: int = 0
+        self._array = zarr.open_array(
+            str(path),
+            mode="w",
+            shape=(n_samples,),
+            chunks=(chunk_samples,),
+            dtype=dtype,
+            compressor=compressor,
+            filters=filters,
+        )
+        self._buffer = np.empty(min(chunk_samples, max(n_samples, 1)), dtype=dtype)
+        self._buffered: int = 0
+
+    def _store(self, values: np.array) -> None:
+        self._array[self.written : self.written + values.size] = values
+        self.written += values.size
+
+    def write(self, chunk: np.array) -> None:
+        if self._buffered == 0 and chunk.size == self.chunk_samples:
+            self._store(chunk)
+            return
+        start: int = 0
+        while start < chunk.size:
+            n: int = min(self._buffer.size - self._buffered, chunk.size - start)
+            self._buffer[self._buffered : self._buffered + n] = chunk[start : start + n]
+            self._buffered += n
+            start += n
+            if self._buffered == self._buffer.size:
+                self._store(self._buffer)
+                self._buffered = 0
+
+    def close(self, complete: bool = True) -> None:
+        """
+        Writes the last partial chunk and, if the array is `complete`, checks its number
+        of samples.
+        """
+        if not complete:
+            return
+        if self._buffered:
+            self._store(self._buffer[: self._buffered])
+            self._buffered = 0
+        _check_sample_count(self.path, self.written, self.n_samples)
+
+    def __enter__(self) -> "ZarrStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.close(complete=exc_type is None)
+
+
+def _check_sample_count(path: Path, written: int, n_samples: int) -> None:
+    if written != n_samples:
+        raise ValueError(
+            f"{path}: {written} samples written, {n_samples} expected from the EDF header"
+        )
+
+
+def write_npy_streamed(
+    path: Path, chunks: Iterator[np.array], n_samples: int, dtype: np.dtype
+) -> None:
+    """
+    Writes a 1-D .npy file from blocks of samples (see NpyStreamWriter).
+    """
+    with NpyStreamWriter(path, n_samples, dtype) as out:
+        for chunk in chunks:
+            out.write(chunk)
+
+
+def write_zarr_streamed(
+    path: Path,
+    chunks: Iterator[np.array],
+    n_samples: int,
+    dtype: np.dtype,
+    chunk_samples: int,
+    compressor: Any,
+    filters: Optional[List[Any]] = None,
+) -> None:
+    """
+    Writes a 1-D zarr array from blocks of samples (see ZarrStreamWriter).
+    """
+    with ZarrStreamWriter(
+        path, n_samples, dtype, chunk_samples, compressor, filters
+    ) as out:
+        for chunk in chunks:
+            out.write(chunk)
+
+
+def write_attributes(sarr: models.SampleArray, sarr_path: Path) -> None:
+    """
+    Creates the folder of a SampleArray and writes its attributes.json.
+    """
+    sarr_path.mkdir(exist_ok=True)
+    (sarr_path / "attributes.json").write_text(
+        sarr.attributes.model_dump_json(indent=writer.JSON_INDENT, exclude_none=True),
+        encoding="utf-8",
+    )
+
+
+def open_array_writer(
+    sarr_path: Path,
+    array_format: str,
+    n_samples: int,
+    dtype: np.dtype,
+    compression_level: int = 7,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+):
+    """
+    Returns the block writer of data.npy or data.zarr in the folder of a SampleArray.
+    """
+    dtype = np.dtype(dtype)
+    if array_format == "numpy":
+        return NpyStreamWriter(sarr_path / "data.npy", n_samples, dtype)
+    if array_format == "zarr":
+        compressor, filters = get_zarr_codecs(
+            zarr_codec, compression_level, zarr_shuffle, dtype.itemsize
+        )
+        return ZarrStreamWriter(
+            sarr_path / "data.zarr",
+            n_samples,
+            dtype,
+            int(ZARR_CHUNK_BYTES // dtype.itemsize),
+            compressor,
+            filters,
+        )
+    raise AttributeError(f"Unsupported streamed array format: {array_format}")
+
+
+def write_sample_array(
+    sarr: models.SampleArray,
+    sarr_path: Path,
+    array_format: str = "numpy",
+    compression_level: int = 7,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+) -> None:
+    """
+    Writes one SampleArray (attributes.json and data.npy or data.zarr) in the layout of
+    sleeplab_format, streaming the channel so that memory does not grow with its length.
+    """
+    write_attributes(sarr, sarr_path)
+
+    loader = sarr.values_func
+    if hasattr(loader, "iter_chunks"):
+        n_samples: int = loader.n_samples
+        dtype: np.dtype = loader.dtype
+        chunk_samples: int = int(ZARR_CHUNK_BYTES // dtype.itemsize)
+        chunks: Iterator[np.array] = loader.iter_chunks(chunk_samples)
+    else:
+        # Not an EDF SignalLoader: the array is loaded at once
+        values: np.array = np.asarray(loader())
+        n_samples, dtype = values.size, values.dtype
+        chunks = iter([values])
+
+    with open_array_writer(
+        sarr_path,
+        array_format,
+        n_samples,
+        dtype,
+        compression_level,
+        zarr_codec,
+        zarr_shuffle,
+    ) as out:
+        for chunk in chunks:
+            out.write(chunk)
+
+
+def write_record_stream(
+    sample_arrays: List[models.SampleArray],
+    subject_path: Path,
+    array_format: str = "numpy",
+    compression_level: int = 7,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+) -> None:
+    """
+    Writes SampleArrays whose loaders share an EDFRecordStream in a single pass over the
+    data records of their EDF file, each decoded block being appended to the array of
+    its channel. Used for remote files, which are much faster to read once from start to
+    end than channel by channel.
+    """
+    loaders = [sarr.values_func for sarr in sample_arrays]
+    with ExitStack() as stack:
+        outs = []
+        for sarr, loader in zip(sample_arrays, loaders):
+            sarr_path: Path = subject_path / sarr.attributes.name
+            write_attributes(sarr, sarr_path)
+            outs.append(
+                stack.enter_context(
+                    open_array_writer(
+                        sarr_path,
+                        array_format,
+                        loader.n_samples,
+                        loader.dtype,
+                        compression_level,
+                        zarr_codec,
+                        zarr_shuffle,
+                    )
+                )
+            )
+        blocks = loaders[0].record_stream.iter_blocks(
+            [loader.channel for loader in loaders]
+        )
+        for block in blocks:
+            for out, chunk in zip(outs, block):
+                out.write(chunk)
+
+
+def write_subject(
+    subject: models.Subject,
+    subject_path: Path,
+    annotation_format: str = "json",
+    array_format: str = "numpy",
+    compression_level: int = 7,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+) -> None:
+    """
+    Writes a single Subject like sleeplab_format.writer.write_subject, with the sample
+    arrays streamed block by block for the numpy and zarr formats and a configurable
+    zarr codec.
+    """
+    if array_format not in STREAMED_FORMATS:
+        writer.write_subject(
+            subject,
+            subject_path,
+            annotation_format=annotation_format,
+            array_format=array_format,
+            compression_level=compression_level,
+        )
+        return
+
+    subject_path.mkdir(exist_ok=True)
+    writer.write_subject_metadata(subject, subject_path)
+
+    if subject.sample_arrays is not None:
+        # Channels of a remote EDF file are written together, in one pass over the file
+        by_stream: Dict[int, List[models.SampleArray]] = {}
+        for sarr in subject.sample_arrays.values():
+            record_stream = getattr(sarr.values_func, "record_stream", None)
+            if record_stream is not None:
+                by_stream.setdefault(id(record_stream), []).append(sarr)
+                continue
+            write_sample_array(
+                sarr,
+                subject_path / sarr.attributes.name,
+                array_format=array_format,
+                compression_level=compression_level,
+                zarr_codec=zarr_codec,
+                zarr_shuffle=zarr_shuffle,
+            )
+        for sample_arrays in by_stream.values():
+            write_record_stream(
+                sample_arrays,
+                subject_path,
+                array_format=array_format,
+                compression_level=compression_level,
+                zarr_codec=zarr_codec,
+                zarr_shuffle=zarr_shuffle,
+            )
+
+    if subject.annotations is not None:
+        writer.write_annotations(subject, subject_path, format=annotation_format)
@@ -1,10 +1,14 @@
+import io
+import re
+from datetime import datetime
 from functools import partial
 from pathlib import Path
-from typing import Any, Optional, Dict, List, Tuple, Callable
+from typing import Any, BinaryIO, Optional, Dict, Iterator, List, Tuple, Callable
 
 import numpy as np
 import pyedflib
-from mne.io import read_raw_edf
+
+from indicator_pipeline import metrics
 
 
 def read_header_flexible(edf_filepath) -> Dict[str, Any]:
@@ -12,9 +16,21 @@ def read_header_flexible(edf_filepath) -> Dict[str, Any]:
     Reads the EDF header manually by parsing the binary file.
     Returns a dictionary containing parsed header fields including channel labels, sampling rates, etc.
     """
+    with open(edf_filepath, mode="rb") as edf_file:
+        return read_header_from_file(edf_file)
+
+
+def read_header_from_file(edf_file: BinaryIO) -> Dict[str, Any]:
+    """
+    Parses the EDF header from a binary file object positioned at the start of the file.
+    The header is fetched in two reads (fixed part, then signal part), which matters
+    when the file object is a remote SFTP file.
+    """
     header: Dict[str, Any] = {}
 
-    with open(edf_filepath, mode="rb", buffering=0) as f:
+    fixed_header: bytes = edf_file.read(256)
+    n_signals: int = int(fixed_header[252:256].decode("latin-1"))
+    with io.BytesIO(fixed_header + edf_file.read(256 * n_signals)) as f:
         header["ver"] = int(f.read(8).decode("latin-1"))
         header["patientID"] = f.read(80).decode("latin-1")
         header["recordID"] = f.read(80).decode("latin-1")
@@ -56,6 +72,94 @@ def read_header_flexible(edf_filepath) -> Dict[str, Any]:
     return header
 
 
+# Samples decoded per read: bounds the temporary decoding buffer to 8 MB (float64)
+DECODE_CHUNK_SAMPLES: int = 1 << 20
+
+
+class SignalLoader:
+    """
+    Lazy loader of one EDF channel, used as the `values_func` of a SampleArray.
+    The number of samples comes from the EDF header, so the memory needed to decode the
+    channel is known before reading it. Channels streamed from a remote file also keep
+    the EDFRecordStream of the file and their index in it, so that they can be written
+    together in one pass.
+    """
+
+    def __init__(
+        self,
+        read_func: Callable[[], np.array],
+        n_samples: int,
+        dtype: np.dtype,
+        iter_func: Optional[Callable[..., Iterator[np.array]]] = None,
+        record_stream: Optional["EDFRecordStream"] = None,
+        channel: Optional[int] = None,
+    ):
+        self.read_func = read_func
+        self.iter_func = iter_func
+        self.record_stream = record_stream
+        self.channel = channel
+        self.n_samples = max(int(n_samples), 0)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the decoded channel in bytes.
+        """
+        return self.n_samples * self.dtype.itemsize
+
+    def __call__(self) -> np.array:
+        return self.read_func()
+
+    def iter_chunks(self, chunk_samples: Optional[int] = None) -> Iterator[np.array]:
+        """
+        Yields the channel in consecutive blocks of at most `chunk_samples` samples,
+        so that it can be written in constant memory.
+        """
+        if self.iter_func is None:
+            yield self()
+            return
+        yield from self.iter_func(chunk_samples=chunk_samples or DECODE_CHUNK_SAMPLES)
+
+
+def _iter_edf_blocks(
+    hdl: pyedflib.EdfReader, idx: int, n_samples: int, digital: bool, chunk_samples: int
+) -> Iterator[Tuple[int, np.array]]:
+    """
+    Decodes channel `idx` block by block into a reused buffer.
+    Yields the offset of each block and a view on its decoded samples.
+    """
+    buffer = np.empty(
+        min(chunk_samples, n_samples), dtype=np.int32 if digital else np.float64
+    )
+    for start in range(0, n_samples, chunk_samples):
+        n: int = min(chunk_samples, n_samples - start)
+        if digital:
+            hdl.read_digital_signal(idx, start, n, buffer)
+        else:
+            hdl.readsignal(idx, start, n, buffer)
+        yield start, buffer[:n]
+
+
+def read_signal_into(
+    hdl: pyedflib.EdfReader,
+    idx: int,
+    out: np.array,
+    digital: bool = False,
+    chunk_samples: Optional[int] = None,
+) -> np.array:
+    """
+    Decodes channel `idx` of an open EDF file directly into the preallocated array `out`,
+    block by block, so that no full-length float64 copy of the channel is ever created.
+    """
+    blocks = _iter_edf_blocks(
+        hdl, idx, out.size, digital, chunk_samples or DECODE_CHUNK_SAMPLES
+    )
+    for start, block in blocks:
+        out[start : start + block.size] = block
+    return out
+
+
 def read_signal_from_path(
     edf_path: str, idx: int, digital: bool = False, dtype: np.dtype = np.float32
 ) -> np.array:
@@ -63,13 +167,39 @@ def read_signal_from_path(
     Reads a specific signal channel from an EDF file using pyedflib.
     Returns the signal values as a NumPy array.
     """
-    with pyedflib.EdfReader(edf_path, annotations_mode=0) as hdl:
-        # Read as digital if need to rewrite EDF
-        # since otherwise will crash due to shifted values
-        # https://github.com/holgern/pyedflib/issues/46
-        s = hdl.readSignal(idx, digital=digital)
+    with metrics.span("edf.decode"):
+        with pyedflib.EdfReader(edf_path, annotations_mode=0) as hdl:
+            # Read as digital if need to rewrite EDF
+            # since otherwise will crash due to shifted values
+            # https://github.com/holgern/pyedflib/issues/46
+            signal = np.empty(hdl.getNSamples()[idx], dtype=dtype)
+            read_signal_into(hdl, idx, signal, digital=digital)
+    metrics.count("edf.samples_decoded", signal.size)
+    return signal
 
-    return np.array(s).astype(dtype)
+
+def iter_signal_chunks_from_path(
+    edf_path: str,
+    idx: int,
+    digital: bool = False,
+    dtype: np.dtype = np.float32,
+    chunk_samples: int = DECODE_CHUNK_SAMPLES,
+) -> Iterator[np.array]:
+    """
+    Streams a channel of an EDF file with pyedflib in blocks of `chunk_samples` samples.
+    """
+    with pyedflib.EdfReader(edf_path, annotations_mode=0) as hdl:
+        blocks = _iter_edf_blocks(
+            hdl, idx, hdl.getNSamples()[idx], digital, chunk_samples
+        )
+        while True:
+            with metrics.span("edf.decode"):
+                item = next(blocks, None)
+                if item is None:
+                    return
+                chunk: np.array = item[1].astype(dtype)
+            metrics.count("edf.samples_decoded", chunk.size)
+            yield chunk
 
 
 def read_edf_export(
@@ -91,7 +221,9 @@ def read_edf_export(
     # Tell EdfReader not to validate annotations if they will not be used
     annotations_mode: int = 2 if annotations else 0
 
-    with pyedflib.EdfReader(edf_path_str, annotations_mode=annotations_mode) as hdl:
+    with metrics.span("edf.open"):
+        hdl = pyedflib.EdfReader(edf_path_str, annotations_mode=annotations_mode)
+    with hdl:
         n_chs: int = hdl.signals_in_file
 
         # Resolve the channel indices if channel names are given
@@ -128,7 +260,16 @@ def read_edf_export(
                 digital=digital,
                 dtype=dtype,
             )
-            s_load_funcs.append(s_func)
+            iter_func = partial(
+                iter_signal_chunks_from_path,
+                edf_path=edf_path_str,
+                idx=i,
+                digital=digital,
+                dtype=dtype,
+            )
+            s_load_funcs.append(
+                SignalLoader(s_func, hdl.getNSamples()[i], dtype, iter_func=iter_func)
+            )
 
     return s_load_funcs, signal_headers, header
 
@@ -140,9 +281,43 @@ def read_signal_from_path_mne(
     Reads a single channel from an EDF file using the MNE library.
     Returns the signal values as a NumPy array.
     """
-    signal_raw = read_raw_edf(edf_path, include=ch_name, preload=True, verbose="error")
-    s = signal_raw.get_data()
-    return np.array(s[0]).astype(dtype)
+    # MNE is slow to import and only needed for the EDF files pyedflib cannot read
+    from mne.io import read_raw_edf
+
+    with metrics.span("edf.decode_mne"):
+        # Without preload, MNE reads the requested samples only: the channel is copied
+        # block by block into the output array instead of being loaded as float64 first
+        signal_raw = read_raw_edf(
+            edf_path, include=ch_name, preload=False, verbose="error"
+        )
+        signal = np.empty(signal_raw.n_times, dtype=dtype)
+        for start in range(0, signal.size, DECODE_CHUNK_SAMPLES):
+            stop: int = min(start + DECODE_CHUNK_SAMPLES, signal.size)
+            signal[start:stop] = signal_raw.get_data(start=start, stop=stop)[0]
+    metrics.count("edf.samples_decoded", signal.size)
+    return signal
+
+
+def iter_signal_chunks_from_path_mne(
+    edf_path: str,
+    ch_name: str,
+    dtype: np.dtype = np.float32,
+    chunk_samples: int = DECODE_CHUNK_SAMPLES,
+) -> Iterator[np.array]:
+    """
+    Streams a single channel of an EDF file with MNE in blocks of `chunk_samples` samples.
+    """
+    from mne.io import read_raw_edf
+
+    signal_raw = read_raw_edf(edf_path, include=ch_name, preload=False, verbose="error")
+    for start in range(0, signal_raw.n_times, chunk_samples):
+        stop: int = min(start + chunk_samples, signal_raw.n_times)
+        with metrics.span("edf.decode_mne"):
+            chunk: np.array = signal_raw.get_data(start=start, stop=stop)[0].astype(
+                dtype
+            )
+        metrics.count("edf.samples_decoded", chunk.size)
+        yield chunk
 
 
 def read_edf_export_mne(
@@ -158,7 +333,8 @@ def read_edf_export_mne(
         - list of signal headers,
         - global EDF header with optional annotations (metadata)
     """
-    header = read_header_flexible(edf_path)
+    with metrics.span("edf.open_mne"):
+        header = read_header_flexible(edf_path)
     n_chs = header["ns"]
 
     if ch_names is None:
@@ -190,7 +366,16 @@ def read_edf_export_mne(
                 ch_name=header["label"][i],
                 dtype=dtype,
             )
-            s_load_funcs.append(s_func)
+            iter_func = partial(
+                iter_signal_chunks_from_path_mne,
+                edf_path=edf_path,
+                ch_name=header["label"][i],
+                dtype=dtype,
+            )
+            n_samples: int = header["records"] * header["samples"][i]
+            s_load_funcs.append(
+                SignalLoader(s_func, n_samples, dtype, iter_func=iter_func)
+            )
 
         elif header["label"][i] != "EDF Annotations":
             s_header = {}
@@ -208,6 +393,331 @@ def read_edf_export_mne(
                 ch_name=header["label"][i],
                 dtype=dtype,
             )
-            s_load_funcs.append(s_func)
+            iter_func = partial(
+                iter_signal_chunks_from_path_mne,
+                edf_path=edf_path,
+                ch_name=header["label"][i],
+                dtype=dtype,
+            )
+            n_samples: int = header["records"] * header["samples"][i]
+            s_load_funcs.append(
+                SignalLoader(s_func, n_samples, dtype, iter_func=iter_func)
+            )
+
+    return s_load_funcs, signal_headers, header
+
+
+def _read_ranges(f: BinaryIO, ranges: List[Tuple[int, int]]) -> bytes:
+    """
+    Reads the (offset, size) byte ranges of a file. Remote SFTP files request all the
+    ranges at once with `readv`: adjacent ranges are merged, then cut into pieces of at
+    most one SFTP request, since paramiko reads large pieces in quadratic time.
+    Other files are read range by range.
+    """
+    if hasattr(f, "readv"):
+        max_request: int = getattr(f, "MAX_REQUEST_SIZE", 32768)
+        merged: List[List[int]] = []
+        for offset, size in ranges:
+            if merged and sum(merged[-1]) == offset:
+                merged[-1][1] += size
+            else:
+                merged.append([offset, size])
+        pieces: List[Tuple[int, int]] = [
+            (start, min(max_request, offset + size - start))
+            for offset, size in merged
+            for start in range(offset, offset + size, max_request)
+        ]
+        return b"".join(f.readv(pieces))
+    data: List[bytes] = []
+    for offset, size in ranges:
+        f.seek(offset)
+        data.append(f.read(size))
+    return b"".join(data)
+
+
+def _channel_ranges(
+    header: Dict[str, Any], idx: int, first_record: int, stop_record: int
+) -> List[Tuple[int, int]]:
+    """
+    Returns the byte ranges of channel `idx` in the data records [first_record, stop_record).
+    """
+    samples: np.array = header["samples"]
+    record_bytes: int = int(samples.sum()) * 2
+    channel_offset: int = header["bytes"] + int(samples[:idx].sum()) * 2
+    channel_bytes: int = int(samples[idx]) * 2
+    return [
+        (channel_offset + record * record_bytes, channel_bytes)
+        for record in range(first_record, stop_record)
+    ]
+
+
+def _to_physical(
+    header: Dict[str, Any], idx: int, digital: np.array, dtype: np.dtype
+) -> np.array:
+    """
+    Converts the 16-bit samples of channel `idx` to physical values, like pyedflib.
+    """
+    gain: float = (header["physical_max"][idx] - header["physical_min"][idx]) / (
+        header["digital_max"][idx] - header["digital_min"][idx]
+    )
+    offset: float = header["physical_max"][idx] / gain - header["digital_max"][idx]
+    return (gain * (digital + offset)).astype(dtype)
+
+
+def _check_records(header: Dict[str, Any]) -> int:
+    if header["records"] < 0:
+        raise ValueError(
+            "EDF files with an unknown number of data records are not supported"
+        )
+    return header["records"]
+
+
+def iter_signal_chunks_from_file(
+    open_func: Callable[[], BinaryIO],
+    header: Dict[str, Any],
+    idx: int,
+    dtype: np.dtype = np.float32,
+    chunk_samples: int = DECODE_CHUNK_SAMPLES,
+) -> Iterator[np.array]:
+    """
+    Streams channel `idx` of an EDF file opened by `open_func` in blocks of about
+    `chunk_samples` samples. The samples of a channel are spread over the data records:
+    the ranges of a block of records are fetched together.
+    """
+    records: int = _check_records(header)
+    samples_per_record: int = int(header["samples"][idx])
+    records_per_chunk: int = max(chunk_samples // max(samples_per_record, 1), 1)
+
+    with open_func() as f:
+        for first in range(0, records, records_per_chunk):
+            ranges = _channel_ranges(
+                header, idx, first, min(first + records_per_chunk, records)
+            )
+            with metrics.span("edf.decode_stream"):
+                digital: np.array = np.frombuffer(_read_ranges(f, ranges), dtype="<i2")
+                chunk: np.array = _to_physical(header, idx, digital, dtype)
+            metrics.count("edf.samples_decoded", chunk.size)
+            yield chunk
+
+
+def read_signal_from_file(
+    open_func: Callable[[], BinaryIO],
+    header: Dict[str, Any],
+    idx: int,
+    dtype: np.dtype = np.float32,
+) -> np.array:
+    """
+    Reads channel `idx` of an EDF file opened by `open_func` (see iter_signal_chunks_from_file).
+    """
+    signal = np.empty(header["records"] * int(header["samples"][idx]), dtype=dtype)
+    start: int = 0
+    for chunk in iter_signal_chunks_from_file(open_func, header, idx, dtype):
+        signal[start : start + chunk.size] = chunk
+        start += chunk.size
+    return signal
+
+
+# Bytes of data records decoded at a time when an EDF file is streamed in one pass
+RECORD_BLOCK_BYTES: int = 8 << 20
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    """
+    Reads `size` bytes from the current position (fewer at the end of the file).
+    Remote SFTP files are read one request at a time, since paramiko reads large pieces
+    in quadratic time.
+    """
+    piece: int = getattr(f, "MAX_REQUEST_SIZE", size) or 1
+    data: List[bytes] = []
+    while size > 0:
+        chunk: bytes = f.read(min(piece, size))
+        if not chunk:
+            break
+        data.append(chunk)
+        size -= len(chunk)
+    return b"".join(data)
+
+
+class EDFRecordStream:
+    """
+    Reads the data records of an EDF file from start to end, in blocks of about
+    RECORD_BLOCK_BYTES, and decodes the requested channels of every block. Converting all
+    the channels of a remote file in one sequential pass avoids fetching the scattered
+    samples of each channel, which costs one SFTP request per data record and channel:
+    remote files are prefetched as when they are downloaded.
+
+    Args:
+    open_func (Callable[[], BinaryIO]): Opens the EDF file in binary mode.
+    header (Dict[str, Any]): Header of the file (see read_header_from_file).
+    dtype (np.dtype): Type of the decoded samples.
+    """
+
+    def __init__(
+        self,
+        open_func: Callable[[], BinaryIO],
+        header: Dict[str, Any],
+        dtype: np.dtype = np.float32,
+    ):
+        self.open_func = open_func
+        self.header = header
+        self.dtype = np.dtype(dtype)
+
+    def iter_blocks(
+        self, channels: List[int], block_bytes: Optional[int] = None
+    ) -> Iterator[List[np.array]]:
+        """
+        Yields, for each block of data records, the decoded samples of every channel of
+        `channels` (in the same order).
+        """
+        header: Dict[str, Any] = self.header
+        records: int = _check_records(header)
+        samples: np.array = np.asarray(header["samples"]).astype(int)
+        record_bytes: int = int(samples.sum()) * 2
+        starts: np.array = np.concatenate([[0], np.cumsum(samples)[:-1]])
+        records_per_block: int = max(
+            (block_bytes or RECORD_BLOCK_BYTES) // record_bytes, 1
+        )
+
+        with self.open_func() as f:
+            if hasattr(f, "prefetch"):
+                f.prefetch()
+            f.seek(header["bytes"])
+            for first in range(0, records, records_per_block):
+                n_records: int = min(records_per_block, records - first)
+                with metrics.span("edf.decode_stream"):
+                    raw: bytes = _read_exact(f, n_records * record_bytes)
+                    if len(raw) != n_records * record_bytes:
+                        raise ValueError(
+                            f"Truncated EDF file: data record {first + n_records} is missing"
+                        )
+                    digital: np.array = np.frombuffer(raw, dtype="<i2").reshape(
+                        n_records, record_bytes // 2
+                    )
+                    block: List[np.array] = [
+                        _to_physical(
+                            header,
+                            idx,
+                            digital[
+                                :, starts[idx] : starts[idx] + samples[idx]
+                            ].ravel(),
+                            self.dtype,
+                        )
+                        for idx in channels
+                    ]
+                metrics.count("edf.samples_decoded", sum(chunk.size for chunk in block))
+                yield block
+
+
+def parse_start_datetime(header: Dict[str, Any]) -> datetime:
+    """
+    Returns the start datetime of an EDF header. The separators of the date and time
+    fields may be any character, as some exports use 'hh:mm:ss' or 'dd/mm/yy'.
+    """
+    date_fields: List[str] = [
+        re.sub(r"\D", ".", header[name].strip()) for name in ("startdate", "starttime")
+    ]
+    return datetime.strptime("-".join(date_fields), "%d.%m.%y-%H.%M.%S")
+
+
+def parse_tal(data: bytes) -> List[List[Any]]:
+    """
+    Parses the Time-stamped Annotations Lists of an EDF+ annotation channel.
+    Returns [onset, duration, description] lists, like pyedflib's readAnnotations
+    (duration -1 when not given), without the time-keeping annotations of the records.
+    """
+    annotations: List[List[Any]] = []
+    for tal in data.split(b"\x00"):
+        parts: List[bytes] = tal.split(b"\x14")
+        if len(parts) < 2:
+            continue
+        timing: List[bytes] = parts[0].split(b"\x15")
+        onset: float = float(timing[0])
+        duration: float = float(timing[1]) if len(timing) > 1 and timing[1] else -1.0
+        for description in parts[1:]:
+            if description:
+                annotations.append(
+                    [onset, duration, description.decode("utf-8", errors="replace")]
+                )
+    return annotations
+
+
+def read_edf_export_stream(
+    edf_path: Any,
+    ch_names: Optional[List[str]] = None,
+    annotations: bool = False,
+    dtype: np.dtype = np.float32,
+    records: Optional[int] = None,
+) -> Tuple[List[Callable[[], np.array]], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Reads an EDF file from any path object with an `open` method, such as the remote
+    files of an SFTPPath, by decoding the data records with numpy: pyedflib and MNE
+    need a local file. Also reads the local files pyedflib rejects, `records` replacing
+    the number of data records of a header that gives a wrong one.
+    Returns:
+        - list of lazy signal loader functions,
+        - list of signal headers,
+        - global EDF header with optional annotations (metadata)
+    """
+    open_func: Callable[[], BinaryIO] = partial(edf_path.open, "rb")
+    with metrics.span("edf.open_stream"), open_func() as f:
+        header: Dict[str, Any] = read_header_from_file(f)
+        if records is not None:
+            header["records"] = records
+        if annotations and "EDF Annotations" in header["label"]:
+            annot_idx: int = header["label"].index("EDF Annotations")
+            tal_data: bytes = _read_ranges(
+                f, _channel_ranges(header, annot_idx, 0, header["records"])
+            )
+            header["annotations"] = parse_tal(tal_data)
+        elif annotations:
+            header["annotations"] = []
+    # Same start datetime as the pyedflib header
+    header["startdate"] = parse_start_datetime(header)
+
+    if ch_names is None:
+        ch_idx = [
+            i for i, label in enumerate(header["label"]) if label != "EDF Annotations"
+        ]
+    else:
+        ch_idx = [header["label"].index(ch_name) for ch_name in ch_names]
+
+    record_stream = EDFRecordStream(open_func, header, dtype)
+    signal_headers: List[Dict[str, Any]] = []
+    s_load_funcs: List = []
+    for i in ch_idx:
+        signal_headers.append(
+            {
+                "sample_frequency": header["samples"][i] / header["duration"],
+                "label": header["label"][i],
+                "dimension": header["units"][i],
+                "prefilter": header["prefilter"][i],
+                "transducer": header["transducer"][i],
+            }
+        )
+        s_func = partial(
+            read_signal_from_file,
+            open_func=open_func,
+            header=header,
+            idx=i,
+            dtype=dtype,
+        )
+        iter_func = partial(
+            iter_signal_chunks_from_file,
+            open_func=open_func,
+            header=header,
+            idx=i,
+            dtype=dtype,
+        )
+        n_samples: int = header["records"] * int(header["samples"][i])
+        s_load_funcs.append(
+            SignalLoader(
+                s_func,
+                n_samples,
+                dtype,
+                iter_func=iter_func,
+                record_stream=record_stream,
+                channel=i,
+            )
+        )
 
     return s_load_funcs, signal_headers, header
@@ -0,0 +1,242 @@
+import io
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from sleeplab_converter.edf import (
+    read_edf_export,
+    read_edf_export_mne,
+    parse_start_datetime,
+    read_edf_export_stream,
+    read_header_from_file,
+)
+
+logger = logging.getLogger(__name__)
+
+# EDF readers, from the preferred to the last resort: pyedflib for the files that follow
+# the EDF(+) specification, the numpy reader of read_edf_export_stream for the files
+# pyedflib rejects, and MNE for the headers the numpy reader cannot decode either
+PYEDFLIB: str = "pyedflib"
+NATIVE: str = "native"
+MNE: str = "mne"
+EDF_READERS: Tuple[str, ...] = (PYEDFLIB, NATIVE, MNE)
+
+# Per-signal header fields after the label, with their size in bytes, in file order
+SIGNAL_FIELDS: List[Tuple[str, int]] = [
+    ("label", 16),
+    ("transducer", 80),
+    ("units", 8),
+    ("physical_min", 8),
+    ("physical_max", 8),
+    ("digital_min", 8),
+    ("digital_max", 8),
+    ("prefilter", 80),
+    ("samples", 8),
+    ("reserved", 32),
+]
+
+DATE_PATTERN = re.compile(rb"\d\d\.\d\d\.\d\d")
+INTEGER_PATTERN = re.compile(rb"[+-]?\d+ *")
+NUMBER_PATTERN = re.compile(rb"[+-]?(\d+(\.\d*)?|\.\d+) *")
+
+
+class EDFCompatibility(NamedTuple):
+    """
+    Reader chosen for an EDF file, with the first reason pyedflib would reject it ("" if
+    it would not) and the number of complete data records in the file when its header
+    gives a wrong one (-1, or more records than the file holds).
+    """
+
+    reader: str
+    reason: str = ""
+    records: Optional[int] = None
+
+
+def read_raw_header(f: BinaryIO) -> bytes:
+    """
+    Reads the header of an EDF file, fixed part and signal part. Only the fixed part is
+    returned when the number of signals cannot be read.
+    """
+    fixed_header: bytes = f.read(256)
+    try:
+        n_signals: int = int(fixed_header[252:256])
+    except ValueError:
+        return fixed_header
+    return fixed_header + f.read(256 * max(n_signals, 0))
+
+
+def _signal_fields(raw: bytes, n_signals: int) -> Dict[str, List[bytes]]:
+    """
+    Splits the signal part of a raw EDF header into its fields: {name: [value per signal]}.
+    """
+    fields: Dict[str, List[bytes]] = {}
+    offset: int = 256
+    for name, size in SIGNAL_FIELDS:
+        fields[name] = [
+            raw[offset + i * size : offset + (i + 1) * size] for i in range(n_signals)
+        ]
+        offset += size * n_signals
+    return fields
+
+
+def pyedflib_incompatibility(
+    raw: bytes, header: Dict[str, Any], available_records: int
+) -> str:
+    """
+    Returns the first reason for pyedflib (EDFlib) to reject an EDF file with this
+    header, or "" if it can open it. Follows the checks of EDFlib that the MARS exports
+    fail: non-ASCII characters, dates with ':' or '/', EDF+D files, EDF+ patient and
+    recording fields in free text, wrong header size or number of data records, and
+    numbers or signal ranges out of the specification.
+    """
+    if raw[:8] != b"0       ":
+        return "version is not 0"
+    if any(byte < 32 or byte > 126 for byte in raw):
+        return "non-ASCII characters in the header"
+    if not DATE_PATTERN.fullmatch(raw[168:176]):
+        return "start date is not dd.mm.yy"
+    if not DATE_PATTERN.fullmatch(raw[176:184]):
+        return "start time is not hh.mm.ss"
+    if header["bytes"] != len(raw):
+        return "wrong header size"
+
+    reserved: str = header["reserved"]
+    if reserved.startswith("EDF+D"):
+        return "discontinuous EDF+D file"
+    if reserved.startswith("EDF+C"):
+        if len(header["patientID"].split()) < 4:
+            return "EDF+ patient field is not 'code sex birthdate name'"
+        if not header["recordID"].startswith("Startdate "):
+            return "EDF+ recording field does not start with 'Startdate'"
+
+    if not 1 <= header["records"] <= available_records:
+        return f"{header['records']} data records in the header, {available_records} in the file"
+    if not NUMBER_PATTERN.fullmatch(raw[244:252]):
+        return "record duration is not a number"
+
+    fields: Dict[str, List[bytes]] = _signal_fields(raw, header["ns"])
+    for name in ("physical_min", "physical_max"):
+        if not all(NUMBER_PATTERN.fullmatch(value) for value in fields[name]):
+            return f"{name} is not a number"
+    for name in ("digital_min", "digital_max", "samples"):
+        if not all(INTEGER_PATTERN.fullmatch(value) for value in fields[name]):
+            return f"{name} is not an integer"
+    if np.any(header["digital_min"] < -32768) or np.any(header["digital_max"] > 32767):
+        return "digital range is not 16-bit"
+    if np.any(header["samples"] < 1):
+        return "signal without samples"
+    return ""
+
+
+def check_edf_header(raw: bytes, file_size: int) -> EDFCompatibility:
+    """
+    Chooses the reader of an EDF file from its raw header (see read_raw_header) and size.
+    """
+    try:
+        header: Dict[str, Any] = read_header_from_file(io.BytesIO(raw))
+        parse_start_datetime(header)
+    except (ValueError, IndexError) as e:
+        return EDFCompatibility(MNE, f"header not readable ({e})")
+
+    if np.any(header["digital_min"] >= header["digital_max"]) or np.any(
+        header["physical_min"] == header["physical_max"]
+    ):
+        return EDFCompatibility(MNE, "empty digital or physical range")
+    record_bytes: int = int(np.sum(header["samples"])) * 2
+    if record_bytes <= 0:
+        return EDFCompatibility(MNE, "data records without samples")
+
+    available_records: int = max(file_size - header["bytes"], 0) // record_bytes
+    records: Optional[int] = None
+    if not 0 <= header["records"] <= available_records:
+        records = available_records
+
+    reason: str = pyedflib_incompatibility(raw, header, available_records)
+    return EDFCompatibility(NATIVE if reason else PYEDFLIB, reason, records)
+
+
+# Decision per EDF file, by (path, size, modification time): the annotations and the
+# signals of a recording are read separately
+_DECISIONS: Dict[Tuple[str, int, int], EDFCompatibility] = {}
+_DECISIONS_LOCK = threading.Lock()
+
+
+def _decision_key(edf_path: Path) -> Tuple[str, int, int]:
+    stat = edf_path.stat()
+    return str(edf_path), stat.st_size, stat.st_mtime_ns
+
+
+def classify_edf(edf_path: Path) -> EDFCompatibility:
+    """
+    Chooses the reader of a local EDF file from its header, once per file.
+    """
+    key: Tuple[str, int, int] = _decision_key(edf_path)
+    with _DECISIONS_LOCK:
+        decision: Optional[EDFCompatibility] = _DECISIONS.get(key)
+    if decision is not None:
+        return decision
+
+    with open(edf_path, "rb") as f:
+        decision = check_edf_header(read_raw_header(f), key[1])
+    if decision.reader != PYEDFLIB:
+        logger.info(
+            f"[EDF] {edf_path.name}: {decision.reason}, read with the {decision.reader} reader"
+        )
+    with _DECISIONS_LOCK:
+        _DECISIONS[key] = decision
+    return decision
+
+
+def read_edf_auto(
+    edf_path: Path,
+    annotations: bool = False,
+    dtype: np.dtype = np.float32,
+) -> Tuple[str, List[Callable[[], np.array]], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Reads a local EDF file with the reader chosen by classify_edf. A file that pyedflib
+    rejects despite its header is read with the native reader, and a file the native
+    reader fails to read with MNE; the reader that worked is remembered.
+    Returns the reader used, then the loaders, signal headers and header of the reader.
+    """
+    decision: EDFCompatibility = classify_edf(edf_path)
+    if decision.reader == PYEDFLIB:
+        try:
+            return (
+                PYEDFLIB,
+                *read_edf_export(edf_path, annotations=annotations, dtype=dtype),
+            )
+        except OSError as e:
+            logger.warning(
+                f"[EDF] pyedflib rejected {edf_path.name} ({e}), read with the native reader"
+            )
+            decision = decision._replace(reader=NATIVE, reason=str(e))
+            with _DECISIONS_LOCK:
+                _DECISIONS[_decision_key(edf_path)] = decision
+
+    if decision.reader == NATIVE:
+        try:
+            return (
+                NATIVE,
+                *read_edf_export_stream(
+                    edf_path,
+                    annotations=annotations,
+                    dtype=dtype,
+                    records=decision.records,
+                ),
+            )
+        except (OSError, ValueError, IndexError) as e:
+            logger.warning(
+                f"[EDF] Native reader failed on {edf_path.name} ({e}), read with MNE"
+            )
+            decision = decision._replace(reader=MNE, reason=str(e))
+            with _DECISIONS_LOCK:
+                _DECISIONS[_decision_key(edf_path)] = decision
+
+    return (
+        MNE,
+        *read_edf_export_mne(str(edf_path), annotations=annotations, dtype=dtype),
+    )
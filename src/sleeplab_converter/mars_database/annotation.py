@@ -1,3 +1,4 @@
+import io
 import re
 from datetime import datetime
 from datetime import timedelta
@@ -8,7 +9,9 @@ import numpy as np
 import pandas as pd
 from striprtf.striprtf import rtf_to_text
 
-from sleeplab_converter.edf import read_edf_export
+from indicator_pipeline import metrics
+from sleeplab_converter.edf import read_edf_export_stream
+from sleeplab_converter.edf_compat import read_edf_auto
 
 # Here I have fixed many inconsistency in sleep staging, but the timestamps still correspond to real time and cannot be used to map annotations to discontinous signals
 
@@ -156,19 +159,19 @@ def annotation_deltamed(path: Path, patient: str, edf_name: str) -> pd.DataFrame
     Returns the combined annotations with unified time, duration, and label format.
     """
     txt_path: Path = path / patient / f"{edf_name}.txt"
+    # The file is read once and parsed from memory, as it may be a remote SFTP file
+    with txt_path.open("r", encoding="latin1") as file:
+        txt_content: str = file.read()
     txt_events_df: pd.DataFrame = pd.read_table(
-        txt_path,
+        io.StringIO(txt_content),
         skiprows=5,
         sep="\t",
-        encoding="latin1",
         index_col=False,
         names=["Start_time_real", "Event_label"],
     )
 
     # find start date of annotations
-    with txt_path.open("r", encoding="latin1") as file:
-        sample_text: List[str] = file.readlines()
-        file.close()
+    sample_text: List[str] = io.StringIO(txt_content).readlines()
     start_date_str: str = sample_text[2].strip()
     start_datetime_dt: datetime = datetime.strptime(
         f"{start_date_str}-{txt_events_df.iloc[0]['Start_time_real']}",
@@ -321,8 +324,8 @@ def annotation_remlogic(txt_path: Path) -> pd.DataFrame:
     ]
 
     with txt_path.open("r", encoding="latin1") as file:
-        sample_text: List[str] = file.readlines()
-        file.close()
+        txt_content: str = file.read()
+    sample_text: List[str] = io.StringIO(txt_content).readlines()
     start_date_str: str = sample_text[3].split(":")[-1].split()[0]
 
     header_formats: Dict[str, str] = {
@@ -367,9 +370,8 @@ def annotation_remlogic(txt_path: Path) -> pd.DataFrame:
     }
 
     txt_events_df = pd.read_table(
-        txt_path,
+        io.StringIO(txt_content),
         sep="\t",
-        encoding="latin1",
         skiprows=rows_to_skip,
         on_bad_lines="warn",
         names=columns_by_format[format_type],
@@ -411,7 +413,8 @@ def annotation_csv(path: Path, patient: str, edf_name: str) -> pd.DataFrame:
     Return the annotations with time, duration, and label, ready for Sleeplab format.
     """
     csv_path: Path = path / patient / f"{edf_name}.csv"
-    data_csv: pd.DataFrame = pd.read_csv(csv_path, encoding="UTF-16", delimiter="\t")
+    with csv_path.open("r", encoding="UTF-16") as csv_file:
+        data_csv: pd.DataFrame = pd.read_csv(csv_file, delimiter="\t")
 
     # Parse start date and time in to one column of datetime
     start_dt: List[datetime] = []
@@ -453,7 +456,11 @@ def annotation_csv(path: Path, patient: str, edf_name: str) -> pd.DataFrame:
     # Parse sleep stages from edf+ header
     edf_path: Path = path / patient / f"{edf_name}.edf"
     try:
-        header = read_edf_export(edf_path, annotations=True)[-1]
+        # Remote files (SFTPPath) are decoded from the stream, pyedflib needs a local file
+        if isinstance(edf_path, Path):
+            header = read_edf_auto(edf_path, annotations=True)[-1]
+        else:
+            header = read_edf_export_stream(edf_path, annotations=True)[-1]
         st_rec: datetime = header["startdate"]
         keys: List[str] = [
             "Validated",
@@ -508,7 +515,8 @@ def load_annotation(
     # First check if .rtf file exists - this is the most common recording type and .rtf should always exist
     rtf_path: Path = path / patient / f"{edf_name}.rtf"
     if rtf_path.is_file():
-        data = annotation_deltamed(path, patient, edf_name)
+        with metrics.span("annotation.deltamed"):
+            data = annotation_deltamed(path, patient, edf_name)
         recording_type: str = "Deltamed"
     else:
         txt_path: Path = path / patient / f"{edf_name}.txt"
@@ -518,7 +526,8 @@ def load_annotation(
                 txt_file.close()
             if "RemLogic" in str(sample_text):
                 try:
-                    data = annotation_remlogic(txt_path)
+                    with metrics.span("annotation.remlogic"):
+                        data = annotation_remlogic(txt_path)
                 except ValueError as e:
                     print(f"[ERREUR] Impossible de parser le fichier : {e}")
                     data = None
@@ -530,7 +539,8 @@ def load_annotation(
             # Check for .csv annotations
             report_path: Path = path / patient / f"{edf_name}.csv"
             if report_path.is_file():
-                data = annotation_csv(path, patient, edf_name)
+                with metrics.span("annotation.brainrt"):
+                    data = annotation_csv(path, patient, edf_name)
                 recording_type = "BrainRT"
             else:
                 recording_type = "Unknown"
@@ -1,22 +1,40 @@
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
 from sleeplab_format import writer, models
 from sleeplab_format.models import SampleArray
 
+from indicator_pipeline import metrics, profiling
+from indicator_pipeline.memory import MemoryBudget, RSSSampler
 from indicator_pipeline.utils import extract_subject_id_from_filename
-from sleeplab_converter.edf import read_edf_export, read_edf_export_mne
+from sleeplab_converter.array_writer import (
+    STREAMED_FORMATS,
+    ZARR_CHUNK_BYTES,
+    write_subject,
+)
+from sleeplab_converter.edf import (
+    DECODE_CHUNK_SAMPLES,
+    RECORD_BLOCK_BYTES,
+    read_edf_export_stream,
+)
+from sleeplab_converter.edf_compat import EDF_READERS, NATIVE, read_edf_auto
 from sleeplab_converter.events_mapping import STAGE_MAPPING, AASM_EVENT_MAPPING
 from sleeplab_converter.mars_database import annotation
 
 logger = logging.getLogger(__name__)
 
+# Series converted at the same time append to the same error count file
+_ERROR_COUNTS_LOCK = threading.Lock()
+
 
 def parse_sample_arrays(
     s_load_funcs: List[Callable[[], np.array]],
@@ -229,6 +247,174 @@ def parse_annotations(header: Dict[str, Any], edf_path: Path, edf_name: str) ->
     )
 
 
+def estimate_subject_bytes(subject: models.Subject, array_format: str = "numpy") -> int:
+    """
+    Estimates the memory needed to write a subject from the EDF header.
+    With the numpy and zarr formats, EDF channels are streamed in blocks of
+    ZARR_CHUNK_BYTES (float64 decoding buffer, float32 block and compressed block),
+    whatever their length. Otherwise channels are decoded one at a time, so the
+    largest one dominates, and the parquet writer holds a second copy of it.
+    Channels read from the SFTP server are decoded together, one block of
+    RECORD_BLOCK_BYTES at a time, with a chunk buffer per channel.
+    """
+    loaders = [sarr.values_func for sarr in (subject.sample_arrays or {}).values()]
+    if array_format in STREAMED_FORMATS and all(
+        getattr(loader, "record_stream", None) is not None for loader in loaders
+    ):
+        return 3 * RECORD_BLOCK_BYTES + len(loaders) * ZARR_CHUNK_BYTES
+    if array_format in STREAMED_FORMATS and all(
+        hasattr(loader, "iter_chunks") for loader in loaders
+    ):
+        return 4 * ZARR_CHUNK_BYTES
+    largest: int = max((getattr(loader, "nbytes", 0) for loader in loaders), default=0)
+    return largest * 2 + DECODE_CHUNK_SAMPLES * 8
+
+
+def estimate_subject_cost(subject: models.Subject) -> int:
+    """
+    Estimates the work of writing a subject as the decoded size of its channels, from
+    the EDF header. Unlike its memory, which is bounded for streamed formats, it grows
+    with the length of the recording.
+    """
+    return sum(
+        getattr(sarr.values_func, "nbytes", 0)
+        for sarr in (subject.sample_arrays or {}).values()
+    )
+
+
+@contextmanager
+def subject_stage(subject_id: str, span_name: str) -> Iterator[None]:
+    """
+    Attributes the enclosed block to a subject in the run metrics (and in the profiler
+    when --profile is set) and times it as `span_name`.
+    """
+    with metrics.recording(subject_id), profiling.profile(subject_id):
+        with metrics.span(span_name):
+            yield
+
+
+def write_subject_bounded(
+    subject: models.Subject,
+    subject_path: Path,
+    budget: MemoryBudget,
+    sampler: RSSSampler,
+    array_format: str,
+    clevel: int,
+    annotation_format: str,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+    worker_slots: Optional[threading.Semaphore] = None,
+) -> None:
+    """
+    Writes one subject once its estimated memory fits in the budget (and a slot of
+    `worker_slots`, shared by the series converted at the same time, is free), and
+    records its peak RSS. Errors are logged and the subject is skipped.
+    """
+    subject_id: str = getattr(subject.metadata, "subject_id", "UNKNOWN")
+    estimated: int = estimate_subject_bytes(subject, array_format)
+    slot = worker_slots if worker_slots is not None else nullcontext()
+    try:
+        with slot, budget.reserve(estimated), sampler.window() as window:
+            with subject_stage(subject_id, "slf.write_subject"):
+                logger.info(f"Writing subject ID {subject_id}...")
+                write_subject(
+                    subject,
+                    subject_path,
+                    annotation_format=annotation_format,
+                    array_format=array_format,
+                    compression_level=clevel,
+                    zarr_codec=zarr_codec,
+                    zarr_shuffle=zarr_shuffle,
+                )
+    except Exception as e:
+        logger.error(f"[SKIP SUBJECT] Unable to write the subject {subject_id}")
+        logger.error(f"Cause : {e}")
+        return
+
+    if window.peak_bytes is not None:
+        with metrics.recording(subject_id):
+            metrics.gauge("memory.peak_rss_bytes", window.peak_bytes)
+            metrics.gauge("memory.estimated_bytes", estimated)
+        logger.info(
+            f"[MEMORY] {subject_id}: peak RSS {window.peak_bytes / 1024 ** 2:.0f} MiB "
+            f"(estimated {estimated / 1024 ** 2:.0f} MiB)"
+        )
+
+
+def write_dataset(
+    dataset: models.Dataset,
+    output_dir: Path,
+    array_format: str = "numpy",
+    clevel: int = 7,
+    annotation_format: str = "json",
+    workers: int = 1,
+    memory_budget_mb: Optional[int] = None,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+    budget: Optional[MemoryBudget] = None,
+    worker_slots: Optional[threading.Semaphore] = None,
+) -> None:
+    """
+    Writes a dataset in sleeplab format, like sleeplab_format.writer.write_dataset, but
+    with up to `workers` subjects written at the same time while their estimated memory
+    stays within `memory_budget_mb`. zarr arrays are compressed with `zarr_codec` and
+    `zarr_shuffle` (see array_writer.get_zarr_codecs).
+    When several datasets are written at the same time, they can share a memory `budget`
+    and `worker_slots` capping the subjects written at once over all of them.
+    """
+    dataset_path: Path = output_dir / dataset.name
+    logger.info(f"Creating dataset dir {dataset_path}...")
+    dataset_path.mkdir(parents=True, exist_ok=True)
+
+    dataset.version = writer.SLEEPLAB_FORMAT_VERSION
+    (dataset_path / "metadata.json").write_text(
+        dataset.model_dump_json(exclude={"series"}, indent=writer.JSON_INDENT),
+        encoding="utf-8",
+    )
+
+    if budget is None:
+        budget = MemoryBudget(
+            memory_budget_mb * 1024**2 if memory_budget_mb is not None else None
+        )
+    with RSSSampler() as sampler:
+        for name, series in dataset.series.items():
+            logger.info(f"Writing data for series {name}...")
+            series_path: Path = dataset_path / name
+            series_path.mkdir(exist_ok=True)
+
+            # Largest recordings first (longest-processing-time rule), so that a long
+            # recording does not end the run alone and small ones fill the budget left over
+            subjects: List[models.Subject] = sorted(
+                series.subjects.values(),
+                key=lambda subject: (
+                    estimate_subject_cost(subject),
+                    estimate_subject_bytes(subject, array_format),
+                ),
+                reverse=True,
+            )
+            with ThreadPoolExecutor(
+                max_workers=max(workers, 1), thread_name_prefix=f"slf-writer-{name}"
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        write_subject_bounded,
+                        subject,
+                        series_path / subject.metadata.subject_id,
+                        budget,
+                        sampler,
+                        array_format,
+                        clevel,
+                        annotation_format,
+                        zarr_codec,
+                        zarr_shuffle,
+                        worker_slots,
+                    )
+                    for subject in subjects
+                ]
+                for future in futures:
+                    future.result()
+
+
 def convert_dataset(
     input_dir: Path,
     output_dir: Path,
@@ -237,26 +423,21 @@ def convert_dataset(
     array_format: str = "numpy",
     clevel: int = 7,
     annotation_format: str = "json",
+    workers: int = 1,
+    memory_budget_mb: Optional[int] = None,
+    zarr_codec: str = "zstd",
+    zarr_shuffle: str = "none",
+    budget: Optional[MemoryBudget] = None,
+    worker_slots: Optional[threading.Semaphore] = None,
 ) -> None:
     """
-    Converts a dataset from a source directory to sleeplab format and structure in a destination directory.
+    Converts a dataset from a source directory (local, or an SFTPPath to read the recordings
+    from the SFTP server) to sleeplab format and structure in a destination directory.
     It processes multiple data series (years), logs any conversion errors.
-    Saves slf files in the output directory.
+    Saves slf files in the output directory, writing up to `workers` subjects in parallel
+    within `memory_budget_mb` (estimated from the EDF headers), or within the `budget` and
+    `worker_slots` shared with the other series converted at the same time.
     """
-
-    original_write_subject = writer.write_subject
-
-    def safe_write_subject(subject, subject_path, *args, **kwargs):
-        try:
-            return original_write_subject(subject, subject_path, *args, **kwargs)
-        except Exception as e:
-            subject_id = getattr(subject.metadata, "subject_id", "UNKNOWN")
-            logger.error(f"[SKIP SUBJECT] Unable to write the subject {subject_id}")
-            logger.error(f"Cause : {e}")
-            return None
-
-    writer.write_subject = safe_write_subject
-
     series_dict: Dict = {}
     all_error_counts: Dict = {}
 
@@ -271,34 +452,45 @@ def convert_dataset(
 
     error_count_path: Path = output_dir / "conversion_error_counts.json"
     logger.info(f"Writing error counts to {error_count_path}")
-    with open(error_count_path, "a+") as f:
+    with _ERROR_COUNTS_LOCK, open(error_count_path, "a+") as f:
         json.dump(all_error_counts, f, indent=4)
 
     dataset = models.Dataset(name=ds_name, series=series_dict)
     logger.info(f"Start writing the data to {output_dir}...")
 
-    writer.write_dataset(
+    write_dataset(
         dataset,
-        basedir=str(output_dir),
-        annotation_format=annotation_format,
+        output_dir,
         array_format=array_format,
-        compression_level=clevel,
+        clevel=clevel,
+        annotation_format=annotation_format,
+        workers=workers,
+        memory_budget_mb=memory_budget_mb,
+        zarr_codec=zarr_codec,
+        zarr_shuffle=zarr_shuffle,
+        budget=budget,
+        worker_slots=worker_slots,
     )
 
 
 def parse_edf(_edf_path: Path) -> Tuple[datetime, Dict, Dict[str, Any]]:
     """
-    Parses EDF signals using pyEDFlib or MNE depending on compatibility.
-    Returns the start time, signal data, and header.
+    Parses EDF signals with the reader chosen from the header of the file (pyEDFlib,
+    native or MNE, see classify_edf), or straight from the stream for remote files
+    (SFTPPath), as pyEDFlib and MNE need a local file.
+    Returns the start time, signal data, and header (with the reader used in "edf_reader").
     """
-    try:
-        sig_load_funcs, sig_headers, header = read_edf_export(
+    if not isinstance(_edf_path, Path):
+        reader: str = NATIVE
+        sig_load_funcs, sig_headers, header = read_edf_export_stream(
             _edf_path, annotations=False
         )
-    except:
-        sig_load_funcs, sig_headers, header = read_edf_export_mne(
-            str(_edf_path), annotations=False
+    else:
+        reader, sig_load_funcs, sig_headers, header = read_edf_auto(
+            _edf_path, annotations=False
         )
+    metrics.count(f"edf.reader.{reader}")
+    header["edf_reader"] = reader
     start_ts, sample_arrays = parse_sample_arrays(sig_load_funcs, sig_headers, header)
 
     return start_ts, sample_arrays, header
@@ -319,6 +511,8 @@ def read_series(
         "edf_reader_not_working": 0,
         "annot_parse_error": 0,
     }
+    # Recordings read by each EDF reader, for the run report
+    edf_readers: Dict[str, int] = dict.fromkeys(EDF_READERS, 0)
 
     for edf_path in input_dir_series.iterdir():
         edf_list: List[Path] = list(edf_path.glob("*.edf"))
@@ -336,8 +530,11 @@ def read_series(
             ):  # edf needs to be PSG recording (12 and 13 are MSLT and MWT recordings)
                 continue
 
+            subject_id: str = extract_subject_id_from_filename(edf_file)
+
             try:  # Read signals from edf files
-                start_ts, sample_arrays, header = parse_edf(edf_file)
+                with subject_stage(subject_id, "edf.parse"):
+                    start_ts, sample_arrays, header = parse_edf(edf_file)
             except Exception as e:
                 logger.warning(
                     f"[SKIP] Skipping subject {edf_path.stem} and file {edf_file} due to error in EDF parsing:"
@@ -345,17 +542,19 @@ def read_series(
                 logger.warning(e)
                 error_counts["edf_reader_not_working"] += 1
                 continue
+            edf_readers[header["edf_reader"]] += 1
             try:  # Read annotations that correspond to edf filename (will fail if files are not correctly named or don't follow the normal structure)
-                (
-                    events,
-                    aasm_sleep_stages,
-                    aasm_events,
-                    analysis_start,
-                    analysis_end,
-                    lights_off,
-                    lights_on,
-                    recording_type,
-                ) = parse_annotations(header, edf_path, edf_name=edf_file.stem)
+                with subject_stage(subject_id, "annotation.parse"):
+                    (
+                        events,
+                        aasm_sleep_stages,
+                        aasm_events,
+                        analysis_start,
+                        analysis_end,
+                        lights_off,
+                        lights_on,
+                        recording_type,
+                    ) = parse_annotations(header, edf_path, edf_name=edf_file.stem)
                 if not events:
                     error_counts["annot_parse_error"] += 1
                     logger.warning(
@@ -385,8 +584,6 @@ def read_series(
                     ),
                 }
 
-            subject_id: str = extract_subject_id_from_filename(edf_file)
-
             metadata = models.SubjectMetadata(
                 subject_id=subject_id,
                 recording_start_ts=start_ts,
@@ -401,6 +598,10 @@ def read_series(
                 metadata=metadata, sample_arrays=sample_arrays, annotations=annotations
             )
 
+    logger.info(
+        f"[EDF] Series {series_name}: EDF files read with "
+        + ", ".join(f"{reader}: {n}" for reader, n in edf_readers.items())
+    )
     series = models.Series(name=series_name, subjects=subjects)
 
     return series, error_counts
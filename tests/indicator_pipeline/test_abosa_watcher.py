@@ -0,0 +1,71 @@
+import os
+import zipfile
+
+from indicator_pipeline import abosa_watcher
+from indicator_pipeline.abosa_watcher import WorkbookWatcher, watch_abosa_output
+
+
+def write_workbook(folder, complete=True):
+    folder.mkdir(parents=True, exist_ok=True)
+    workbook = folder / "ParameterValues.xlsx"
+    if complete:
+        with zipfile.ZipFile(workbook, "w") as archive:
+            archive.writestr("xl/workbook.xml", "<workbook/>")
+    else:
+        workbook.write_bytes(b"PK\x03\x04 partial")
+    return workbook
+
+
+def test_reports_workbooks_once_settled_and_complete(tmp_path):
+    old = write_workbook(tmp_path / "2024" / "ParameterValues_1")
+    os.utime(old, (1000, 1000))
+    new = write_workbook(tmp_path / "2024" / "ParameterValues_2", complete=False)
+    os.utime(new, (1100, 1100))
+    watcher = WorkbookWatcher(tmp_path, settle_s=60)
+
+    assert watcher.poll(now=1120) == [old.parent]
+
+    # Still being written: a change restarts the debounce
+    write_workbook(new.parent)
+    os.utime(new, (1130, 1130))
+    assert watcher.poll(now=1150) == [old.parent]
+    assert watcher.poll(now=1200) == [old.parent]
+    assert watcher.poll(now=1220) == [old.parent, new.parent]
+
+    watcher.mark_imported([old.parent, new.parent])
+    assert watcher.poll(now=1300) == []
+    assert watcher.waiting() == []
+
+
+def test_skips_workbook_open_in_excel(tmp_path):
+    workbook = write_workbook(tmp_path / "2024" / "ParameterValues_1")
+    os.utime(workbook, (1000, 1000))
+    lock = workbook.parent / "~$ParameterValues.xlsx"
+    lock.write_bytes(b"")
+    watcher = WorkbookWatcher(tmp_path, settle_s=60)
+
+    assert watcher.poll(now=2000) == []
+
+    lock.unlink()
+    assert watcher.poll(now=2000) == [workbook.parent]
+
+
+def test_watch_stops_once_every_slf_is_imported(tmp_path, monkeypatch):
+    workbook = write_workbook(tmp_path / "2024" / "ParameterValues_1")
+    os.utime(workbook, (1000, 1000))
+    monkeypatch.setenv("ABOSA_OUTPUT_PATH", str(tmp_path))
+    pending = [["PA1_V1_FE1"], ["PA1_V1_FE1"], []]
+    imported = []
+
+    def fake_import(folders, abosa_output, abosa_version, workers, upsert):
+        imported.extend(folders)
+        return [str(f.relative_to(abosa_output)) for f in folders]
+
+    monkeypatch.setattr(
+        "indicator_pipeline.excel_to_json.import_parameter_folders", fake_import
+    )
+    monkeypatch.setattr(abosa_watcher, "pending_slf_ids", lambda: pending.pop(0))
+
+    assert watch_abosa_output("1.2.2", poll_s=0, settle_s=60) == 1
+    assert imported == [workbook.parent]
+    assert pending == []
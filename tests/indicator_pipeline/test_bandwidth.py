@@ -0,0 +1,167 @@
+import asyncio
+import io
+from datetime import datetime
+
+import pytest
+
+from indicator_pipeline.bandwidth import (
+    BandwidthLimiter,
+    ThrottledFile,
+    log_throughput,
+    parse_rate,
+    parse_schedule,
+)
+
+MIB: int = 1024**2
+
+
+class FakeClock:
+    """
+    Monotonic clock advanced by the limiter's sleeps only.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+
+def make_limiter(rates=(None, None), schedule=None, hour=12):
+    clock = FakeClock()
+    limiter = BandwidthLimiter(
+        rates,
+        schedule,
+        now=lambda: datetime(2024, 1, 1, hour),
+        clock=clock,
+        sleep=clock.sleep,
+        async_sleep=clock.async_sleep,
+    )
+    return limiter, clock
+
+
+def test_parse_rate_and_schedule():
+    assert parse_rate("20M") == 20 * MIB
+    assert parse_rate("512KB/s") == 512 * 1024
+    assert parse_rate("1.5G") == 1.5 * 1024**3
+    assert parse_rate("0") is None
+    assert parse_rate("unlimited") is None
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+    day, night = parse_schedule("08:00-20:00=20M/5M, 20:00-08:00=0")
+    assert (day.start, day.end, day.rates) == (480, 1200, (20 * MIB, 5 * MIB))
+    assert night.rates == (None, None)
+    # The night window goes past midnight
+    assert (
+        night.contains(23 * 60) and night.contains(7 * 60) and not night.contains(600)
+    )
+    with pytest.raises(ValueError):
+        parse_schedule("08:00=20M")
+
+
+def test_schedule_windows_override_default_rates():
+    schedule = parse_schedule("08:00-20:00=20M/5M,22:00-06:00=0")
+    limiter, _ = make_limiter((MIB, None), schedule)
+
+    assert limiter.rates_at(datetime(2024, 1, 1, 12)) == (20 * MIB, 5 * MIB)
+    assert limiter.rates_at(datetime(2024, 1, 1, 23)) == (None, None)
+    assert limiter.rates_at(datetime(2024, 1, 1, 21)) == (MIB, None)
+
+
+def test_connection_limit_throttles_each_connection():
+    limiter, clock = make_limiter((None, MIB))
+    first, second = limiter.connection(), limiter.connection()
+
+    # The burst of one second is admitted, the next MiB waits for a second
+    first.consume(MIB)
+    assert clock.slept == []
+    first.consume(MIB)
+    assert clock.slept == [pytest.approx(1.0)]
+    # The other connection has its own bucket
+    second.consume(MIB)
+    assert len(clock.slept) == 1
+
+
+def test_global_limit_is_shared_by_connections():
+    limiter, clock = make_limiter((MIB, None))
+    callbacks = [limiter.connection().progress_callback() for _ in range(2)]
+
+    # Progress callbacks get the bytes transferred so far
+    callbacks[0](MIB // 2, 4 * MIB)
+    callbacks[1](MIB, 4 * MIB)
+    callbacks[0](2 * MIB, 4 * MIB)
+
+    # 3 MiB in total at 1 MiB/s, the first one in the burst
+    assert sum(clock.slept) == pytest.approx(2.0)
+
+
+def test_async_consume_waits_without_blocking_the_loop():
+    limiter, clock = make_limiter((None, MIB))
+    connection = limiter.connection()
+    ticks = []
+
+    async def ticker():
+        for _ in range(3):
+            ticks.append(clock.now)
+            await asyncio.sleep(0)
+
+    async def transfer():
+        for _ in range(3):
+            await connection.consume_async(MIB)
+
+    async def main():
+        await asyncio.gather(transfer(), ticker())
+
+    asyncio.run(main())
+    # The other coroutine ran while the transfer waited for the limiter
+    assert ticks[0] == pytest.approx(1.0)
+    assert clock.slept == [pytest.approx(1.0), pytest.approx(1.0)]
+
+
+class RemoteFile(io.BytesIO):
+    """
+    Stand-in for a remote file, with the `readv` of paramiko.
+    """
+
+    def readv(self, ranges):
+        for offset, size in ranges:
+            self.seek(offset)
+            yield self.read(size)
+
+
+def test_streamed_file_reads_are_throttled():
+    limiter, clock = make_limiter((None, MIB))
+    data = bytes(range(256)) * (4 * MIB // 256)
+
+    with ThrottledFile(RemoteFile(data), limiter.connection()) as f:
+        assert f.read(MIB) == data[:MIB]
+        assert f.readv([(MIB, MIB), (3 * MIB, 10)]) == [
+            data[MIB : 2 * MIB],
+            data[3 * MIB : 3 * MIB + 10],
+        ]
+        assert f.seek(-10, io.SEEK_END) == 4 * MIB - 10
+        assert not hasattr(f, "prefetch")
+
+    # The first MiB in the burst, then 1 MiB and 10 bytes at 1 MiB/s
+    assert sum(clock.slept) == pytest.approx(1 + 10 / MIB)
+    assert f.closed and f.file.closed
+
+
+def test_log_throughput_reports_each_direction():
+    run_metrics = {
+        "counters": {"sftp.bytes_downloaded": 20 * MIB, "bandwidth.throttled_s": 3.0},
+        "spans": {"sftp.get": {"total_s": 4.0, "count": 2}},
+        "duration_s": 10.0,
+    }
+
+    assert log_throughput(run_metrics) == {"downloaded": 5 * MIB}
@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pyedflib
+
+from indicator_pipeline.compression_benchmark import (
+    run_compression_benchmark,
+    write_benchmark_report,
+)
+
+
+def _write_edf(path):
+    writer = pyedflib.EdfWriter(str(path), 2, file_type=pyedflib.FILETYPE_EDFPLUS)
+    writer.setStartdatetime(datetime(2024, 1, 15, 22, 0, 0))
+    writer.setSignalHeaders(
+        [
+            {
+                "label": label,
+                "dimension": "uV",
+                "sample_frequency": 64,
+                "physical_min": -200.0,
+                "physical_max": 200.0,
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": "",
+            }
+            for label in ("EEG1", "EEG2")
+        ]
+    )
+    t = np.arange(64 * 120) / 64
+    writer.writeSamples([100 * np.sin(t), 50 * np.sin(3 * t)])
+    writer.close()
+
+
+def test_compression_benchmark_reports_each_setting(tmp_path):
+    edf_path = tmp_path / "sample.edf"
+    _write_edf(edf_path)
+    settings = [
+        {"array_format": "numpy"},
+        {
+            "array_format": "zarr",
+            "zarr_codec": "zstd",
+            "clevel": 7,
+            "zarr_shuffle": "none",
+        },
+        {
+            "array_format": "zarr",
+            "zarr_codec": "blosc-lz4",
+            "clevel": 5,
+            "zarr_shuffle": "bit",
+        },
+    ]
+
+    results = run_compression_benchmark(edf_path, link_mbps=1.0, settings=settings)
+
+    assert {r["setting"] for r in results} == {
+        "numpy",
+        "zarr-zstd-7-none",
+        "zarr-blosc-lz4-5-bit",
+    }
+    numpy_result = next(r for r in results if r["setting"] == "numpy")
+    assert numpy_result["raw_bytes"] == 2 * 64 * 120 * 4
+    assert all(r["size_bytes"] > 0 and r["upload_s"] > 0 for r in results)
+    assert [r["total_s"] for r in results] == sorted(r["total_s"] for r in results)
+
+    report_path = tmp_path / "report.json"
+    write_benchmark_report(results, edf_path, 1.0, report_path)
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["recommended"]["setting"] == results[0]["setting"]
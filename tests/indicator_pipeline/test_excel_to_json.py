@@ -1,33 +1,214 @@
 import pandas as pd
+from indicator_pipeline.excel_reader import read_parameter_values
 from indicator_pipeline.excel_to_json import df_to_json_payloads
+from indicator_pipeline.send_json_to_api import get_sent_index_key
 
 
-def test_df_to_json_payloads_basic(monkeypatch):
-    monkeypatch.setattr(
-        "indicator_pipeline.excel_to_json.parse_patient_and_visit",
-        lambda filename: ("1234", "2")
+def test_df_to_json_payloads_basic():
+    df = pd.DataFrame(
+        [
+            {
+                "Filename": "PA1234_V2_FE0001",
+                "TST": "3,14",
+                "n_desat": "42",
+                "n_reco": None,
+                "ODI": "abc",
+                "DesSev": "5.5",
+            }
+        ]
     )
 
-    df = pd.DataFrame([{
-        "Filename": "P1234V2",
-        "TST": "3,14",
-        "n_desat": "42",
-        "n_reco": None,
-        "ODI": "abc",
-        "DesSev": "5.5"
-    }])
+    payloads = df_to_json_payloads(df, "1.2.2")
+
+    assert len(payloads) == 1
+    rec = payloads[0]["sleep_exploration_recording"]
+    attributes = rec["oximetry_record_attributes"]
+
+    assert rec["patient_id"] == 1234
+    assert rec["visite_number"] == 2
+    assert rec["recording_number"] == 1
+    assert attributes["abosa_version"] == "1.2.2"
+    assert attributes["tst_abosa"] == 3.14
+    assert attributes["n_desat_abosa"] == 42
+    assert attributes["n_reco_abosa"] is None
+    assert attributes["odi_abosa"] is None
+
+    assert isinstance(attributes["desaturation_event_attributes"], dict)
+    assert attributes["desaturation_event_attributes"]["des_severity"] == 5.5
+    assert attributes["desaturation_event_attributes"]["des_duration"] is None
 
-    payloads = df_to_json_payloads(df)
+
+def test_df_to_json_payloads_skips_invalid_rows():
+    df = pd.DataFrame(
+        [
+            {"Filename": "junk", "TST": 400.0},
+            {"Filename": "PA12_V1_FE3", "TST": None},
+            {"Filename": "PA12_V1_FE4", "TST": 400.0},
+        ]
+    )
+
+    payloads = df_to_json_payloads(df, "1.2.2")
 
     assert len(payloads) == 1
-    p = payloads[0]
+    assert payloads[0]["sleep_exploration_recording"]["recording_number"] == 4
+
+
+def test_read_parameter_values_keeps_mapped_typed_columns(tmp_path):
+    file = tmp_path / "ParameterValues.xlsx"
+    pd.DataFrame(
+        [
+            {
+                "Filename": "PA12_V1_FE3",
+                "TST": "410,5",
+                "ODI": 12.3,
+                "DesSev": 1.5,
+                "Unused": "dropped",
+            }
+        ]
+    ).to_excel(file, index=False)
+
+    df = read_parameter_values(file)
+
+    assert set(df.columns) == {"Filename", "TST", "ODI", "DesSev"}
+    assert df["TST"].dtype == "float64"
+    assert df["TST"].iloc[0] == 410.5
+    assert (
+        df_to_json_payloads(df, "1.2.2")[0]["sleep_exploration_recording"][
+            "oximetry_record_attributes"
+        ]["tst_abosa"]
+        == 410.5
+    )
+
+
+def fake_send_batch(sent, failing=()):
+    """
+    Stand-in for send_batch recording the payloads sent; those of the patients in
+    `failing` are rejected by the API.
+    """
+
+    def send_batch(payloads, upsert=False):
+        acknowledged = set()
+        for payload in payloads:
+            if payload["sleep_exploration_recording"]["patient_id"] not in failing:
+                sent.append(payload)
+                acknowledged.add(get_sent_index_key(payload))
+        return acknowledged
+
+    return send_batch
+
+
+def test_excel_to_json_parallel_merges_state(tmp_path, monkeypatch):
+    import indicator_pipeline.excel_to_json as excel_to_json_module
+
+    abosa_output = tmp_path / "abosa-output"
+    for i in range(3):
+        folder = abosa_output / "2024" / f"ParameterValues_{i}"
+        folder.mkdir(parents=True)
+        pd.DataFrame([{"Filename": f"PA1{i}_V1_FE2", "TST": 400.0}]).to_excel(
+            folder / "ParameterValues.xlsx", index=False
+        )
+
+    sent = []
+    monkeypatch.setenv("ABOSA_OUTPUT_PATH", str(abosa_output))
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path / "logs"))
+    monkeypatch.setattr(excel_to_json_module, "send_batch", fake_send_batch(sent))
+
+    excel_to_json_module.excel_to_json("1.2.2", workers=2)
+
+    assert len(sent) == 3
+    assert len(excel_to_json_module.load_processed()) == 3
+    slf_usage = excel_to_json_module.get_state().get_slf_usage()
+    assert slf_usage == {f"PA1{i}_V1_FE2": {"abosa": True} for i in range(3)}
+
+    excel_to_json_module.excel_to_json("1.2.2", workers=2)
+    assert len(sent) == 3
+
+
+def test_excel_to_json_reimports_only_changed_rows(tmp_path, monkeypatch):
+    import os
+
+    import indicator_pipeline.excel_to_json as excel_to_json_module
+
+    abosa_output = tmp_path / "abosa-output"
+    folder = abosa_output / "2024" / "ParameterValues_1"
+    folder.mkdir(parents=True)
+    workbook = folder / "ParameterValues.xlsx"
+    rows = [
+        {"Filename": "PA10_V1_FE2", "TST": 400.0},
+        {"Filename": "PA11_V1_FE2", "TST": 410.0},
+    ]
+    pd.DataFrame(rows).to_excel(workbook, index=False)
+
+    sent = []
+    monkeypatch.setenv("ABOSA_OUTPUT_PATH", str(abosa_output))
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path / "logs"))
+    monkeypatch.setattr(excel_to_json_module, "send_batch", fake_send_batch(sent))
+
+    excel_to_json_module.excel_to_json("1.2.2")
+    assert len(sent) == 2
+
+    # Touching the file without changing its content does not trigger an import
+    os.utime(workbook, (1_000_000, 1_000_000))
+    excel_to_json_module.excel_to_json("1.2.2")
+    assert len(sent) == 2
+    assert (
+        excel_to_json_module.load_processed()["2024/ParameterValues_1"]["mtime"]
+        == 1_000_000
+    )
+
+    rows[1]["TST"] = 420.0
+    pd.DataFrame(rows).to_excel(workbook, index=False)
+    excel_to_json_module.excel_to_json("1.2.2")
+    assert len(sent) == 3
+    assert sent[-1]["sleep_exploration_recording"]["patient_id"] == 11
+
+
+def test_load_processed_migrates_legacy_list(tmp_path, monkeypatch):
+    import json
+
+    import indicator_pipeline.excel_to_json as excel_to_json_module
+
+    (tmp_path / "processed.json").write_text(json.dumps(["2024/ParameterValues_1"]))
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path))
+
+    assert excel_to_json_module.load_processed() == {"2024/ParameterValues_1": {}}
+    assert (tmp_path / "processed.json.migrated").exists()
+
+
+def test_excel_to_json_keeps_failed_rows_to_import_again(tmp_path, monkeypatch):
+    import indicator_pipeline.excel_to_json as excel_to_json_module
+
+    abosa_output = tmp_path / "abosa-output"
+    folder = abosa_output / "2024" / "ParameterValues_1"
+    folder.mkdir(parents=True)
+    pd.DataFrame(
+        [
+            {"Filename": "PA10_V1_FE2", "TST": 400.0},
+            {"Filename": "PA11_V1_FE2", "TST": 410.0},
+        ]
+    ).to_excel(folder / "ParameterValues.xlsx", index=False)
+
+    sent = []
+    monkeypatch.setenv("ABOSA_OUTPUT_PATH", str(abosa_output))
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path / "logs"))
+    monkeypatch.setattr(
+        excel_to_json_module, "send_batch", fake_send_batch(sent, failing={11})
+    )
 
-    assert p["patient_id"] == 1234
-    assert p["numero_visite"] == 2
-    assert p["TST"] == 3.14
-    assert p["n_desat"] == 42
-    assert p["n_reco"] is None
-    assert p["ODI"] is None
+    excel_to_json_module.excel_to_json("1.2.2")
+    assert len(sent) == 1
+    # The folder is not processed and only the recording sent is marked as computed
+    assert excel_to_json_module.load_processed() == {}
+    assert excel_to_json_module.get_state().get_slf_usage() == {
+        "PA10_V1_FE2": {"abosa": True}
+    }
 
-    assert isinstance(p["desaturation"], dict)
-    assert p["desaturation"]["DesSev"] == 5.5
\ No newline at end of file
+    monkeypatch.setattr(excel_to_json_module, "send_batch", fake_send_batch(sent))
+    excel_to_json_module.excel_to_json("1.2.2")
+    assert [p["sleep_exploration_recording"]["patient_id"] for p in sent] == [
+        10,
+        10,
+        11,
+    ]
+    rows = excel_to_json_module.load_processed()["2024/ParameterValues_1"]["rows"]
+    assert set(rows) == {"PA10_V1_FE2", "PA11_V1_FE2"}
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from indicator_pipeline.filename_parsing import parse_filename, parse_filenames
+
+NAMES = [
+    "FE0001T1-PA1234V1C1.edf",
+    "PA123_V1_FE0001",
+    "slf_PA7864_V12FE1734",
+    "PA22875",
+    "invalid_filename",
+    "PA123_V1_FE0001",
+]
+
+
+def test_parse_filenames_matches_parse_filename():
+    expected = [parse_filename(name) for name in NAMES]
+
+    assert parse_filenames(NAMES) == expected
+    assert expected[0] == ("1234", "1", "0001")
+    assert expected[3] == ("22875", "", "")
+    assert expected[4] == ("", "", "")
+
+
+def test_parse_filenames_series_keeps_index_and_missing_values():
+    series = pd.Series(NAMES + [None], index=range(10, 17))
+
+    parsed = parse_filenames(series)
+
+    assert list(parsed.columns) == ["patient_id", "visit", "recording"]
+    assert list(parsed.index) == list(series.index)
+    assert [tuple(row) for row in parsed.itertuples(index=False)] == [
+        parse_filename(name) for name in NAMES
+    ] + [("", "", "")]
+
+
+def test_parse_filename_is_cached():
+    parse_filename.cache_clear()
+
+    parse_filenames(["PA1_V1_FE1"] * 3)
+    parse_filename("PA1_V1_FE1")
+
+    info = parse_filename.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
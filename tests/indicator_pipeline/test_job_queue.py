@@ -0,0 +1,117 @@
+import threading
+import time
+
+from indicator_pipeline.job_queue import JobQueue, run_worker
+
+RECORDINGS = {
+    ("PA1", "V1", "FE0001"): {"PA1_T1-V1C-FE0001T.edf": 100},
+    ("PA2", "V1", "FE0002"): {"PA2_T1-V1C-FE0002T.edf": 300, "PA2.txt": 5},
+    ("PA3", "V2", "FE0003"): {"PA3_T1-V2C-FE0003T.edf": 200},
+}
+
+
+def test_claims_largest_first_and_once(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db")
+    assert queue.enqueue("2024", RECORDINGS) == 3
+    assert queue.enqueue("2024", RECORDINGS) == 0
+
+    claimed = [queue.claim("w1")["job_id"] for _ in range(3)]
+
+    assert claimed == ["2024/PA2_V1_FE0002", "2024/PA3_V2_FE0003", "2024/PA1_V1_FE0001"]
+    assert queue.claim("w2") is None
+    assert queue.counts() == {"leased": 3}
+
+
+def test_concurrent_workers_never_share_a_job(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db")
+    queue.enqueue(
+        "2024", {(f"PA{i}", "V1", f"FE{i}"): {f"{i}.edf": i} for i in range(40)}
+    )
+    claimed = []
+
+    def work(owner):
+        while (job := queue.claim(owner)) is not None:
+            claimed.append(job["job_id"])
+
+    threads = [threading.Thread(target=work, args=(f"w{w}",)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(set(claimed)) and len(claimed) == 40
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db", lease_s=0.05)
+    queue.enqueue("2024", {("PA1", "V1", "FE0001"): {"a.edf": 1}})
+    crashed = queue.claim("crashed")
+
+    time.sleep(0.1)
+    job = queue.claim("w2")
+
+    assert job["job_id"] == crashed["job_id"]
+    assert job["attempts"] == 2
+    assert not queue.renew(job["job_id"], "crashed")
+    assert queue.renew(job["job_id"], "w2")
+
+
+def test_worker_retries_then_fails_a_job(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db", max_attempts=2)
+    queue.enqueue("2024", RECORDINGS)
+    calls = []
+
+    def handler(job, lost):
+        calls.append(job["patient_id"])
+        if job["patient_id"] == "PA2":
+            raise ValueError("corrupted EDF")
+
+    processed = run_worker(queue, handler, owner="w1", poll_s=0.01)
+
+    assert processed == {"done": 2, "failed": 2, "lost": 0}
+    assert calls.count("PA2") == 2
+    assert queue.counts() == {"done": 2, "failed": 1}
+    # Queuing the year again retries the failed recording only
+    assert queue.enqueue("2024", RECORDINGS) == 1
+    assert queue.counts() == {"done": 2, "pending": 1}
+
+
+def test_worker_waits_for_the_lease_of_a_stopped_worker(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db", lease_s=0.1)
+    queue.enqueue("2024", {("PA1", "V1", "FE0001"): {"a.edf": 1}})
+    queue.claim("crashed")
+    done = []
+
+    processed = run_worker(
+        queue, lambda job, lost: done.append(job), owner="w2", poll_s=0.02
+    )
+
+    assert processed == {"done": 1, "failed": 0, "lost": 0}
+    assert done[0]["owner"] == "w2"
+    assert queue.counts() == {"done": 1}
+
+
+def test_worker_does_not_complete_a_job_whose_lease_was_lost(tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "queue.db", lease_s=0.1)
+    queue.enqueue("2024", {("PA1", "V1", "FE0001"): {"a.edf": 1}})
+    renew = queue.renew
+    attempts = []
+    uploaded = []
+    # The first lease is taken over during the conversion, the second one is kept
+    monkeypatch.setattr(
+        queue, "renew", lambda job_id, owner: len(attempts) > 1 and renew(job_id, owner)
+    )
+
+    def handler(job, lost):
+        attempts.append(job["attempts"])
+        if len(attempts) == 1:
+            assert lost.wait(1)
+        if not lost.is_set():
+            uploaded.append(job["attempts"])
+
+    processed = run_worker(queue, handler, owner="w1", poll_s=0.02)
+
+    assert processed == {"done": 1, "failed": 0, "lost": 1}
+    assert attempts == [1, 2]
+    assert uploaded == [2]
+    assert queue.counts() == {"done": 1}
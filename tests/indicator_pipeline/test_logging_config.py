@@ -0,0 +1,31 @@
+import logging
+import threading
+
+from indicator_pipeline import logging_config
+from indicator_pipeline.logging_config import year_logging
+
+
+def test_year_logging_keeps_the_records_of_the_year_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_config, "LOGS_DIR", tmp_path)
+    logger = logging.getLogger("test_year_logging")
+    logger.setLevel(logging.INFO)
+
+    def other_year():
+        threading.current_thread().name = "year-2023"
+        logger.info("converting 2023")
+
+    def writer():
+        logger.info("writing a 2024 subject")
+
+    with year_logging("slf_conversion", "run", "2024") as year_log:
+        logger.info("converting 2024")
+        for target, name in [(other_year, "other"), (writer, "slf-writer-2024_0")]:
+            thread = threading.Thread(target=target, name=name)
+            thread.start()
+            thread.join()
+
+    assert year_log == tmp_path / "pipeline_slf_conversion_run_2024.log"
+    content = year_log.read_text(encoding="utf-8")
+    assert "converting 2024" in content
+    assert "writing a 2024 subject" in content
+    assert "converting 2023" not in content
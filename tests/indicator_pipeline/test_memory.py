@@ -0,0 +1,52 @@
+import threading
+import time
+
+from indicator_pipeline.memory import MemoryBudget, RSSSampler, current_rss_bytes
+
+
+def test_memory_budget_limits_work_in_flight():
+    budget = MemoryBudget(100)
+    in_flight = []
+    max_in_use = []
+    lock = threading.Lock()
+
+    def work(nbytes):
+        with budget.reserve(nbytes):
+            with lock:
+                in_flight.append(nbytes)
+                max_in_use.append(sum(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.remove(nbytes)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in (60, 60, 30, 30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(max_in_use) <= 100
+    assert budget.in_use == 0
+
+
+def test_memory_budget_admits_oversized_reservation_alone():
+    budget = MemoryBudget(10)
+
+    with budget.reserve(50):
+        assert budget.in_use == 50
+
+    assert budget.in_use == 0
+
+
+def test_rss_sampler_reports_peak_of_window():
+    if current_rss_bytes() is None:
+        return
+
+    with RSSSampler(interval=0.01) as sampler:
+        with sampler.window() as window:
+            data = bytearray(64 * 1024 * 1024)
+            data[::4096] = b"x" * len(data[::4096])
+            time.sleep(0.05)
+            del data
+
+    assert window.peak_bytes >= 64 * 1024 * 1024
@@ -0,0 +1,36 @@
+from indicator_pipeline.metrics import Metrics, recording
+
+
+def test_spans_and_counters_are_aggregated_per_recording():
+    metrics = Metrics()
+
+    with recording("PA1_V1_FE2"):
+        with metrics.span("sftp.get"):
+            pass
+        metrics.count("sftp.bytes_downloaded", 100)
+    with metrics.span("sftp.get"):
+        pass
+    metrics.count("sftp.bytes_downloaded", 50)
+
+    snapshot = metrics.to_dict()
+    assert snapshot["spans"]["sftp.get"]["count"] == 2
+    assert snapshot["counters"]["sftp.bytes_downloaded"] == 150
+    assert snapshot["recordings"]["PA1_V1_FE2"]["counters"] == {
+        "sftp.bytes_downloaded": 100
+    }
+    assert "sftp.get" in snapshot["recordings"]["PA1_V1_FE2"]["spans"]
+
+
+def test_write_prometheus_textfile(tmp_path):
+    metrics = Metrics()
+    metrics.observe("api.post", 0.5)
+    metrics.count("sftp.bytes_uploaded", 10)
+    metrics.gauge("memory.peak_rss_bytes", 2048)
+
+    path = tmp_path / "pipeline.prom"
+    metrics.write_prometheus(path)
+
+    text = path.read_text()
+    assert 'indicator_pipeline_span_seconds_total{span="api.post"} 0.500000' in text
+    assert "indicator_pipeline_sftp_bytes_uploaded_total 10" in text
+    assert "indicator_pipeline_memory_peak_rss_bytes 2048" in text
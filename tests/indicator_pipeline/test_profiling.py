@@ -0,0 +1,71 @@
+import threading
+
+from indicator_pipeline.profiling import RecordingProfiler
+
+
+def _work(n: int) -> list:
+    return [str(i) * 10 for i in range(n)]
+
+
+def test_profiler_disabled_records_nothing(tmp_path):
+    profiler = RecordingProfiler()
+
+    with profiler.profile("PA1_V1_FE0001"):
+        _work(1000)
+
+    assert profiler.profiles == {}
+    assert profiler.write_report(tmp_path) is None
+
+
+def test_profiler_writes_per_recording_profiles_and_merged_report(tmp_path):
+    profiler = RecordingProfiler()
+    profiler.enable()
+    try:
+        kept = []
+        with profiler.profile("PA1_V1_FE0001"):
+            kept.append(_work(20000))
+        with profiler.profile("PA1_V1_FE0001"):
+            with profiler.profile("nested"):
+                _work(100)
+        with profiler.profile("PA2_V1_FE0002"):
+            _work(5000)
+    finally:
+        profiler.disable()
+
+    assert set(profiler.profiles) == {"PA1_V1_FE0001", "PA2_V1_FE0002"}
+    assert profiler.peak_bytes["PA1_V1_FE0001"] > 0
+
+    report_path = profiler.write_report(tmp_path / "profile", top_n=5)
+
+    assert (tmp_path / "profile" / "PA1_V1_FE0001.prof").exists()
+    assert (tmp_path / "profile" / "PA2_V1_FE0002.prof").exists()
+    report = report_path.read_text(encoding="utf-8")
+    assert "Profiled recordings: 2" in report
+    assert "_work" in report
+    assert "test_profiling.py" in report
+    assert "PA2_V1_FE0002" in report
+
+
+def test_profiler_reports_recordings_skipped_by_other_threads(tmp_path):
+    profiler = RecordingProfiler()
+
+    def convert_other_recording():
+        with profiler.profile("PA2_V1_FE0002"):
+            _work(100)
+
+    profiler.enable()
+    try:
+        with profiler.profile("PA1_V1_FE0001"):
+            other = threading.Thread(target=convert_other_recording)
+            with profiler.profile("nested"):
+                other.start()
+                other.join()
+    finally:
+        profiler.disable()
+
+    assert set(profiler.profiles) == {"PA1_V1_FE0001"}
+    # Nested blocks belong to the enclosing recording, other threads are skipped
+    assert profiler.skipped == {"PA2_V1_FE0002": 1}
+    report = profiler.write_report(tmp_path).read_text(encoding="utf-8")
+    assert "Recordings with blocks not profiled (concurrent): 1" in report
+    assert "1 block(s)  PA2_V1_FE0002" in report
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import types
+from pathlib import Path
+
+import pytest
+
+from indicator_pipeline.raw_cache import RawFileCache
+from indicator_pipeline.sftp_client import SFTPClient
+
+
+def _age(path: Path, seconds: float) -> None:
+    st = path.stat()
+    os.utime(path, (st.st_atime - seconds, st.st_mtime - seconds))
+
+
+def test_cache_serves_stored_files(tmp_path):
+    cache = RawFileCache(tmp_path / "cache")
+    downloaded = tmp_path / "tmp" / "rec.edf"
+    downloaded.parent.mkdir()
+    downloaded.write_bytes(b"edf")
+    key = cache.key("server", "C1/2024/PA1/rec.edf", 3, 1700000000.0)
+
+    assert not cache.fetch(key, tmp_path / "run1" / "rec.edf")
+    cache.store(key, downloaded)
+    assert cache.fetch(key, tmp_path / "run2" / "rec.edf")
+    assert (tmp_path / "run2" / "rec.edf").read_bytes() == b"edf"
+    # a file modified on the server is a different entry
+    assert key != cache.key("server", "C1/2024/PA1/rec.edf", 3, 1700000100.0)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = RawFileCache(tmp_path / "cache", quota_bytes=25)
+    for name in ["a", "b"]:
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10)
+        cache.store(name * 64, path)
+        _age(cache.entry_path(name * 64), 100 if name == "a" else 50)
+
+    # reading "a" makes "b" the least recently used entry
+    assert cache.fetch("a" * 64, tmp_path / "out")
+    (tmp_path / "c").write_bytes(b"x" * 10)
+    cache.store("c" * 64, tmp_path / "c")
+
+    assert cache.entry_path("a" * 64).exists()
+    assert not cache.entry_path("b" * 64).exists()
+    assert cache.entry_path("c" * 64).exists()
+
+
+def test_download_file_uses_cache(tmp_path):
+    gets = []
+
+    class StubSFTP:
+        def stat(self, remote_path):
+            return types.SimpleNamespace(st_size=3, st_mtime=1700000000)
+
+        def getfo(self, remote_path, f):
+            gets.append(remote_path)
+            f.write(b"edf")
+
+    client = SFTPClient(host="server", cache=RawFileCache(tmp_path / "cache"))
+    client.sftp = StubSFTP()
+
+    downloaded = client.download_file("PA1/rec.edf", tmp_path / "run1" / "rec.edf")
+    cached = client.download_file("PA1/rec.edf", tmp_path / "run2" / "rec.edf")
+
+    assert gets == ["PA1/rec.edf"]
+    assert (tmp_path / "run2" / "rec.edf").read_bytes() == b"edf"
+    assert downloaded == cached == (3, hashlib.sha256(b"edf").hexdigest())
+
+
+def test_truncated_download_is_not_cached(tmp_path):
+    class StubSFTP:
+        def stat(self, remote_path):
+            return types.SimpleNamespace(st_size=3, st_mtime=1700000000)
+
+        def getfo(self, remote_path, f):
+            f.write(b"ed")
+
+    cache = RawFileCache(tmp_path / "cache")
+    client = SFTPClient(host="server", cache=cache)
+    client.sftp = StubSFTP()
+
+    with pytest.raises(IOError, match="2 bytes transferred, 3 expected"):
+        client.download_file("PA1/rec.edf", tmp_path / "run1" / "rec.edf")
+    assert cache.entries() == []
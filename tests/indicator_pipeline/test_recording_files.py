@@ -0,0 +1,83 @@
+import pytest
+
+from indicator_pipeline.recording_files import (
+    PatientListing,
+    RawFileName,
+    parse_raw_name,
+    parse_slf_name,
+)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        (
+            "FE0001T1-PA1234V1C1.edf",
+            RawFileName(
+                "FE0001T1-PA1234V1C1.edf", "1234", "V1", "FE0001", "T1", ".edf"
+            ),
+        ),
+        (
+            "FE0007T12-PA1234V2C3.TXT",
+            RawFileName(
+                "FE0007T12-PA1234V2C3.TXT", "1234", "V2", "FE0007", "T12", ".txt"
+            ),
+        ),
+        ("PA1234_V1_FE0001.edf", None),
+        ("notes.docx", None),
+    ],
+)
+def test_parse_raw_name(name, expected):
+    assert parse_raw_name(name) == expected
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("slf_PA1234_V1_FE0001", ("V1", "FE0001")),
+        ("slf_PA1234_V12_FE3", ("V12", "FE3")),
+        ("PA1234_V1_FE0001", None),
+    ],
+)
+def test_parse_slf_name(name, expected):
+    assert parse_slf_name(name) == expected
+
+
+def test_patient_listing_indexes_psg_recordings():
+    listing = PatientListing(
+        [
+            "FE0001T1-PA1234V1C1.edf",
+            "FE0001T1-PA1234V1C1.txt",
+            "FE0001T1-PA1234V1C1.rtf",
+            "FE0002T1-PA1234V1C1.EDF",
+            "FE0002T1-PA1234V1C1.csv",
+            "FE00021T1-PA1234V11C1.edf",
+            # MSLT and MWT trials are not converted
+            "FE0003T12-PA1234V1C1.edf",
+            "FE0004T13-PA1234V1C1.edf",
+            "FE0001T1-PA1234V1C1.pdf",
+            "slf_PA1234_V1_FE0001",
+            "FE0005T1-PA9999V1C1.edf",
+        ]
+    )
+
+    assert listing.missing() == [("V1", "FE0002"), ("V1", "FE0005"), ("V11", "FE00021")]
+    assert listing.files_of(("V1", "FE0001")) == [
+        "FE0001T1-PA1234V1C1.edf",
+        "FE0001T1-PA1234V1C1.txt",
+        "FE0001T1-PA1234V1C1.rtf",
+    ]
+    assert listing.files_of(("V1", "FE0002")) == [
+        "FE0002T1-PA1234V1C1.EDF",
+        "FE0002T1-PA1234V1C1.csv",
+    ]
+    assert listing.files_of(("V2", "FE0001")) == []
+    assert listing.edf_patients["FE0005T1-PA9999V1C1.edf"] == "9999"
+    assert set(listing.edf_patients.values()) == {"1234", "9999"}
+
+
+def test_patient_listing_without_psg():
+    listing = PatientListing(["FE0003T12-PA1234V1C1.edf", "report.pdf"])
+
+    assert listing.recordings == set()
+    assert listing.missing() == []
@@ -0,0 +1,37 @@
+import pytest
+
+from indicator_pipeline.scheduling import (
+    estimate_run_seconds,
+    largest_first,
+    lpt_schedule,
+)
+
+
+def test_largest_first_keeps_ties_in_order():
+    assert largest_first({"PA1": 10, "PA2": 30, "PA3": 10}) == ["PA2", "PA1", "PA3"]
+
+
+def test_lpt_schedule_balances_bytes():
+    costs = {"PA1": 2, "PA2": 7, "PA3": 3, "PA4": 5, "PA5": 3}
+
+    schedule = lpt_schedule(costs, workers=2)
+
+    assert schedule == [["PA2", "PA5"], ["PA4", "PA3", "PA1"]]
+    assert [sum(costs[p] for p in items) for items in schedule] == [10, 10]
+
+
+def test_lpt_schedule_puts_a_huge_recording_alone():
+    costs = {"PA1": 100, "PA2": 10, "PA3": 10, "PA4": 10}
+
+    assert lpt_schedule(costs, workers=2) == [["PA1"], ["PA2", "PA3", "PA4"]]
+
+
+def test_estimate_run_seconds():
+    costs = {"PA1": 60_000_000, "PA2": 20_000_000, "PA3": 20_000_000}
+
+    download_s, convert_s = estimate_run_seconds(
+        costs, workers=2, link_mbps=100, convert_mb_s=20
+    )
+
+    assert download_s == pytest.approx(8.0)
+    assert convert_s == pytest.approx(3.0)
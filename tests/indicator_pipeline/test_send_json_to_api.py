@@ -0,0 +1,106 @@
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+import indicator_pipeline.send_json_to_api as api
+
+
+def make_payload(patient_id, tst=400.0, abosa_version="1.2.2"):
+    return {
+        "sleep_exploration_recording": {
+            "patient_id": patient_id,
+            "visite_number": 1,
+            "recording_number": 2,
+            "oximetry_record_attributes": {
+                "computing_date_abosa": "2024-01-01",
+                "abosa_version": abosa_version,
+                "tst_abosa": tst,
+            },
+        }
+    }
+
+
+def test_send_batch_skips_acknowledged_and_upserts_changes(tmp_path, monkeypatch):
+    created, updated = [], []
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path))
+    monkeypatch.setattr(
+        api, "send_recording", lambda payload: created.append(payload) or len(created)
+    )
+    monkeypatch.setattr(
+        api,
+        "update_recording",
+        lambda record_id, payload: updated.append(record_id) or True,
+    )
+
+    api.send_batch([make_payload(10), make_payload(11)])
+    assert len(created) == 2
+
+    # Same recordings again, even with a new computing date: nothing is sent
+    again = [copy.deepcopy(make_payload(10)), make_payload(11)]
+    again[0]["sleep_exploration_recording"]["oximetry_record_attributes"][
+        "computing_date_abosa"
+    ] = "2024-02-01"
+    api.send_batch(again)
+    assert len(created) == 2
+
+    # Changed indicators are only sent in upsert mode
+    api.send_batch([make_payload(11, tst=420.0)])
+    assert updated == []
+    api.send_batch([make_payload(11, tst=420.0)], upsert=True)
+    assert updated == [2]
+    api.send_batch([make_payload(11, tst=420.0)], upsert=True)
+    assert updated == [2]
+
+    # Another ABOSA version is a different recording
+    api.send_batch([make_payload(10, abosa_version="1.3.0")])
+    assert len(created) == 3
+
+
+def test_update_recording_fails_loudly_without_update_route(monkeypatch):
+    calls = []
+
+    def patch(url, **kwargs):
+        calls.append(url)
+        return SimpleNamespace(status_code=status_code, text="Not Allowed")
+
+    monkeypatch.setattr(api.requests, "patch", patch)
+    monkeypatch.setattr(
+        api, "API_UPDATE_URL", "https://mars.test/recordings/{record_id}"
+    )
+
+    status_code = 204
+    assert api.update_recording(7, make_payload(10))
+    status_code = 500
+    assert not api.update_recording(7, make_payload(10))
+    status_code = 405
+    with pytest.raises(RuntimeError, match="API_UPDATE_URL"):
+        api.update_recording(7, make_payload(10))
+    assert calls == ["https://mars.test/recordings/7"] * 3
+
+
+def test_deleted_record_is_sent_again(tmp_path, monkeypatch):
+    created = []
+    monkeypatch.setenv("LOG_OUTPUT_PATH", str(tmp_path))
+    monkeypatch.setattr(
+        api, "send_recording", lambda payload: created.append(payload) or len(created)
+    )
+    api.send_batch([make_payload(10), make_payload(11), make_payload(12)])
+
+    # Record 2 was deleted in MARS: the other updates of the batch still go through
+    monkeypatch.setattr(
+        api.requests,
+        "patch",
+        lambda url, **kwargs: SimpleNamespace(
+            status_code=404 if url.endswith("/2") else 200, text="Not Found"
+        ),
+    )
+    changed = [make_payload(patient_id, tst=420.0) for patient_id in (10, 11, 12)]
+    acknowledged = api.send_batch(changed, upsert=True)
+
+    keys = [api.get_sent_index_key(payload) for payload in changed]
+    assert acknowledged == {keys[0], keys[2]}
+    assert api.get_state().get_sent_recording(keys[1]) is None
+
+    assert api.send_batch(changed, upsert=True) == set(keys)
+    assert created[-1] == changed[1]
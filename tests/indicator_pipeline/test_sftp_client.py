@@ -0,0 +1,84 @@
+from importlib.util import find_spec
+from pathlib import PurePosixPath
+
+import pytest
+
+from indicator_pipeline import sftp_client
+from indicator_pipeline.sftp_client import SFTPClient, SFTPPath, get_sftp_client_class
+
+
+class LocalClient:
+    """
+    Stand-in for SFTPClient serving the files of a local folder.
+    """
+
+    host = "server"
+
+    def __init__(self, root):
+        self.root = root
+        self.opened = []
+
+    def open_file(self, remote_path, prefetch=False):
+        self.opened.append((remote_path, prefetch))
+        return open(self.root / remote_path, "rb")
+
+
+@pytest.fixture
+def remote_root(tmp_path):
+    (tmp_path / "data" / "PA1").mkdir(parents=True)
+    (tmp_path / "data" / "PA1" / "REC.EDF").write_bytes(b"0" * 256)
+    (tmp_path / "data" / "PA1" / "rec.txt").write_text("Stage\tW\n", encoding="utf-8")
+    files = {
+        PurePosixPath("2024/PA1/rec.edf"): "data/PA1/REC.EDF",
+        PurePosixPath("2024/PA1/rec.txt"): "data/PA1/rec.txt",
+    }
+    client = LocalClient(tmp_path)
+    return client, SFTPPath(client, files)
+
+
+def test_sftp_path_lists_virtual_folders(remote_root):
+    _, root = remote_root
+
+    assert [p.name for p in root.iterdir()] == ["2024"]
+    assert (root / "2024").is_dir()
+    patient = root / "2024" / "PA1"
+    assert [p.name for p in patient.glob("*.edf")] == ["rec.edf"]
+    assert (patient / "rec.edf").is_file()
+    assert not (patient / "missing.edf").is_file()
+    assert (patient / "rec.txt").parent.name == "PA1"
+    assert str(patient / "rec.edf") == "sftp://server/data/PA1/REC.EDF"
+
+
+def test_sftp_path_opens_remote_files(remote_root):
+    client, root = remote_root
+    patient = root.joinpath("2024", "PA1")
+
+    with (patient / "rec.edf").open("rb") as f:
+        assert f.read() == b"0" * 256
+    with (patient / "rec.txt").open("r", encoding="utf-8") as f:
+        assert f.read() == "Stage\tW\n"
+
+    # text files are read from start to end, so they are prefetched
+    assert client.opened == [("data/PA1/REC.EDF", False), ("data/PA1/rec.txt", True)]
+    with pytest.raises(FileNotFoundError):
+        (patient / "missing.txt").open("r")
+
+
+def test_sftp_backend_is_selected_from_the_environment(monkeypatch):
+    monkeypatch.delenv("SFTP_BACKEND", raising=False)
+    assert get_sftp_client_class() is SFTPClient
+
+    monkeypatch.setenv("SFTP_BACKEND", "ftp")
+    with pytest.raises(ValueError):
+        get_sftp_client_class()
+
+
+def test_asyncssh_backend_falls_back_to_paramiko_when_missing(monkeypatch):
+    monkeypatch.setenv("SFTP_BACKEND", "asyncssh")
+    monkeypatch.setattr(
+        sftp_client.importlib.util,
+        "find_spec",
+        lambda name: None if name == "asyncssh" else find_spec(name),
+    )
+
+    assert get_sftp_client_class() is SFTPClient
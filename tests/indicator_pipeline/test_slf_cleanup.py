@@ -0,0 +1,39 @@
+from indicator_pipeline.slf_cleanup import cleanup_slf
+from indicator_pipeline.state_store import StateStore
+
+
+def make_slf(root, year, slf_id, size=100):
+    folder = root / "slf_to_compute" / year / slf_id
+    (folder / "EEG").mkdir(parents=True)
+    (folder / "EEG" / "data.npy").write_bytes(b"x" * size)
+    return folder
+
+
+def test_deletes_completed_folders_and_reports_freed_bytes(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    done = make_slf(tmp_path, "2024", "PA1_V1_FE1", size=300)
+    # Prefix of the completed sample: must not be deleted with it
+    todo = make_slf(tmp_path, "2024", "PA1_V1_FE10")
+    store.update_slf_usage(
+        {"PA1_V1_FE1": {"abosa": True}, "PA1_V1_FE10": {"abosa": False}}
+    )
+
+    summary = cleanup_slf(tmp_path, workers=2, store=store)
+
+    assert summary == {"deleted": 1, "failed": 0, "freed_bytes": 300}
+    assert not done.exists() and todo.exists()
+
+
+def test_only_looks_at_datasets_changed_since_last_cleanup(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    folder = make_slf(tmp_path, "2024", "PA2_V1_FE1")
+    store.update_slf_paths({"PA2_V1_FE1": "slf_to_compute/2024/PA2_V1_FE1"})
+    store.update_slf_usage({"PA2_V1_FE1": {"abosa": False}})
+
+    assert cleanup_slf(tmp_path, store=store)["deleted"] == 0
+    assert store.get_cleanup_candidates(store.get_last_cleanup()) == {}
+
+    store.update_slf_usage({"PA2_V1_FE1": {"abosa": True}})
+    assert cleanup_slf(tmp_path, store=store)["deleted"] == 1
+    assert not folder.exists()
+    assert cleanup_slf(tmp_path, store=store)["deleted"] == 0
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import shutil
+from pathlib import Path, PurePosixPath
+
+import pytest
+
+from indicator_pipeline.checksums import HashingReader, HashingWriter, file_checksum
+from indicator_pipeline.slf_manifest import (
+    MANIFEST_NAME,
+    build_manifest,
+    verify_slf,
+    verify_slf_folder,
+    write_manifest,
+)
+
+
+class LocalClient:
+    """
+    Stand-in for SFTPClient over a local folder.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_files(self, path):
+        return [p.name for p in (self.root / path).iterdir()]
+
+    def list_file_sizes(self, path):
+        return {p.name: p.stat().st_size for p in (self.root / path).iterdir()}
+
+    def open_file(self, remote_path, prefetch=False):
+        return open(self.root / remote_path, "rb")
+
+
+def make_slf_folder(folder: Path) -> None:
+    (folder / "EEG").mkdir(parents=True)
+    (folder / "metadata.json").write_text('{"subject_id": "PA1_V1_FE0001"}')
+    (folder / "EEG" / "data.npy").write_bytes(bytes(range(256)) * 4)
+
+
+def upload(local_folder: Path, remote_folder: Path) -> None:
+    """
+    Copies an SLF folder like upload_slf_folders_to_server, manifest included.
+    """
+    checksums = {
+        path.relative_to(local_folder).as_posix(): file_checksum(path)
+        for path in local_folder.rglob("*")
+        if path.is_file()
+    }
+    manifest = build_manifest(checksums)
+    # Streamed recordings have no source checksums
+    assert manifest["sources_verified"] is False
+    write_manifest(local_folder, manifest)
+    shutil.copytree(local_folder, remote_folder)
+
+
+@pytest.fixture
+def uploaded(tmp_path):
+    local_year_dir = tmp_path / "local" / "2024"
+    remote_patient_dir = tmp_path / "remote" / "2024" / "PA1"
+    make_slf_folder(local_year_dir / "PA1_V1_FE0001")
+    upload(local_year_dir / "PA1_V1_FE0001", remote_patient_dir / "slf_PA1_V1_FE0001")
+    # Uploaded before the manifests
+    make_slf_folder(remote_patient_dir / "slf_PA1_V2_FE0002")
+    return LocalClient(tmp_path / "remote"), local_year_dir, remote_patient_dir
+
+
+def test_hashing_wrappers_checksum_the_streamed_bytes():
+    data = b"EDF data" * 1000
+    writer = HashingWriter(io.BytesIO())
+    writer.write(data[:100])
+    writer.write(data[100:])
+    reader = HashingReader(io.BytesIO(data))
+    while reader.read(64):
+        pass
+
+    expected = (len(data), hashlib.sha256(data).hexdigest())
+    assert writer.checksum() == reader.checksum() == expected
+
+
+def test_verify_slf_compares_manifests_and_sizes(uploaded):
+    client, local_year_dir, remote_patient_dir = uploaded
+
+    summary = verify_slf(client, PurePosixPath("2024"), local_year_dir)
+    assert summary == {"verified": 1, "mismatched": 0, "no_manifest": 1}
+
+    (remote_patient_dir / "slf_PA1_V1_FE0001" / "EEG" / "data.npy").write_bytes(b"x")
+    (remote_patient_dir / "slf_PA1_V1_FE0001" / "extra.json").write_text("{}")
+    outcome, problems = verify_slf_folder(client, "2024/PA1/slf_PA1_V1_FE0001")
+    assert outcome == "mismatched"
+    assert problems == [
+        "EEG/data.npy has 1 bytes on the server, 1024 in the manifest",
+        "extra.json is not in the manifest",
+    ]
+
+
+def test_verify_slf_folder_detects_changed_files(uploaded):
+    client, local_year_dir, remote_patient_dir = uploaded
+    remote_folder = "2024/PA1/slf_PA1_V1_FE0001"
+    local_folder = local_year_dir / "PA1_V1_FE0001"
+
+    # Same size, other content: only the deep verification reads the files
+    (remote_patient_dir / "slf_PA1_V1_FE0001" / "EEG" / "data.npy").write_bytes(
+        bytes(1024)
+    )
+    assert verify_slf_folder(client, remote_folder)[0] == "verified"
+    assert verify_slf_folder(client, remote_folder, deep=True) == (
+        "mismatched",
+        ["EEG/data.npy checksum differs from the manifest"],
+    )
+
+    # A local folder converted again no longer matches the uploaded manifest
+    (local_folder / "metadata.json").write_text('{"subject_id": "PA1_V1_FE0001" }')
+    (local_folder / MANIFEST_NAME).unlink()
+    upload(local_folder, local_folder.parent / "reconverted")
+    shutil.copy(local_folder.parent / "reconverted" / MANIFEST_NAME, local_folder)
+    assert verify_slf_folder(client, remote_folder, local_folder) == (
+        "mismatched",
+        ["metadata.json differs from the local folder"],
+    )
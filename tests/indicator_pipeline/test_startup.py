@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SRC_DIR: Path = Path(__file__).resolve().parents[2] / "src"
+# Modules loaded only by the steps using them
+HEAVY_MODULES = (
+    "mne",
+    "pandas",
+    "numpy",
+    "sleeplab_format",
+    "pyedflib",
+    "zarr",
+    "numcodecs",
+    "paramiko",
+)
+# Wall time of `run-pipeline --help`, interpreter start included. Loading the conversion
+# stack at import took more than a second before the imports were deferred.
+HELP_BUDGET_S: float = 0.8
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(SRC_DIR)] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def _loaded_heavy_modules(module: str) -> list:
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = _run_python("-c", code).stdout.strip()
+    return output.split(",") if output else []
+
+
+def test_run_pipeline_import_loads_no_heavy_module():
+    assert _loaded_heavy_modules("indicator_pipeline.run_pipeline") == []
+
+
+def test_import_step_loads_neither_conversion_stack_nor_pandas():
+    assert _loaded_heavy_modules("indicator_pipeline.excel_to_json") == []
+
+
+def test_conversion_step_defers_mne():
+    loaded = _loaded_heavy_modules("indicator_pipeline.slf_conversion")
+
+    assert "sleeplab_format" in loaded
+    assert "mne" not in loaded
+
+
+@pytest.mark.skipif(
+    os.getenv("SKIP_STARTUP_BUDGET") == "1", reason="startup budget disabled"
+)
+def test_help_fits_startup_budget():
+    _run_python("-m", "indicator_pipeline.run_pipeline", "--help")  # warm the caches
+
+    start = time.perf_counter()
+    result = _run_python("-m", "indicator_pipeline.run_pipeline", "--help")
+    elapsed = time.perf_counter() - start
+
+    assert "--step" in result.stdout
+    assert elapsed < HELP_BUDGET_S, f"--help took {elapsed:.2f}s"
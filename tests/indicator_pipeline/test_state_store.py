@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+
+from indicator_pipeline.state_store import StateStore, get_state_store
+
+
+def test_migrates_legacy_json_files_once(tmp_path):
+    (tmp_path / "slf_usage.json").write_text(
+        json.dumps({"PA1_V1_FE2": {"abosa": True}, "PA2_V1_FE3": {"abosa": False}})
+    )
+    (tmp_path / "processed.json").write_text(json.dumps(["2024/ParameterValues_1"]))
+
+    store = get_state_store(tmp_path)
+
+    assert store.get_slf_usage() == {
+        "PA1_V1_FE2": {"abosa": True},
+        "PA2_V1_FE3": {"abosa": False},
+    }
+    assert store.get_processed() == {"2024/ParameterValues_1": {}}
+    assert not (tmp_path / "slf_usage.json").exists()
+    assert (tmp_path / "slf_usage.json.migrated").exists()
+
+    # A JSON file appearing later is not imported again
+    (tmp_path / "slf_usage.json").write_text(
+        json.dumps({"PA9_V1_FE1": {"abosa": True}})
+    )
+    StateStore(tmp_path / "pipeline_state.db").migrate_json_files(tmp_path)
+    assert "PA9_V1_FE1" not in store.get_slf_usage()
+
+
+def test_concurrent_row_updates_are_not_lost(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+
+    def mark(worker):
+        for i in range(20):
+            store.set_slf_usage(f"PA{worker}_V1_FE{i}", "abosa", True)
+
+    threads = [threading.Thread(target=mark, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store.get_slf_usage()) == 80
+
+
+def test_update_without_overwrite_keeps_existing_status(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    store.set_slf_usage("PA1_V1_FE2", "abosa", True)
+
+    store.update_slf_usage(
+        {"PA1_V1_FE2": {"abosa": False}, "PA3_V1_FE4": {"abosa": False}},
+        overwrite=False,
+    )
+
+    assert store.get_slf_usage() == {
+        "PA1_V1_FE2": {"abosa": True},
+        "PA3_V1_FE4": {"abosa": False},
+    }
+
+
+def test_store_uses_the_rollback_journal(tmp_path):
+    db_path = tmp_path / "pipeline_state.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    store = StateStore(db_path)
+    store.set_slf_usage("PA1_V1_FE0001", "abosa", True)
+
+    with store.connect() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert not (tmp_path / "pipeline_state.db-wal").exists()
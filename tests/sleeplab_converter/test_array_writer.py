@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+import zarr
+from sleeplab_format import models
+
+from sleeplab_converter import array_writer
+from sleeplab_converter.array_writer import get_zarr_codecs, write_sample_array
+from sleeplab_converter.edf import SignalLoader
+
+
+def _sample_array(values, chunk_sizes):
+    def iter_func(chunk_samples):
+        chunk_sizes.append(chunk_samples)
+        for start in range(0, values.size, chunk_samples):
+            yield values[start : start + chunk_samples]
+
+    loader = SignalLoader(
+        lambda: values, values.size, values.dtype, iter_func=iter_func
+    )
+    attributes = models.ArrayAttributes(
+        name="SpO2", start_ts=datetime(2024, 1, 1), sampling_rate=1.0, unit="%"
+    )
+    return models.SampleArray(attributes=attributes, values_func=loader)
+
+
+def test_streamed_npy_is_identical_to_np_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(array_writer, "ZARR_CHUNK_BYTES", 400)
+    values = np.random.default_rng(0).normal(size=1050).astype(np.float32)
+    chunk_sizes = []
+
+    write_sample_array(_sample_array(values, chunk_sizes), tmp_path / "SpO2")
+
+    np.save(tmp_path / "expected.npy", values)
+    assert chunk_sizes == [100]
+    assert (tmp_path / "SpO2" / "data.npy").read_bytes() == (
+        tmp_path / "expected.npy"
+    ).read_bytes()
+    assert (tmp_path / "SpO2" / "attributes.json").exists()
+
+
+def test_streamed_zarr_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(array_writer, "ZARR_CHUNK_BYTES", 400)
+    values = np.arange(1050, dtype=np.float32)
+
+    write_sample_array(
+        _sample_array(values, []), tmp_path / "SpO2", array_format="zarr"
+    )
+
+    z = zarr.open_array(str(tmp_path / "SpO2" / "data.zarr"), mode="r")
+    assert z.chunks == (100,)
+    np.testing.assert_array_equal(z[:], values)
+
+
+def test_streamed_write_checks_sample_count(tmp_path):
+    values = np.arange(10, dtype=np.float32)
+    sarr = _sample_array(values, [])
+    sarr.values_func.n_samples = 12
+
+    with pytest.raises(ValueError, match="12 expected"):
+        write_sample_array(sarr, tmp_path / "SpO2")
+
+
+def test_zarr_codecs():
+    compressor, filters = get_zarr_codecs("blosc-zstd", 12, "bit")
+    assert compressor.cname == "zstd" and compressor.clevel == 9
+    assert filters is None
+
+    compressor, filters = get_zarr_codecs("zstd", 3, "byte")
+    assert compressor.level == 3
+    assert filters[0].elementsize == 4
+
+    with pytest.raises(ValueError):
+        get_zarr_codecs("lz4", 1, "bit")
+
+
+def test_zarr_stream_writer_gathers_unaligned_blocks(tmp_path):
+    values = np.arange(1050, dtype=np.float32)
+    compressor, filters = get_zarr_codecs("zstd", 3, "none")
+
+    with array_writer.ZarrStreamWriter(
+        tmp_path / "data.zarr", values.size, values.dtype, 100, compressor, filters
+    ) as out:
+        for start, stop in [(0, 100), (100, 137), (137, 400), (400, 1050)]:
+            out.write(values[start:stop])
+
+    z = zarr.open_array(str(tmp_path / "data.zarr"), mode="r")
+    assert z.nchunks_initialized == 11
+    np.testing.assert_array_equal(z[:], values)
@@ -0,0 +1,130 @@
+import numpy as np
+import pyedflib
+
+from sleeplab_converter import edf
+from sleeplab_converter.edf import (
+    read_edf_export,
+    read_edf_export_mne,
+    read_edf_export_stream,
+)
+
+
+def _write_edf(path, n_samples=2560, sample_rate=256):
+    signal = np.sin(np.arange(n_samples) / 10) * 100
+    writer = pyedflib.EdfWriter(str(path), 1, file_type=pyedflib.FILETYPE_EDFPLUS)
+    writer.setSignalHeaders(
+        [
+            {
+                "label": "EEG",
+                "dimension": "uV",
+                "sample_frequency": sample_rate,
+                "physical_min": -200.0,
+                "physical_max": 200.0,
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": "",
+            }
+        ]
+    )
+    writer.writeSamples([signal])
+    writer.close()
+    return signal
+
+
+def test_chunked_decoding_matches_full_read(tmp_path, monkeypatch):
+    path = tmp_path / "rec.edf"
+    signal = _write_edf(path)
+    monkeypatch.setattr(edf, "DECODE_CHUNK_SAMPLES", 1000)
+
+    load_funcs, _, _ = read_edf_export(path)
+    loader = load_funcs[0]
+    values = loader()
+
+    with pyedflib.EdfReader(str(path)) as hdl:
+        expected = hdl.readSignal(0).astype(np.float32)
+    assert values.dtype == np.float32
+    assert loader.nbytes == values.nbytes
+    np.testing.assert_array_equal(values, expected)
+    np.testing.assert_allclose(values, signal, atol=0.01)
+
+
+def test_mne_decoding_matches_pyedflib(tmp_path):
+    path = tmp_path / "rec.edf"
+    _write_edf(path)
+
+    pyedflib_values = read_edf_export(path)[0][0]()
+    load_funcs, _, _ = read_edf_export_mne(str(path))
+    loader = load_funcs[0]
+    mne_values = loader()
+
+    assert mne_values.dtype == np.float32
+    assert loader.nbytes == mne_values.nbytes
+    # MNE returns volts
+    np.testing.assert_allclose(mne_values * 1e6, pyedflib_values, atol=0.01)
+
+
+def _write_edf_with_annotations(path, duration_s=10):
+    rates = [256, 32]
+    writer = pyedflib.EdfWriter(str(path), 2, file_type=pyedflib.FILETYPE_EDFPLUS)
+    writer.setSignalHeaders(
+        [
+            {
+                "label": label,
+                "dimension": "uV",
+                "sample_frequency": rate,
+                "physical_min": -200.0,
+                "physical_max": 200.0,
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": "",
+            }
+            for label, rate in zip(["EEG", "Resp"], rates)
+        ]
+    )
+    writer.writeSamples(
+        [np.sin(np.arange(rate * duration_s) / 10) * 100 for rate in rates]
+    )
+    writer.writeAnnotation(1.5, 2.0, "Arousal")
+    writer.writeAnnotation(4.0, -1, "Lights off")
+    writer.close()
+
+
+def test_stream_reader_matches_pyedflib(tmp_path):
+    path = tmp_path / "rec.edf"
+    _write_edf_with_annotations(path)
+
+    expected_funcs, expected_headers, expected_header = read_edf_export(
+        path, annotations=True
+    )
+    load_funcs, signal_headers, header = read_edf_export_stream(path, annotations=True)
+
+    assert [h["label"] for h in signal_headers] == ["EEG", "Resp"]
+    assert [h["sample_frequency"] for h in signal_headers] == [
+        h["sample_frequency"] for h in expected_headers
+    ]
+    assert header["startdate"] == expected_header["startdate"]
+    assert [a[2] for a in header["annotations"]] == ["Arousal", "Lights off"]
+    assert [a[:2] for a in header["annotations"]] == [[1.5, 2.0], [4.0, -1.0]]
+    for loader, expected in zip(load_funcs, expected_funcs):
+        assert loader.nbytes == expected.nbytes
+        np.testing.assert_array_equal(loader(), expected())
+
+
+def test_record_stream_decodes_channels_in_one_pass(tmp_path):
+    path = tmp_path / "rec.edf"
+    _write_edf_with_annotations(path)
+    load_funcs, _, _ = read_edf_export_stream(path)
+    record_stream = load_funcs[0].record_stream
+
+    # a block smaller than one data record still holds a whole record
+    blocks = list(record_stream.iter_blocks([1, 0], block_bytes=1000))
+
+    assert len(blocks) == 10
+    np.testing.assert_array_equal(
+        np.concatenate([b[0] for b in blocks]), load_funcs[1]()
+    )
+    np.testing.assert_array_equal(
+        np.concatenate([b[1] for b in blocks]), load_funcs[0]()
+    )
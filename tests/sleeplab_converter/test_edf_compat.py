@@ -0,0 +1,140 @@
+import numpy as np
+import pyedflib
+import pytest
+
+from sleeplab_converter import edf_compat
+from sleeplab_converter.edf import read_edf_export
+from sleeplab_converter.edf_compat import (
+    MNE,
+    NATIVE,
+    PYEDFLIB,
+    classify_edf,
+    read_edf_auto,
+)
+
+
+def _write_edf(path, duration_s=10):
+    rates = [256, 32]
+    writer = pyedflib.EdfWriter(str(path), 2, file_type=pyedflib.FILETYPE_EDFPLUS)
+    writer.setSignalHeaders(
+        [
+            {
+                "label": label,
+                "dimension": "uV",
+                "sample_frequency": rate,
+                "physical_min": -200.0,
+                "physical_max": 200.0,
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": "",
+            }
+            for label, rate in zip(["EEG", "Resp"], rates)
+        ]
+    )
+    writer.writeSamples(
+        [np.sin(np.arange(rate * duration_s) / 10) * 100 for rate in rates]
+    )
+    writer.writeAnnotation(1.5, 2.0, "Arousal")
+    writer.close()
+    return path
+
+
+def _patch(path, offset, value, size):
+    data = bytearray(path.read_bytes())
+    data[offset : offset + size] = value.ljust(size).encode("latin-1")
+    path.write_bytes(bytes(data))
+
+
+def _loaded(load_funcs):
+    return [loader() for loader in load_funcs]
+
+
+def test_compliant_file_is_read_with_pyedflib(tmp_path):
+    path = _write_edf(tmp_path / "rec.edf")
+
+    assert classify_edf(path) == (PYEDFLIB, "", None)
+    assert read_edf_auto(path)[0] == PYEDFLIB
+
+
+@pytest.mark.parametrize(
+    "offset, value, size, reason",
+    [
+        (8, "Jos\xe9 Doe", 80, "non-ASCII characters in the header"),
+        (8, "John Doe", 80, "EDF+ patient field"),
+        (176, "07:49:43", 8, "start time"),
+        (192, "EDF+D", 44, "discontinuous"),
+        (236, "-1", 8, "-1 data records"),
+    ],
+)
+def test_files_rejected_by_pyedflib_are_read_natively(
+    tmp_path, offset, value, size, reason
+):
+    path = _write_edf(tmp_path / "rec.edf")
+    expected = _loaded(read_edf_export(path)[0])
+    _patch(path, offset, value, size)
+    with pytest.raises(OSError):
+        pyedflib.EdfReader(str(path))
+
+    decision = classify_edf(path)
+    reader, load_funcs, signal_headers, header = read_edf_auto(path, annotations=True)
+
+    assert (decision.reader, reader) == (NATIVE, NATIVE)
+    assert reason in decision.reason
+    assert [h["label"] for h in signal_headers] == ["EEG", "Resp"]
+    assert [a[2] for a in header["annotations"]] == ["Arousal"]
+    for values, expected_values in zip(_loaded(load_funcs), expected):
+        np.testing.assert_array_equal(values, expected_values)
+
+
+def test_truncated_file_keeps_complete_records(tmp_path):
+    path = _write_edf(tmp_path / "rec.edf")
+    path.write_bytes(path.read_bytes()[:-100])
+
+    decision = classify_edf(path)
+    load_funcs = read_edf_auto(path)[1]
+
+    assert (decision.reader, decision.records) == (NATIVE, 9)
+    assert load_funcs[0]().size == 9 * 256
+
+
+def test_empty_digital_range_falls_back_to_mne(tmp_path):
+    path = _write_edf(tmp_path / "rec.edf")
+    # digital maximum of the first signal (after 3 label, transducer, units, physical
+    # min and max, digital min fields of 3 signals)
+    _patch(path, 256 + 3 * (16 + 80 + 8 + 8 + 8 + 8), "-32768", 8)
+
+    assert classify_edf(path).reader == MNE
+
+
+def test_decision_is_cached_and_corrected_when_pyedflib_fails(tmp_path, monkeypatch):
+    path = _write_edf(tmp_path / "rec.edf")
+    _patch(path, 8, "John Doe", 80)
+    calls = []
+    check = edf_compat.check_edf_header
+
+    def check_as_compliant(raw, file_size):
+        calls.append(raw)
+        return check(raw, file_size)._replace(reader=PYEDFLIB, reason="")
+
+    monkeypatch.setattr(edf_compat, "check_edf_header", check_as_compliant)
+
+    assert read_edf_auto(path)[0] == NATIVE
+    assert classify_edf(path).reader == NATIVE
+    assert len(calls) == 1
+
+
+def test_native_reader_failure_falls_back_to_mne(tmp_path, monkeypatch):
+    path = _write_edf(tmp_path / "rec.edf")
+    _patch(path, 8, "John Doe", 80)
+
+    def fail(*args, **kwargs):
+        raise ValueError("unreadable data records")
+
+    monkeypatch.setattr(edf_compat, "read_edf_export_stream", fail)
+    reader, load_funcs, signal_headers, header = read_edf_auto(path)
+
+    assert reader == MNE
+    assert classify_edf(path).reader == MNE
+    assert [h["label"] for h in signal_headers] == ["EEG", "Resp"]
+    assert load_funcs[0]().size == 10 * 256